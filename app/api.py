@@ -1,141 +1,949 @@
 from starlette.applications import Starlette
+from starlette.middleware import Middleware
 from starlette.routing import Route
-from starlette.responses import JSONResponse
-from calculator import MortgageCalculator
-from validation import *
-from errors import *
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.exceptions import HTTPException
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+from calculator import MortgageCalculator, APPROVED, MAX_INTEREST_RATE, SCHEDULE_COLUMNS
+from cache import QuoteCache
+from rates import FileRateStore
+from metrics import MetricsRegistry, MetricsMiddleware
+from execution import ExecutionPolicy, ExecutorOverloaded
+from config_log import ConfigLog, apply_change
+from sessions import SessionTokens
+from validation import (CompiledValidator, Field, Validator, clean_string, convert_param, error_detail, float_list,
+                        integer_list, validate_amount, validate_interest_rate, validate_payment_schedule,
+                        validate_percentage, validate_positive_float, validate_positive_float_list,
+                        validate_positive_integer_in_range, validate_positive_integer_list_in_range, validate_price,
+                        validate_product)
+from errors import (AmortizationPeriodValidationError, AmortizationPeriodsValidationError, AskingPriceValidationError,
+                    DownPaymentPercentagesValidationError, DownPaymentValidationError,
+                    InterestRateRangeValidationError, InterestRateValidationError, PaymentScheduleValidationError,
+                    PaymentValidationError, PrepaymentValidationError, ProductValidationError, ServerBusyError)
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import os
 
-calc = MortgageCalculator()
 
-def unpack_params(params, query_keys):
-    print(params)
-    result = []
-    for key in query_keys:
-        result.append(params[key])
+def build_quote_cache():
+    # The quote cache is enabled by setting QUOTE_CACHE_SIZE to the maximum number of quotes to keep, and
+    # optionally QUOTE_CACHE_TTL to the number of seconds a quote may be served from the cache
+    maxsize = int(os.environ.get('QUOTE_CACHE_SIZE', 0))
+    if maxsize <= 0:
+        return None
+    ttl = os.environ.get('QUOTE_CACHE_TTL')
+    return QuoteCache(maxsize, float(ttl) if ttl else None)
+
+
+def build_rate_store(interest_rate):
+    # Setting RATE_STORE_PATH shares the interest rate between every worker process through that file
+    path = os.environ.get('RATE_STORE_PATH')
+    if not path:
+        return None
+    return FileRateStore(path, interest_rate)
+
+
+def build_config_log(defaults):
+    # Setting CONFIG_LOG_DIR keeps the rates, insurance tiers, insurable limit and amortization periods in a durable
+    # log in that directory, which is loaded at startup and watched for changes made by other workers
+    directory = os.environ.get('CONFIG_LOG_DIR')
+    if not directory:
+        return None
+    return ConfigLog(directory, defaults)
+
+
+def build_quote_sessions():
+    # What-if sessions are kept in memory by each worker for QUOTE_SESSION_TTL seconds after they were last changed,
+    # up to QUOTE_SESSION_LIMIT of them
+    return QuoteCache(int(os.environ.get('QUOTE_SESSION_LIMIT', 10000)),
+                      float(os.environ.get('QUOTE_SESSION_TTL', 1800)))
+
+
+def build_session_tokens():
+    # Session ids are tokens holding the inputs of the session, signed with QUOTE_SESSION_SECRET, so that a worker
+    # that does not have a session in memory can rebuild it. Every worker must be given the same secret. Without one
+    # each process signs with a random secret of its own, and a session can only be carried on by its own worker.
+    secret = os.environ.get('QUOTE_SESSION_SECRET')
+    return SessionTokens(secret.encode() if secret else os.urandom(32),
+                         float(os.environ.get('QUOTE_SESSION_TTL', 1800)))
+
+
+def build_execution_policy():
+    # EXECUTION_MODE chooses where large calculations run: "inline" on the event loop, or in a "thread" (the default)
+    # or "process" pool. Requests of at least EXECUTION_OFFLOAD_THRESHOLD rows, grid cells or schedule periods are
+    # offloaded, and once EXECUTION_MAX_PENDING of them are admitted further ones are answered with a 429.
+    max_workers = os.environ.get('EXECUTION_MAX_WORKERS')
+    max_pending = os.environ.get('EXECUTION_MAX_PENDING')
+    return ExecutionPolicy(os.environ.get('EXECUTION_MODE', 'thread'),
+                           int(os.environ.get('EXECUTION_OFFLOAD_THRESHOLD', 1000)),
+                           int(max_workers) if max_workers else None,
+                           int(max_pending) if max_pending else None)
+
+
+def parse_product_rates(text):
+    # PRODUCT_RATES configures the rates of named products as comma separated product=percentage pairs, such as
+    # "5-year-fixed=4.79,variable=5.2". Quotes use the default rate unless they ask for one of these products.
+    rates = {}
+    for pair in text.split(','):
+        if not pair.strip():
+            continue
+        product, _, percentage = pair.partition('=')
+        rates[clean_string(product)] = float(percentage) / 100
+    return rates
+
+
+def build_calculator(config, rate_store):
+    # Setting MONEY_MODE to "cents" calculates every quote with exact integer cents instead of floats. The fixed
+    # point module is only imported when it is used. Each calculator gets its own quote cache, so quotes from an
+    # earlier configuration are never served.
+    if os.environ.get('MONEY_MODE') == 'cents':
+        from fixed_point import FixedPointCalculator
+        calculator_class = FixedPointCalculator
+    else:
+        calculator_class = MortgageCalculator
+    calculator = calculator_class(quote_cache=build_quote_cache(), rate_store=rate_store)
+    calculator.apply_config(config)
+    return calculator
+
+
+# The calculator, execution policy, metrics and param schemas the handlers use. Nothing is built when the module is
+# imported; configure builds them from the environment when an app is created.
+calc = None
+rate_store = None
+config_log = None
+quote_sessions = None
+session_tokens = None
+execution = None
+metrics = None
+payment_params = None
+maximum_params = None
+grid_params = None
+
+# Seconds between checks of the config log for changes made by other workers
+CONFIG_SYNC_INTERVAL = .1
+
+# Number of rows from a batch request that are validated and calculated together before being streamed back
+BATCH_CHUNK_SIZE = 1000
+
+# Number of amortization schedule rows encoded together into each chunk of a streamed response
+SCHEDULE_CHUNK_SIZE = 104
+
+# The largest number of payments a single GET /payment-grid request may ask for
+MAX_GRID_CELLS = 20000
+
+# The largest number of strategies a single POST /prepayment-scenarios request may compare
+MAX_PREPAYMENT_STRATEGIES = 500
+
+# Prepayments do not depend on the calculator's settings, so their schema is shared by every calculator
+prepayment_params = CompiledValidator([
+    Field('extra_payment', float, PrepaymentValidationError, validate_amount, required=False),
+    Field('lump_sum', float, PrepaymentValidationError, validate_amount, required=False),
+    Field('payment_increase', float, PrepaymentValidationError, validate_percentage, required=False)
+])
+
+def build_param_schemas(calc):
+    # The params of each endpoint are converted and validated against a schema compiled once at startup. The errors
+    # of the amortization periods are built with the calculator's bounds, which the config can change.
+    period_error = AmortizationPeriodValidationError(calc.minimum_amortization_period,
+                                                     calc.maximum_amortization_period)
+    periods_error = AmortizationPeriodsValidationError(calc.minimum_amortization_period,
+                                                       calc.maximum_amortization_period)
+    payment = CompiledValidator([
+        Field('asking_price', float, AskingPriceValidationError, validate_price),
+        Field('down_payment', float, DownPaymentValidationError, validate_amount),
+        Field('payment_schedule', clean_string, PaymentScheduleValidationError, validate_payment_schedule,
+              calc.annual_payments),
+        Field('amortization_period',
+              int,
+              period_error,
+              validate_positive_integer_in_range,
+              calc.minimum_amortization_period,
+              calc.maximum_amortization_period + 1),
+        Field('product', clean_string, ProductValidationError, validate_product, calc.has_product, required=False)
+    ])
+
+    # Strip and convert the payment schedule to lowercase for comparison to allowed keys
+    maximum = CompiledValidator([
+        Field('payment', float, PaymentValidationError, validate_amount),
+        Field('payment_schedule', clean_string, PaymentScheduleValidationError, validate_payment_schedule,
+              calc.annual_payments),
+        Field('amortization_period',
+              int,
+              period_error,
+              validate_positive_integer_in_range,
+              calc.minimum_amortization_period,
+              calc.maximum_amortization_period + 1),
+        Field('down_payment', float, DownPaymentValidationError, validate_amount, required=False),
+        Field('product', clean_string, ProductValidationError, validate_product, calc.has_product, required=False)
+    ])
+
+    grid = CompiledValidator([
+        Field('asking_price', float, AskingPriceValidationError, validate_price),
+        Field('payment_schedule', clean_string, PaymentScheduleValidationError, validate_payment_schedule,
+              calc.annual_payments),
+        Field('rate_min', float, InterestRateRangeValidationError, validate_positive_float),
+        Field('rate_max', float, InterestRateRangeValidationError, validate_positive_float),
+        Field('rate_step', float, InterestRateRangeValidationError, validate_positive_float, required=False),
+        Field('down_payment', float, DownPaymentValidationError, validate_amount, required=False),
+        Field('down_payment_percentages',
+              float_list,
+              DownPaymentPercentagesValidationError,
+              validate_positive_float_list,
+              100.,
+              required=False),
+        Field('amortization_periods',
+              integer_list,
+              periods_error,
+              validate_positive_integer_list_in_range,
+              calc.minimum_amortization_period,
+              calc.maximum_amortization_period + 1,
+              required=False)
+    ])
+
+    return payment, maximum, grid
+
+# Checked once every payment param is valid. The param it belongs to is kept for the errors=all report.
+DOWN_PAYMENT_ABOVE_ASKING_PRICE = HTTPException(HTTP_400_BAD_REQUEST,
+                                                "The down payment cannot exceed the asking price.")
+DOWN_PAYMENT_ABOVE_ASKING_PRICE.param = 'down_payment'
+
+# The response to each validation error, built the first time the error is returned. Bots and broken clients send a
+# steady share of malformed requests, and a Response only reads its status, headers and body when it is sent, so one
+# instance can answer all of them without raising, formatting or encoding anything per request.
+error_responses = {}
+
+
+def error_response(error):
+    # The same plain text response Starlette's handler sends for an HTTPException raised by a handler. The errors of
+    # the param schemas are shared, so they are returned rather than raised, which would chain a traceback onto them.
+    response = error_responses.get(error)
+    if response is None:
+        exception = error() if isinstance(error, type) else error
+        response = PlainTextResponse(exception.detail, exception.status_code, exception.headers)
+        error_responses[error] = response
+    return response
+
+
+def reject(params, schema, error):
+    # Answers a request that failed validation with its first error, or, when the client asks for errors=all, with
+    # a JSON report of every invalid param so they can all be fixed at once
+    if params.get('errors') != 'all':
+        return error_response(error)
+    # Cross param checks only run once every param is valid, so an empty report means one of them failed
+    report = schema.report(params) or [{'param': error.param, 'detail': error.detail}]
+    return JSONResponse({'errors': report}, status_code=HTTP_400_BAD_REQUEST)
+
+
+def parse_payment_params(params):
+    # Returns the values of the payment params and None, or None and the first error found
+
+    values, errors = payment_params.validate(params, fail_fast=True)
+    if errors:
+        return None, errors[0]
+
+    if values[0] < values[1]:
+        return None, DOWN_PAYMENT_ABOVE_ASKING_PRICE
+
+    return values, None
+
+
+def parse_prepayment_params(params):
+    # Returns (extra_payment, lump_sum, payment_increase) with the increase as a fraction and 0. for missing params,
+    # and None, or None and the first error found
+    values, errors = prepayment_params.validate(params, fail_fast=True)
+    if errors:
+        return None, errors[0]
+
+    extra_payment, lump_sum, payment_increase = values
+    return (extra_payment or 0., lump_sum or 0., (payment_increase or 0.) / 100), None
 
-    return result
 
 async def recurring_payment(request):
 
-    params = dict(request.query_params)
-
-    # Verify that the required arguments have been passed
-    required_keys = ['asking_price', 'down_payment', 'payment_schedule', 'amortization_period']
-    for key in required_keys:
-        if key not in params.keys():
-            raise HTTPException(HTTP_400_BAD_REQUEST, f'The required query parameter "{key}" is missing.')
-
-    # Remove any extraneous parameters sent with the request
-    for key in params.keys():
-        if key not in required_keys:
-            del(params[key])
-
-    # Convert the user provided values to the appropriate data types
-    param_dtypes = {key: calc.param_dtypes[key] for key in required_keys}
-    unconverted_params = params
-    params = convert_params(params, param_dtypes)
-    if params is None:
-        for param in unconverted_params:
-            result = convert_param(param, calc.param_dtypes)
-            if result is None:
-                raise HTTPException(HTTP_400_BAD_REQUEST, f'The parameter {param} is malformed.')
-
-    # Validate the values provided by the user for each query param
-    validators = ValidatorHandler()
-    validators.add('asking_price', AskingPriceValidationError, validate_positive_float)
-    validators.add('down_payment', DownPaymentValidationError, validate_positive_float)
-    validators.add('payment_schedule', PaymentScheduleValidationError, validate_payment_schedule, calc.annual_payments)
-    validators.add('amortization_period',
-                   AmortizationPeriodValidationError,
-                   validate_positive_integer_in_range,
-                   calc.minimum_amortization_period,
-                   calc.maximum_amortization_period)
-
-    errors = validators.validate_all(params, required_keys)
+    timer = metrics.stage_timer('/payment-amount')
+    params = request.query_params
+    timer.mark('parse')
+    values, error = parse_payment_params(params)
+    if error is not None:
+        return reject(params, payment_params, error)
+    asking_price, down_payment, payment_schedule, amortization_period, product = values
+    timer.mark('validation')
+
+    # Calculate the recurring payment
+    mortgage = calc.payment_per_period(asking_price, down_payment, payment_schedule, amortization_period, product)
+    timer.mark('calculation')
+
+    response = mortgage_response(mortgage)
+    timer.mark('serialization')
+    return response
+
+
+def mortgage_response(mortgage):
+    # An approved quote is a single float, so its body is built directly instead of going through json.dumps.
+    # repr gives the same text json.dumps would for a finite float.
+    if mortgage.status_code == APPROVED:
+        body = b'{"payment_per_period":' + repr(mortgage.payment_per_period).encode() + b'}'
+    else:
+        body = json.dumps({'mortgage_status': 'declined', 'reason': mortgage.status_text},
+                          ensure_ascii=False, separators=(',', ':')).encode()
+    return Response(body, media_type='application/json')
+
+
+async def create_quote_session(request):
+    # Starts a what-if session with the same params as GET /payment-amount. The session keeps the state derived from
+    # them, so a planner can then send only the input a slider changed to PATCH /payment-sessions/{session_id}.
+    params = request.query_params
+    values, error = parse_payment_params(params)
+    if error is not None:
+        return reject(params, payment_params, error)
+    asking_price, down_payment, payment_schedule, amortization_period, product = values
+    session = calc.quote_session(asking_price, down_payment, payment_schedule, amortization_period, product)
+    session_id = session_tokens.issue(session.inputs())
+    quote_sessions.put(session_id, session)
+    return quote_session_response(session_id, session, session.quote(), 201)
+
+
+async def update_quote_session(request):
+    # Only the params that are given are converted and validated, and only the state that depends on them is
+    # recalculated. Every change gets a new session id holding the new inputs.
+    session_id = request.path_params['session_id']
+    session = quote_sessions.get(session_id)
+    try:
+        if session is None:
+            # The session was created or last changed by another worker, or has left this one's memory
+            inputs = session_tokens.read(session_id)
+            if inputs is None:
+                raise HTTPException(HTTP_404_NOT_FOUND, 'The session does not exist or has expired.')
+            session = calc.quote_session(*inputs)
+        elif session.calc is not calc:
+            # The configuration changed since the session was last used
+            session.bind(calc)
+    except ValueError:
+        raise ProductValidationError
+    values, errors = payment_params.validate_present(request.query_params, fail_fast=True)
+    if errors:
+        return error_response(errors[0])
+    if values.get('asking_price', session.asking_price) < values.get('down_payment', session.down_payment):
+        return error_response(DOWN_PAYMENT_ABOVE_ASKING_PRICE)
+
+    try:
+        mortgage = session.update(**values)
+    except ValueError:
+        raise ProductValidationError
+    # The old id now belongs to inputs the session no longer has, so a worker given it again rebuilds them from it
+    quote_sessions.discard(session_id)
+    session_id = session_tokens.issue(session.inputs())
+    quote_sessions.put(session_id, session)
+    return quote_session_response(session_id, session, mortgage)
+
+
+def quote_session_response(session_id, session, mortgage, status_code=200):
+    if mortgage.status_code == APPROVED:
+        result = {'payment_per_period': mortgage.payment_per_period}
+    else:
+        result = {'mortgage_status': 'declined', 'reason': mortgage.status_text}
+    return JSONResponse({'session_id': session_id, **result, **session.state()}, status_code=status_code)
+
+
+def admit(size):
+    try:
+        return execution.admit(size)
+    except ExecutorOverloaded:
+        raise ServerBusyError
+
+
+def run_at_rate(config_offset, interest_rate, version, product_table, func, *args):
+    # A worker process has its own calculator, which is brought up to the configuration and rates of the request
+    # before func runs. A worker started without a copy of this process's memory configures itself first.
+    if calc is None:
+        configure()
+    if config_log is not None and config_log.offset < config_offset:
+        reload_config()
+    if (interest_rate, version) != (calc.interest_rate, calc.rate_version):
+        calc.publish_rate(interest_rate, version)
+    product_version, product_rates = product_table
+    if (product_version, product_rates) != calc.product_table():
+        calc.publish_product_rates(product_rates, product_version)
+    return func(*args)
+
+
+async def offload(func, *args):
+    # In thread mode the calculator is shared, so it is never behind the request
+    if execution.mode != 'process':
+        return await execution.call(func, *args)
+    interest_rate, factors, version = calc.rate_state()
+    config_offset = 0 if config_log is None else config_log.offset
+    return await execution.call(run_at_rate, config_offset, interest_rate, version, calc.product_table(), func, *args)
+
+
+async def calculate(size, func, *args):
+    # Calls func inline or in the executor depending on the size of the work, raising a 429 when the executor is full
+    if not admit(size):
+        return func(*args)
+    try:
+        return await offload(func, *args)
+    finally:
+        execution.release()
+
+
+class RecurringPaymentBatch:
+    # Accepts either a JSON array or newline delimited JSON objects with the same keys as GET /payment-amount and
+    # streams back one NDJSON result per input row, in order, as each chunk of rows is calculated.
+    # This is a raw ASGI app rather than a request/response endpoint because an NDJSON body is read while the
+    # response is being sent, which StreamingResponse does not allow.
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if request.headers.get('content-type', '').startswith('application/json'):
+            try:
+                rows = json.loads(await request.body())
+            except ValueError:
+                rows = None
+            if not isinstance(rows, list):
+                raise HTTPException(HTTP_400_BAD_REQUEST, 'The request body must be a JSON array or newline delimited JSON.')
+            size = len(rows)
+            rows = iterate_json_array(rows)
+        else:
+            # The number of rows in a stream is not known up front, so it is treated as a full chunk
+            size = BATCH_CHUNK_SIZE
+            rows = iterate_ndjson(request.stream())
+
+        # The request is admitted once, before the response starts, so that a 429 can still be sent
+        offloaded = admit(size)
+        try:
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': [(b'content-type', b'application/x-ndjson')]})
+            async for results in stream_batch_results(rows, offloaded):
+                await send({'type': 'http.response.body', 'body': results.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if offloaded:
+                execution.release()
+
+
+async def iterate_json_array(rows):
+    for row in rows:
+        yield row
+
+
+async def iterate_ndjson(stream):
+    buffer = b''
+    async for chunk in stream:
+        buffer += chunk
+        lines = buffer.split(b'\n')
+        buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield parse_ndjson_line(line)
+    if buffer.strip():
+        yield parse_ndjson_line(buffer)
+
+
+def parse_ndjson_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+async def stream_batch_results(rows, offloaded=False):
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) == BATCH_CHUNK_SIZE:
+            yield await offload(calculate_batch_chunk, chunk) if offloaded else calculate_batch_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield await offload(calculate_batch_chunk, chunk) if offloaded else calculate_batch_chunk(chunk)
+
+
+def calculate_batch_chunk(rows):
+    results = [None] * len(rows)
+    # Rows are calculated in one batch per product
+    products = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[index] = {'error': 'The row is not a JSON object.'}
+            continue
+        # Rows are converted from strings exactly like query params so both endpoints accept the same values
+        params = {key: str(value) for key, value in row.items()}
+        values, error = parse_payment_params(params)
+        if error is not None:
+            results[index] = {'error': error_detail(error)}
+            continue
+        *values, product = values
+        indices, columns = products.setdefault(product, ([], ([], [], [], [])))
+        indices.append(index)
+        for column, value in zip(columns, values):
+            column.append(value)
+
+    for product, (indices, columns) in products.items():
+        payments, statuses = calc.payment_per_period_batch(*columns, product)
+        for position, index in enumerate(indices):
+            if statuses[position] == APPROVED:
+                results[index] = {'payment_per_period': payments[position]}
+            else:
+                reason = calc.decline_reason(statuses[position], columns[0][position])
+                results[index] = {'mortgage_status': 'declined', 'reason': reason}
+
+    return ''.join(json.dumps(result) + '\n' for result in results)
+
+
+async def amortization_schedule(request):
+
+    params = request.query_params
+    output_format = clean_string(params.get('format', 'csv'))
+    if output_format not in schedule_encoders:
+        raise HTTPException(HTTP_400_BAD_REQUEST, 'The allowed values for "format" are "csv" and "ndjson".')
+
+    values, error = parse_payment_params(params)
+    if error is not None:
+        return reject(params, payment_params, error)
+    asking_price, down_payment, payment_schedule, amortization_period, product = values
+    prepayments, error = parse_prepayment_params(params)
+    if error is not None:
+        return reject(params, prepayment_params, error)
+
+    if any(prepayments):
+        mortgage, rows = calc.prepayment_schedule(asking_price, down_payment, payment_schedule, amortization_period,
+                                                  *prepayments, product)
+    else:
+        mortgage, rows = calc.amortization_schedule(asking_price, down_payment, payment_schedule, amortization_period,
+                                                    product)
+    if mortgage.status == 'declined':
+        return mortgage_response(mortgage)
+
+    # The rows are generated lazily while the response is sent, on the event loop for short schedules and on the
+    # executor's threads for long ones
+    encoder, media_type = schedule_encoders[output_format]
+    if not admit(calc.annual_payments[payment_schedule] * amortization_period):
+        return StreamingResponse(iterate_inline(encoder(rows)), media_type=media_type)
+    return OffloadedStreamingResponse(execution.iterate(encoder(rows)), media_type=media_type)
+
+
+async def iterate_inline(iterator):
+    for item in iterator:
+        yield item
+
+
+class OffloadedStreamingResponse(StreamingResponse):
+    # Releases the place the request was admitted with however the response ends. A release in the body's generator
+    # would never run if the client went away or sending failed before the body was iterated, and every such request
+    # would keep its place until the executor turned all large requests away.
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            execution.release()
+
+
+def encode_schedule_csv(rows):
+    yield ','.join(SCHEDULE_COLUMNS) + '\n'
+    lines = []
+    for row in rows:
+        lines.append(','.join([str(value) for value in row]))
+        if len(lines) == SCHEDULE_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def encode_schedule_ndjson(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(SCHEDULE_COLUMNS, row))))
+        if len(lines) == SCHEDULE_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+schedule_encoders = {
+    'csv': (encode_schedule_csv, 'text/csv'),
+    'ndjson': (encode_schedule_ndjson, 'application/x-ndjson')
+}
+
+
+async def payment_grid(request):
+
+    params = request.query_params
+    values, errors = grid_params.validate(params, fail_fast=True)
     if errors:
-        raise errors[0]
+        return reject(params, grid_params, errors[0])
 
-    asking_price, down_payment, payment_schedule, amortization_period = unpack_params(params, required_keys)
+    (asking_price, payment_schedule, rate_min, rate_max, rate_step,
+     down_payment, down_payment_percentages, amortization_periods) = values
 
-    if asking_price < down_payment:
+    if rate_step is None:
+        rate_step = .25
+    if rate_min <= 0 or rate_max < rate_min or rate_max > MAX_INTEREST_RATE * 100 or rate_step <= 0:
+        raise InterestRateRangeValidationError
+    # The rates are only listed once the size of the grid is known to be within the limit
+    n_rates = int((rate_max - rate_min) / rate_step + 1e-9) + 1
+
+    down_payments = [] if down_payment is None else [down_payment]
+    if down_payment_percentages is not None:
+        down_payments.extend(asking_price * percentage / 100 for percentage in down_payment_percentages)
+    if not down_payments:
+        raise HTTPException(HTTP_400_BAD_REQUEST,
+                            'The required query parameter "down_payment" or "down_payment_percentages" is missing.')
+    if any(asking_price < down_payment for down_payment in down_payments):
         raise HTTPException(HTTP_400_BAD_REQUEST, "The down payment cannot exceed the asking price.")
 
-    # Calculate the recurring payment
-    mortgage = calc.payment_per_period(asking_price, down_payment, payment_schedule, amortization_period)
+    if amortization_periods is None:
+        amortization_periods = list(range(calc.minimum_amortization_period, calc.maximum_amortization_period + 1))
+
+    if len(down_payments) * n_rates * len(amortization_periods) > MAX_GRID_CELLS:
+        raise HTTPException(HTTP_400_BAD_REQUEST, f'The grid cannot have more than {MAX_GRID_CELLS} payments.')
+    interest_rates = [round(rate_min + i * rate_step, 6) for i in range(n_rates)]
+
+    statuses, grids = await calculate(len(down_payments) * len(interest_rates) * len(amortization_periods),
+                                      calculate_payment_grid,
+                                      asking_price,
+                                      down_payments,
+                                      payment_schedule,
+                                      [interest_rate / 100 for interest_rate in interest_rates],
+                                      amortization_periods)
+
+    rows = []
+    for down_payment, status, grid in zip(down_payments, statuses, grids):
+        if status == APPROVED:
+            rows.append({'down_payment': down_payment, 'payments': grid})
+        else:
+            rows.append({'down_payment': down_payment,
+                         'mortgage_status': 'declined',
+                         'reason': calc.decline_reason(status, asking_price)})
+
+    return JSONResponse({'interest_rates': interest_rates, 'amortization_periods': amortization_periods, 'rows': rows})
+
 
+def calculate_payment_grid(asking_price, down_payments, payment_schedule, interest_rates, amortization_periods):
+    # A module level function rather than the bound method so that it can be sent to a worker process
+    return calc.payment_grid(asking_price, down_payments, payment_schedule, interest_rates, amortization_periods)
+
+
+async def prepayment_scenarios(request):
+    # Compares prepayment strategies for one mortgage. The body holds the params of GET /payment-amount and a list of
+    # "strategies", each with any of the prepayment params of GET /amortization-schedule.
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict) or not isinstance(body.get('strategies'), list):
+        raise HTTPException(HTTP_400_BAD_REQUEST, 'The request body must be a JSON object with the mortgage params '
+                                                  'and a list of "strategies".')
+    strategies = body.pop('strategies')
+    if not 0 < len(strategies) <= MAX_PREPAYMENT_STRATEGIES:
+        raise HTTPException(HTTP_400_BAD_REQUEST,
+                            f'Between 1 and {MAX_PREPAYMENT_STRATEGIES} strategies can be compared at once.')
+
+    # Values are converted from strings exactly like query params, as for the rows of POST /payment-amount/batch
+    values, error = parse_payment_params({key: str(value) for key, value in body.items()})
+    if error is not None:
+        return error_response(error)
+    asking_price, down_payment, payment_schedule, amortization_period, product = values
+    columns = ([], [], [])
+    for strategy in strategies:
+        if not isinstance(strategy, dict):
+            raise HTTPException(HTTP_400_BAD_REQUEST, 'Each strategy must be a JSON object.')
+        prepayments, error = parse_prepayment_params({key: str(value) for key, value in strategy.items()})
+        if error is not None:
+            return error_response(error)
+        for column, value in zip(columns, prepayments):
+            column.append(value)
+
+    annual_payments = calc.annual_payments[payment_schedule]
+    mortgage, baseline, results = await calculate(len(strategies) * annual_payments * amortization_period,
+                                                  calculate_prepayment_scenarios,
+                                                  asking_price,
+                                                  down_payment,
+                                                  payment_schedule,
+                                                  amortization_period,
+                                                  *columns,
+                                                  product)
     if mortgage.status == 'declined':
-        return JSONResponse({'mortgage_status': 'declined', 'reason': mortgage.status_text})
-    else:
-        return JSONResponse({'payment_per_period': mortgage.payment_per_period})
+        return mortgage_response(mortgage)
+
+    n_payments, total_interest = baseline
+    return JSONResponse({
+        'payment_per_period': mortgage.payment_per_period,
+        'baseline': payoff_result(n_payments, total_interest, annual_payments),
+        'strategies': [{**payoff_result(n_payments, interest, annual_payments),
+                        'interest_saved': round(total_interest - interest, 2)}
+                       for n_payments, interest in results]
+    })
+
+
+def payoff_result(n_payments, total_interest, annual_payments):
+    return {'payments': n_payments, 'years': round(n_payments / annual_payments, 2), 'total_interest': total_interest}
+
+
+def calculate_prepayment_scenarios(asking_price, down_payment, payment_schedule, amortization_period, extra_payments,
+                                   lump_sums, payment_increases, product):
+    # A module level function rather than the bound method so that it can be sent to a worker process
+    return calc.prepayment_scenarios(asking_price, down_payment, payment_schedule, amortization_period, extra_payments,
+                                     lump_sums, payment_increases, product)
 
 
 async def maximum_mortgage(request):
-    params = dict(request.query_params)
-    required_keys = ['payment', 'payment_schedule', 'amortization_period']
-    for key in required_keys:
-        if key not in params.keys():
-            raise HTTPException(HTTP_400_BAD_REQUEST, f'The required query parameter "{key}" is missing.')
-
-    # Remove any extraneous parameters sent with the request
-    for key in params.keys():
-        if key not in required_keys:
-            del (params[key])
-
-
-    # Convert the query strings to the appropriate data types
-    param_dtypes = {key: calc.param_dtypes[key] for key in required_keys}
-    unconverted_params = params
-    params = convert_params(params, param_dtypes)
-    if params is None:
-        for param in unconverted_params:
-            result = convert_param(param, param_dtypes[param])
-            if result is None:
-                raise HTTPException(HTTP_400_BAD_REQUEST, f'The parameter {param} is malformed.')
-
-    # Strip and convert string to lowercase for comparison to allowed keys
-    params['payment_schedule'] = clean_string(params['payment_schedule'])
-
-    validators = ValidatorHandler()
-    validators.add('payment', PaymentValidationError, validate_positive_float)
-    validators.add('payment_schedule', PaymentScheduleValidationError, validate_payment_schedule, calc.annual_payments)
-    validators.add('amortization_period',
-                   AmortizationPeriodValidationError,
-                   validate_positive_integer_in_range,
-                   calc.minimum_amortization_period,
-                   calc.maximum_amortization_period + 1)
-
-    errors = validate_params(params, required_keys, validators)
+
+    timer = metrics.stage_timer('/mortgage-amount')
+    params = request.query_params
+    timer.mark('parse')
+    values, errors = maximum_params.validate(params, fail_fast=True)
     if errors:
-        raise errors[0]
+        return reject(params, maximum_params, errors[0])
+    timer.mark('validation')
+
+    payment, payment_schedule, amortization_period, down_payment, product = values
 
-    payment, payment_schedule, amortization_period = unpack_params(params, required_keys)
+    result = {'maximum_mortgage': round(calc.maximum(payment, payment_schedule, amortization_period, product), 2)}
+    if down_payment is not None:
+        # The down payment is optional and adds the maximum asking price to the response
+        result['maximum_asking_price'] = calc.maximum_asking_price(payment, down_payment, payment_schedule,
+                                                                   amortization_period, product)
+    timer.mark('calculation')
 
-    max_mortgage = round(calc.maximum(payment, payment_schedule, amortization_period), 2)
-    return JSONResponse({'maximum_mortgage': max_mortgage})
+    response = JSONResponse(result)
+    timer.mark('serialization')
+    return response
 
 
 async def change_interest_rate(request):
     # Validate the user provided interest rate
+    timer = metrics.stage_timer('/interest-rate')
     json = await request.json()
+    timer.mark('parse')
     new_rate = json['interest_rate']
     if not isinstance(new_rate, float):
         new_rate = convert_param(new_rate, float)
     if new_rate is None:
         raise HTTPException(HTTP_400_BAD_REQUEST, 'The interest rate provided cannot be converted to a float. ' +
                                                     'Make sure it does not contain any non-numeric characters.')
-    validator = Validator(InterestRateValidationError, validate_positive_float)
+    validator = Validator(InterestRateValidationError, validate_interest_rate, MAX_INTEREST_RATE * 100)
     error = validator.validate(new_rate)
     if error:
         raise error
 
-    old_rate = calc.interest_rate
-    calc.interest_rate = new_rate / 100
+    # An optional product changes the rate of that product instead of the default rate, adding it if it is new
+    product = json.get('product')
+    if product is not None and (not isinstance(product, str) or not clean_string(product)):
+        raise HTTPException(HTTP_400_BAD_REQUEST, 'The product must be a non-empty string.')
+    timer.mark('validation')
+
+    if product is None:
+        old_rate = calc.interest_rate
+        change = {'interest_rate': new_rate / 100}
+        result = {'old_interest_rate': old_rate, 'new_interest_rate': new_rate}
+    else:
+        product = clean_string(product)
+        old_rate = calc.product_rates().get(product)
+        change = {'product_rates': {product: new_rate / 100}}
+        result = {'product': product, 'old_interest_rate': old_rate, 'new_interest_rate': new_rate}
+
+    if config_log is None:
+        # Without a config log the rate is changed in place
+        if product is None:
+            calc.interest_rate = new_rate / 100
+        else:
+            calc.set_product_rate(product, new_rate / 100)
+    else:
+        try:
+            update_config(change)
+        except ValueError as error:
+            raise HTTPException(HTTP_400_BAD_REQUEST, str(error))
+    timer.mark('calculation')
+
+    response = JSONResponse(result)
+    timer.mark('serialization')
+    return response
+
+
+# The settings that PATCH /config can change. Rates are changed through PATCH /interest-rate.
+CONFIG_SETTINGS = ('insurance_tiers', 'insurable_limit', 'minimum_amortization_period', 'maximum_amortization_period')
+
+
+async def get_config(request):
+    return JSONResponse({**calc.config(), 'persisted': config_log is not None})
+
+
+async def change_config(request):
+    try:
+        change = await request.json()
+    except ValueError:
+        change = None
+    if not isinstance(change, dict) or not change:
+        raise HTTPException(HTTP_400_BAD_REQUEST, 'The request body must be a JSON object of settings to change.')
+    unknown = [key for key in change if key not in CONFIG_SETTINGS]
+    if unknown:
+        raise HTTPException(HTTP_400_BAD_REQUEST, f'The settings that can be changed are {", ".join(CONFIG_SETTINGS)}.')
+    try:
+        update_config(change)
+    except ValueError as error:
+        raise HTTPException(HTTP_400_BAD_REQUEST, str(error))
+    return JSONResponse({**calc.config(), 'persisted': config_log is not None})
+
+
+def update_config(change):
+    # Applies a change to the configuration. A calculator for the new configuration is built first, which validates
+    # it, so that a bad change is never persisted. With a config log it is built under the log's lock from every
+    # record other workers have written, since a change that is valid against this worker's configuration may not be
+    # against theirs. Raises ValueError if the change is not valid.
+    if config_log is None:
+        config = calc.config()
+        apply_change(config, change)
+        calculator = build_calculator(config, rate_store)
+    else:
+        calculator = config_log.append(change, lambda config: build_calculator(config, rate_store))
+    if rate_store is not None and 'interest_rate' in change:
+        rate_store.write(change['interest_rate'])
+        calculator.sync_rate()
+    swap_calculator(calculator)
+
+
+def reload_config():
+    # Loads the changes other workers have appended to the config log. The calculator, and with it the quote cache and
+    # error responses, is only replaced when there were changes to load.
+    if config_log.read_tail():
+        swap_calculator(build_calculator(config_log.config, rate_store))
+
+
+def swap_calculator(calculator):
+    # The calculator and the param schemas built from its settings are complete before they replace the current
+    # ones. Handlers look them up when they use them, so requests in flight carry on without interruption.
+    global calc, payment_params, maximum_params, grid_params
+    schemas = build_param_schemas(calculator)
+    calc = calculator
+    payment_params, maximum_params, grid_params = schemas
+    # The responses of the errors of the old schemas would never be used again
+    error_responses.clear()
 
-    return JSONResponse({'old_interest_rate': old_rate, 'new_interest_rate': new_rate})
 
+async def watch_config_log():
+    while True:
+        await asyncio.sleep(CONFIG_SYNC_INTERVAL)
+        if config_log.changed():
+            try:
+                reload_config()
+            except ValueError:
+                # The current configuration stays in use; every change is validated before it is logged
+                pass
 
-app = Starlette(debug=True, routes=[
+
+@asynccontextmanager
+async def config_log_lifespan(app):
+    task = asyncio.create_task(watch_config_log())
+    try:
+        yield
+    finally:
+        task.cancel()
+
+
+async def interest_rates(request):
+    # Rates are returned as percentages, the same way PATCH /interest-rate takes them
+    product_version, product_rates = calc.product_table()
+    return JSONResponse({'interest_rate': calc.interest_rate * 100,
+                         'rate_version': calc.rate_version,
+                         'products': {product: interest_rate * 100 for product, interest_rate in product_rates.items()},
+                         'product_version': product_version})
+
+
+async def quote_cache_stats(request):
+    if calc.quote_cache is None:
+        return JSONResponse({'enabled': False})
+    return JSONResponse({'enabled': True, 'rate_version': calc.rate_version, **calc.quote_cache.stats()})
+
+
+async def prometheus_metrics(request):
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+def quote_cache_metrics():
+    stats = calc.quote_cache.stats()
+    return [
+        ('quote_cache_size', 'gauge', 'Number of quotes in the cache.', stats['size']),
+        ('quote_cache_hits_total', 'counter', 'Number of quotes served from the cache.', stats['hits']),
+        ('quote_cache_misses_total', 'counter', 'Number of quotes not found in the cache.', stats['misses']),
+        ('quote_cache_evictions_total', 'counter', 'Number of quotes evicted to make room.', stats['evictions']),
+        ('quote_cache_expirations_total', 'counter', 'Number of quotes dropped after their ttl.', stats['expirations'])
+    ]
+
+
+def execution_metrics():
+    stats = execution.stats()
+    return [
+        ('execution_pending', 'gauge', 'Number of offloaded requests running or queued.', stats['pending']),
+        ('execution_inline_total', 'counter', 'Number of calculations run on the event loop.', stats['inline']),
+        ('execution_offloaded_total', 'counter', 'Number of requests offloaded to the executor.', stats['offloaded']),
+        ('execution_rejected_total', 'counter', 'Number of requests rejected with a 429.', stats['rejected'])
+    ]
+
+
+routes = [
     Route('/payment-amount', recurring_payment, methods=['GET']),
+    Route('/payment-amount/batch', RecurringPaymentBatch(), methods=['POST']),
+    Route('/payment-sessions', create_quote_session, methods=['POST']),
+    Route('/payment-sessions/{session_id}', update_quote_session, methods=['PATCH']),
+    Route('/amortization-schedule', amortization_schedule, methods=['GET']),
+    Route('/payment-grid', payment_grid, methods=['GET']),
+    Route('/prepayment-scenarios', prepayment_scenarios, methods=['POST']),
     Route('/mortgage-amount', maximum_mortgage, methods=['GET']),
-    Route('/interest-rate', change_interest_rate, methods=['PATCH'])
-])
\ No newline at end of file
+    Route('/interest-rate', change_interest_rate, methods=['PATCH']),
+    Route('/interest-rates', interest_rates, methods=['GET']),
+    Route('/config', get_config, methods=['GET']),
+    Route('/config', change_config, methods=['PATCH']),
+    Route('/quote-cache', quote_cache_stats, methods=['GET'])
+]
+
+
+def configure():
+    global calc, rate_store, config_log, quote_sessions, session_tokens, execution, metrics
+    global payment_params, maximum_params, grid_params
+    defaults = MortgageCalculator().config()
+    defaults['product_rates'] = parse_product_rates(os.environ.get('PRODUCT_RATES', ''))
+    if config_log is not None:
+        config_log.close()
+    config_log = build_config_log(defaults)
+    config = defaults if config_log is None else config_log.config
+    if rate_store is not None:
+        rate_store.close()
+    rate_store = build_rate_store(config['interest_rate'])
+    calc = build_calculator(config, rate_store)
+    quote_sessions = build_quote_sessions()
+    session_tokens = build_session_tokens()
+    execution = build_execution_policy()
+    payment_params, maximum_params, grid_params = build_param_schemas(calc)
+    error_responses.clear()
+    # Request metrics are collected and served on GET /metrics when METRICS_ENABLED is set to 1
+    metrics = MetricsRegistry(enabled=os.environ.get('METRICS_ENABLED') == '1',
+                              routes=[route.path for route in routes])
+    if metrics.enabled:
+        if calc.quote_cache is not None:
+            metrics.add_collector(quote_cache_metrics)
+        metrics.add_collector(execution_metrics)
+
+
+def create_app(debug=False):
+    # The app factory for production, e.g. uvicorn --factory api:create_app. Debug tracebacks are off. Every app
+    # shares the handlers' module level state, so a process should create one app.
+    configure()
+    app_routes = list(routes)
+    middleware = []
+    if metrics.enabled:
+        app_routes.append(Route('/metrics', prometheus_metrics, methods=['GET']))
+        middleware.append(Middleware(MetricsMiddleware, registry=metrics))
+    lifespan = None if config_log is None else config_log_lifespan
+    return Starlette(debug=debug, routes=app_routes, middleware=middleware, lifespan=lifespan)
+
+
+def __getattr__(name):
+    # api.app, as used by uvicorn api:app during development, is created with debug tracebacks the first time it is
+    # looked up rather than when the module is imported
+    if name == 'app':
+        global app
+        app = create_app(debug=True)
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
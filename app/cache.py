@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+
+class QuoteCache:
+    # A bounded LRU cache with an optional time to live for calculated quotes. Keys include the rate version of
+    # the calculator, so entries calculated at an old rate are never returned and simply age out of the cache.
+    def __init__(self, maxsize=10000, ttl=None):
+        if maxsize <= 0:
+            raise ValueError('The cache size must be greater than 0.')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires = entry
+            if expires is not None and expires <= monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        expires = monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
@@ -1,19 +1,45 @@
-from math import modf
+from bisect import bisect_right
+from decimal import Decimal, ROUND_HALF_UP
+from functools import partial
+from threading import Lock
+from time import monotonic
+import math
+
+APPROVED = 0
+DECLINED_MINIMUM_DOWN_PAYMENT = 1
+DECLINED_INSURABLE_LIMIT = 2
+INVALID_INPUT = 3
+
+# The precision down payment percentages are rounded to when their insurance tier is looked up
+TIER_PRECISION = .0001
+
+# The largest amount of money accepted as an input. Amounts beyond it are not real mortgages, the cents mode is only
+# exact to the cent below about a trillion dollars, and at around 1e15 a cent no longer changes a float.
+MAX_AMOUNT = 1e12
+
+# The lowest down payment percentage minimum_down_payment allows, which is 5% of any asking price up to $500,000
+MINIMUM_DOWN_PAYMENT_PERCENTAGE = .05
+
+# The highest interest rate accepted, as a fraction. annuity_factor divides by zero at a rate of 0 and overflows at
+# huge rates, so every rate is checked with valid_interest_rate before it is published.
+MAX_INTEREST_RATE = 1.
+
 
 class MortgageCalculator:
-    def __init__(self):
-        self.interest_rate = .025
+    def __init__(self, quote_cache=None, rate_store=None, rate_sync_interval=.1, insurance_tiers=None):
         self.annual_payments = {
             'weekly': 52,
             'biweekly': 26,
             'monthly': 12
         }
-        self.insurance_tiers = [
-            {'min': .05, 'max': .0999, 'rate': .0315},
-            {'min': .1, 'max': .1499, 'rate': .024},
-            {'min': .15, 'max': .1999, 'rate': .018},
-            {'min': .2, 'max': 1.00, 'rate': 0}
-        ]
+        if insurance_tiers is None:
+            insurance_tiers = [
+                {'min': .05, 'max': .0999, 'rate': .0315},
+                {'min': .1, 'max': .1499, 'rate': .024},
+                {'min': .15, 'max': .1999, 'rate': .018},
+                {'min': .2, 'max': 1.00, 'rate': 0}
+            ]
+        self.insurance_tiers = InsuranceTiers(insurance_tiers)
         self.insurable_limit = 1000000
         self.minimum_amortization_period = 5
         self.maximum_amortization_period = 25
@@ -24,77 +50,922 @@ class MortgageCalculator:
             'amortization_period': int,
             'payment': float
         }
+        # An optional QuoteCache in front of payment_per_period and maximum
+        self.quote_cache = quote_cache
+        # An optional RateStore shared with other processes. The local copy of the rate is refreshed from it at
+        # most rate_sync_interval seconds after another process changes it.
+        self.rate_store = rate_store
+        self.rate_sync_interval = rate_sync_interval
+        self.next_rate_sync = 0.
+        self._rate_state = (None, {}, 0)
+        # Rates of named products, such as a 5 year fixed or a variable rate, kept alongside the default rate as
+        # (version, {product: (interest_rate, factors, version)}). The whole table is replaced on every change, so
+        # readers never lock and never see a half updated table.
+        self._product_table = (0, {})
+        self.product_lock = Lock()
+        if rate_store is None:
+            self.interest_rate = .025
+        else:
+            self.sync_rate()
+
+    @property
+    def interest_rate(self):
+        return self.rate_state()[0]
+
+    @interest_rate.setter
+    def interest_rate(self, interest_rate):
+        if not valid_interest_rate(interest_rate):
+            raise ValueError(f'Interest rates must be numbers > 0 and <= {MAX_INTEREST_RATE}.')
+        if self.rate_store is None:
+            version = self._rate_state[2] + 1
+        else:
+            version = self.rate_store.write(interest_rate)
+        self.publish_rate(interest_rate, version)
+
+    @property
+    def rate_version(self):
+        return self.rate_state()[2]
+
+    def rate_state(self, product=None):
+        # Returns the (interest_rate, factors, version) of a product, or of the default rate if product is None
+        if product is not None:
+            try:
+                return self._product_table[1][product]
+            except KeyError:
+                raise ValueError(f'There is no rate for the product "{product}".') from None
+        if self.rate_store is not None and monotonic() >= self.next_rate_sync:
+            self.sync_rate()
+        return self._rate_state
+
+    def sync_rate(self):
+        self.next_rate_sync = monotonic() + self.rate_sync_interval
+        version, interest_rate = self.rate_store.read()
+        if version != self._rate_state[2]:
+            self.publish_rate(interest_rate, version)
+
+    def publish_rate(self, interest_rate, version):
+        # The rate, its annuity factors and its version are published together as one tuple so a reader never sees
+        # a new rate paired with factors built for the old one. A new version invalidates cached quotes.
+        self._rate_state = (interest_rate, self.build_payment_factors(interest_rate), version)
+
+    def config(self):
+        return {
+            'interest_rate': self.interest_rate,
+            'product_rates': self.product_rates(),
+            'insurance_tiers': [dict(tier) for tier in self.insurance_tiers],
+            'insurable_limit': self.insurable_limit,
+            'minimum_amortization_period': self.minimum_amortization_period,
+            'maximum_amortization_period': self.maximum_amortization_period
+        }
+
+    def apply_config(self, config):
+        # Sets every setting from a config (see config()) and rebuilds the state derived from them. This is meant for
+        # a calculator that is not serving quotes yet, which is then swapped in whole. Raises ValueError if the config
+        # is not valid. With a rate store the default rate comes from the store instead of the config.
+        minimum_period = config['minimum_amortization_period']
+        maximum_period = config['maximum_amortization_period']
+        if not isinstance(minimum_period, int) or not isinstance(maximum_period, int) or \
+                not 1 <= minimum_period <= maximum_period:
+            raise ValueError('The amortization periods must be whole numbers with 1 <= minimum <= maximum.')
+        insurable_limit = config['insurable_limit']
+        if not is_number(insurable_limit) or not 0 <= insurable_limit < math.inf:
+            raise ValueError('The insurable limit must be a finite number >= 0.')
+        try:
+            insurance_tiers = InsuranceTiers(config['insurance_tiers'])
+        except (KeyError, TypeError):
+            raise ValueError('Each insurance tier must have a numeric "min", "max" and "rate".') from None
+        if insurance_tiers.breakpoints[0] > MINIMUM_DOWN_PAYMENT_PERCENTAGE or insurance_tiers.upper_bound < 1:
+            # Quotes can be approved at any percentage from the minimum down payment up to paying it all
+            raise ValueError(f'The insurance tiers must cover every down payment percentage from '
+                             f'{MINIMUM_DOWN_PAYMENT_PERCENTAGE} to 1.')
+        if not isinstance(config['product_rates'], dict):
+            raise ValueError('The product rates must be an object of products and their interest rates.')
+        rates = [config['interest_rate'], *config['product_rates'].values()]
+        if not all(valid_interest_rate(rate) for rate in rates):
+            raise ValueError(f'Interest rates must be numbers > 0 and <= {MAX_INTEREST_RATE}.')
+
+        self.insurance_tiers = insurance_tiers
+        self.insurable_limit = insurable_limit
+        self.minimum_amortization_period = minimum_period
+        self.maximum_amortization_period = maximum_period
+        if self.rate_store is None:
+            self.interest_rate = config['interest_rate']
+        else:
+            # The factors are rebuilt for the new amortization periods
+            interest_rate, factors, version = self._rate_state
+            self.publish_rate(interest_rate, version)
+        # Every product's factors are rebuilt too, rather than reused for an unchanged rate
+        self._product_table = (self.product_version, {})
+        self.set_product_rates(config['product_rates'])
+
+    @property
+    def product_version(self):
+        return self._product_table[0]
 
+    def has_product(self, product):
+        return product in self._product_table[1]
 
-    def payment_per_period(self, asking_price, down_payment, payment_schedule, amortization_period):
+    def product_rates(self):
+        return self.product_table()[1]
+
+    def product_table(self):
+        # Returns (version, {product: interest_rate}) from a single snapshot
+        version, table = self._product_table
+        return version, {product: state[0] for product, state in table.items()}
+
+    def set_product_rate(self, product, interest_rate):
+        with self.product_lock:
+            rates = self.product_rates()
+            rates[product] = interest_rate
+            self.publish_product_rates(rates, self.product_version + 1)
+
+    def set_product_rates(self, rates):
+        # Replaces the whole product table
+        with self.product_lock:
+            self.publish_product_rates(rates, self.product_version + 1)
+
+    def publish_product_rates(self, rates, version):
+        if not all(valid_interest_rate(interest_rate) for interest_rate in rates.values()):
+            raise ValueError(f'Interest rates must be numbers > 0 and <= {MAX_INTEREST_RATE}.')
+        # Factors are built for every product before the new table is swapped in, reusing those of unchanged rates.
+        # Every entry takes the version of the table, so any change invalidates the cached quotes of all products.
+        products = self._product_table[1]
+        table = {}
+        for product, interest_rate in rates.items():
+            state = products.get(product)
+            factors = state[1] if state is not None and state[0] == interest_rate else \
+                self.build_payment_factors(interest_rate)
+            table[product] = (interest_rate, factors, version)
+        self._product_table = (version, table)
+
+    def build_payment_factors(self, interest_rate):
+        factors = {}
+        for payment_schedule, annual_payments in self.annual_payments.items():
+            for amortization_period in range(self.minimum_amortization_period, self.maximum_amortization_period + 1):
+                n_payments = annual_payments * amortization_period
+                factors[(payment_schedule, amortization_period)] = annuity_factor(interest_rate, annual_payments, n_payments)
+        return factors
+
+    def payment_factor(self, payment_schedule, amortization_period, product=None):
+        interest_rate, factors, version = self.rate_state(product)
+        factor = factors.get((payment_schedule, amortization_period))
+        if factor is None:
+            annual_payments = self.annual_payments[payment_schedule]
+            factor = annuity_factor(interest_rate, annual_payments, annual_payments * amortization_period)
+        return factor
+
+    def payment_per_period(self, asking_price, down_payment, payment_schedule, amortization_period, product=None):
+        if self.quote_cache is None:
+            return self.calculate_payment_per_period(asking_price, down_payment, payment_schedule, amortization_period,
+                                                     product)
+
+        return self.cached('payment_per_period', self.calculate_payment_per_period,
+                           asking_price, down_payment, payment_schedule, amortization_period, product=product)
+
+    def calculate_payment_per_period(self, asking_price, down_payment, payment_schedule, amortization_period,
+                                     product=None):
 
         if down_payment < minimum_down_payment(asking_price):
-            return DeclinedMortgage(f'The minimum down payment for an asking price of ${asking_price} is ${minimum_down_payment(asking_price)}.')
+            return DeclinedMortgage(status_code=DECLINED_MINIMUM_DOWN_PAYMENT, asking_price=asking_price)
 
         principal = asking_price - down_payment
         if self.insurable_limit < principal and down_payment_percentage(asking_price, down_payment) < .2:
-            return DeclinedMortgage(f'You must make a down payment of at least 20% on mortgages over ${self.insurable_limit}.')
+            return DeclinedMortgage(status_code=DECLINED_INSURABLE_LIMIT, asking_price=asking_price,
+                                    insurable_limit=self.insurable_limit)
 
         principal += calculate_insurance_cost(self.insurance_tiers, asking_price, down_payment)
+
+        # Same float operations as calculate_payment, with the annuity factor looked up instead of recomputed
+        payment_per_period = round(principal * self.payment_factor(payment_schedule, amortization_period, product), 2)
+        return ApprovedMortgage(payment_per_period, principal)
+
+    def quote_session(self, asking_price, down_payment, payment_schedule, amortization_period, product=None):
+        # A QuoteSession for recalculating the quote as its inputs change one at a time
+        return QuoteSession(self, asking_price, down_payment, payment_schedule, amortization_period, product)
+
+    def payment_per_period_batch(self, asking_prices, down_payments, payment_schedules, amortization_periods,
+                                 product=None):
+        # Columnar version of payment_per_period for rows of one product. Returns (payments, statuses) lists; declined
+        # rows have a payment of None and a status code that decline_reason turns into the same text the scalar path
+        # returns.
+        n_rows = len(asking_prices)
+        if not n_rows == len(down_payments) == len(payment_schedules) == len(amortization_periods):
+            raise ValueError('All input columns must have the same length.')
+
+        # Hoist everything that is constant for the batch out of the row loop
+        interest_rate, factors, version = self.rate_state(product)
+        factors = dict(factors)
+        insurable_limit = self.insurable_limit
+        schedules = self.annual_payments
+
+        payments = [None] * n_rows
+        statuses = [APPROVED] * n_rows
+        # The rows that are not declined, whose insurance rates are then looked up together
+        rows = []
+        down_payment_pcts = []
+        for i in range(n_rows):
+            asking_price = asking_prices[i]
+            down_payment = down_payments[i]
+
+            if down_payment < minimum_down_payment(asking_price):
+                statuses[i] = DECLINED_MINIMUM_DOWN_PAYMENT
+                continue
+
+            down_payment_pct = round(down_payment / asking_price, 4)
+            if insurable_limit < asking_price - down_payment and down_payment_pct < .2:
+                statuses[i] = DECLINED_INSURABLE_LIMIT
+                continue
+
+            rows.append(i)
+            down_payment_pcts.append(down_payment_pct)
+
+        for i, insurance_rate in zip(rows, self.insurance_tiers.rates_for(down_payment_pcts)):
+            asking_price = asking_prices[i]
+            principal = asking_price - down_payments[i] + asking_price * insurance_rate
+
+            key = (payment_schedules[i], amortization_periods[i])
+            factor = factors.get(key)
+            if factor is None:
+                annual_payments = schedules[key[0]]
+                factor = annuity_factor(interest_rate, annual_payments, annual_payments * key[1])
+                factors[key] = factor
+
+            payments[i] = round(principal * factor, 2)
+
+        return payments, statuses
+
+    def payment_schedule_codes(self):
+        # The payment schedules in the order used by schedule codes, i.e. code 0 is the first schedule
+        return list(self.annual_payments)
+
+    def payment_per_period_into(self, asking_prices, down_payments, schedule_codes, amortization_periods,
+                                payments, statuses, product=None):
+        # Zero-copy variant of payment_per_period_batch for preallocated buffers such as memory mapped columns.
+        # Schedules are given as codes from payment_schedule_codes. Payments and status codes are written into the
+        # output buffers in place, with a payment of 0. for declined rows and INVALID_INPUT for rows whose schedule,
+        # period or amounts cannot be quoted, including asking prices that are not finite or outside the range the API
+        # accepts, from a cent to MAX_AMOUNT. No per-row objects or reason text are created.
+        n_rows = len(asking_prices)
+        if not n_rows == len(down_payments) == len(schedule_codes) == len(amortization_periods) == len(payments) == \
+                len(statuses):
+            raise ValueError('All input and output columns must have the same length.')
+
+        interest_rate, factors, version = self.rate_state(product)
+        insurable_limit = self.insurable_limit
+        minimum_period = self.minimum_amortization_period
+        maximum_period = self.maximum_amortization_period
+
+        # Annuity factors indexed by schedule code and then period, so a row needs no tuple key
+        factor_table = [[factors.get((payment_schedule, amortization_period))
+                         for amortization_period in range(maximum_period + 1)]
+                        for payment_schedule in self.payment_schedule_codes()]
+        n_codes = len(factor_table)
+
+        # The rows that are not declined, whose insurance rates are then looked up together
+        rows = []
+        down_payment_pcts = []
+        for i in range(n_rows):
+            asking_price = asking_prices[i]
+            down_payment = down_payments[i]
+            code = schedule_codes[i]
+            amortization_period = amortization_periods[i]
+            payments[i] = 0.
+
+            if (not 0 <= code < n_codes or not minimum_period <= amortization_period <= maximum_period or
+                    not .01 <= asking_price <= MAX_AMOUNT or not 0 <= down_payment <= asking_price):
+                statuses[i] = INVALID_INPUT
+                continue
+
+            if down_payment < minimum_down_payment(asking_price):
+                statuses[i] = DECLINED_MINIMUM_DOWN_PAYMENT
+                continue
+
+            down_payment_pct = round(down_payment / asking_price, 4)
+            if insurable_limit < asking_price - down_payment and down_payment_pct < .2:
+                statuses[i] = DECLINED_INSURABLE_LIMIT
+                continue
+
+            rows.append(i)
+            down_payment_pcts.append(down_payment_pct)
+
+        for i, insurance_rate in zip(rows, self.insurance_tiers.rates_for(down_payment_pcts)):
+            asking_price = asking_prices[i]
+            principal = asking_price - down_payments[i] + asking_price * insurance_rate
+            payments[i] = round(principal * factor_table[schedule_codes[i]][amortization_periods[i]], 2)
+            statuses[i] = APPROVED
+
+    def amortization_schedule(self, asking_price, down_payment, payment_schedule, amortization_period, product=None):
+        # Returns the mortgage from payment_per_period and, if it was approved, a lazy iterator over its schedule
+        mortgage = self.payment_per_period(asking_price, down_payment, payment_schedule, amortization_period, product)
+        if mortgage.status == 'declined':
+            return mortgage, None
+
         annual_payments = self.annual_payments[payment_schedule]
-        n_payments = annual_payments * amortization_period
+        rows = amortization_schedule(mortgage.principal,
+                                     self.rate_state(product)[0],
+                                     annual_payments,
+                                     annual_payments * amortization_period,
+                                     mortgage.payment_per_period)
+        return mortgage, rows
 
-        payment_per_period = round(calculate_payment(principal, self.interest_rate, annual_payments, n_payments), 2)
-        return ApprovedMortgage(payment_per_period)
+    def prepayment_schedule(self, asking_price, down_payment, payment_schedule, amortization_period, extra_payment=0.,
+                            lump_sum=0., payment_increase=0., product=None):
+        # Like amortization_schedule, for the mortgage paid down faster with the prepayments of prepayment_schedule
+        mortgage = self.payment_per_period(asking_price, down_payment, payment_schedule, amortization_period, product)
+        if mortgage.status == 'declined':
+            return mortgage, None
 
-    def maximum(self, payment_amount, payment_schedule, amortization_period):
-        
         annual_payments = self.annual_payments[payment_schedule]
+        rows = prepayment_schedule(mortgage.principal, self.rate_state(product)[0], annual_payments,
+                                   annual_payments * amortization_period, mortgage.payment_per_period, extra_payment,
+                                   lump_sum, payment_increase)
+        return mortgage, rows
+
+    def prepayment_scenarios(self, asking_price, down_payment, payment_schedule, amortization_period, extra_payments,
+                             lump_sums, payment_increases, product=None):
+        # Evaluates many prepayment strategies for one mortgage, given as columns of the arguments of
+        # prepayment_schedule. Returns (mortgage, baseline, results): baseline is the (n_payments, total_interest) of
+        # the mortgage without prepayments and results is a list with the same for each strategy, or both are None if
+        # the mortgage is declined.
+        mortgage = self.payment_per_period(asking_price, down_payment, payment_schedule, amortization_period, product)
+        if mortgage.status == 'declined':
+            return mortgage, None, None
+
+        summarize = self.prepayment_summarizer(mortgage, payment_schedule, amortization_period, product)
+        baseline = summarize(0., 0., 0.)
+        # An optimizer's candidates often repeat, so each distinct strategy is only stepped through once
+        summaries = {}
+        results = []
+        for strategy in zip(extra_payments, lump_sums, payment_increases):
+            result = summaries.get(strategy)
+            if result is None:
+                result = summaries[strategy] = summarize(*strategy)
+            results.append(result)
+        return mortgage, baseline, results
+
+    def prepayment_summarizer(self, mortgage, payment_schedule, amortization_period, product=None):
+        # A function of (extra_payment, lump_sum, payment_increase) that returns the prepayment_summary of an approved
+        # mortgage
+        annual_payments = self.annual_payments[payment_schedule]
+        return partial(prepayment_summary, mortgage.principal, self.rate_state(product)[0], annual_payments,
+                       annual_payments * amortization_period, mortgage.payment_per_period)
+
+    def payment_grid(self, asking_price, down_payments, payment_schedule, interest_rates, amortization_periods):
+        # Payments for every combination of down payment, interest rate and amortization period for one asking price.
+        # Whether a mortgage is declined and its insured principal only depend on the down payment, and the annuity
+        # factors only on the rate and period, so each is calculated once and the grid is a table of products.
+        # Returns (statuses, grids) with one entry per down payment; grids[i] is None if that down payment is
+        # declined, otherwise a list with one row of payments per interest rate and one column per period.
+        annual_payments = self.annual_payments[payment_schedule]
+        factors = [[annuity_factor(interest_rate, annual_payments, annual_payments * amortization_period)
+                    for amortization_period in amortization_periods]
+                   for interest_rate in interest_rates]
+
+        statuses = []
+        grids = []
+        for down_payment in down_payments:
+            if down_payment < minimum_down_payment(asking_price):
+                statuses.append(DECLINED_MINIMUM_DOWN_PAYMENT)
+                grids.append(None)
+                continue
+
+            principal = asking_price - down_payment
+            if self.insurable_limit < principal and down_payment_percentage(asking_price, down_payment) < .2:
+                statuses.append(DECLINED_INSURABLE_LIMIT)
+                grids.append(None)
+                continue
+
+            principal += calculate_insurance_cost(self.insurance_tiers, asking_price, down_payment)
+            statuses.append(APPROVED)
+            grids.append([[round(principal * factor, 2) for factor in row] for row in factors])
+
+        return statuses, grids
+
+    def cached(self, name, calculate, *args, product=None):
+        # Quotes are cached by method, product, inputs and rate version. A quote calculated while the rate was
+        # changing is returned but not stored, since it may belong to either rate.
+        version = self.rate_state(product)[2]
+        key = (name, product, version) + args
+        result = self.quote_cache.get(key)
+        if result is None:
+            result = calculate(*args, product)
+            if self.rate_state(product)[2] == version:
+                self.quote_cache.put(key, result)
+        return result
+
+    def decline_reason(self, status, asking_price):
+        return format_decline_reason(status, asking_price, self.insurable_limit)
+
+    def maximum(self, payment_amount, payment_schedule, amortization_period, product=None):
+        if self.quote_cache is None:
+            return self.calculate_maximum(payment_amount, payment_schedule, amortization_period, product)
+
+        return self.cached('maximum', self.calculate_maximum, payment_amount, payment_schedule, amortization_period,
+                           product=product)
+
+    def calculate_maximum(self, payment_amount, payment_schedule, amortization_period, product=None):
+        # The largest principal (including any insurance premium) that the payment pays off over the period.
+        # This is the present value of the payments, i.e. the inverse of calculate_payment.
+        return payment_amount / self.payment_factor(payment_schedule, amortization_period, product)
+
+    def maximum_batch(self, payment_amounts, payment_schedules, amortization_periods, product=None):
+        if not len(payment_amounts) == len(payment_schedules) == len(amortization_periods):
+            raise ValueError('All input columns must have the same length.')
+
+        payment_factor = self.payment_factor
+        return [payment_amount / payment_factor(payment_schedule, amortization_period, product)
+                for payment_amount, payment_schedule, amortization_period
+                in zip(payment_amounts, payment_schedules, amortization_periods)]
 
-        principal = payment_amount * annual_payments * amortization_period
+    def maximum_asking_price(self, payment_amount, down_payment, payment_schedule, amortization_period,
+                             product=None):
+        # The highest asking price, to the cent, that payment_per_period approves with the given down payment
+        # for no more than the given payment. Returns 0. if no asking price can be approved.
+        return self.maximum_asking_price_batch([payment_amount], [down_payment], [payment_schedule],
+                                               [amortization_period], product)[0]
 
-        return principal
+    def affordable(self, asking_price, payment_amount, down_payment, payment_schedule, amortization_period,
+                   product=None):
+        # Whether the asking price is approved for no more than the payment
+        if asking_price < down_payment:
+            return False
+        mortgage = self.calculate_payment_per_period(asking_price, down_payment, payment_schedule, amortization_period,
+                                                     product)
+        return mortgage.status == 'approved' and mortgage.payment_per_period <= round(payment_amount, 2)
+
+    def maximum_asking_price_batch(self, payment_amounts, down_payments, payment_schedules, amortization_periods,
+                                   product=None):
+        if not len(payment_amounts) == len(down_payments) == len(payment_schedules) == len(amortization_periods):
+            raise ValueError('All input columns must have the same length.')
+
+        tiers = self.insurance_tiers.bounds()
+        insurable_limit = self.insurable_limit
+        low_principals = self.maximum_batch(payment_amounts, payment_schedules, amortization_periods, product)
+        # Payments are rounded to the cent, so a principal whose payment is up to half a cent more is still approved
+        high_principals = self.maximum_batch([round(payment_amount, 2) + .005 for payment_amount in payment_amounts],
+                                             payment_schedules, amortization_periods, product)
+
+        asking_prices = []
+        for i, down_payment in enumerate(down_payments):
+            args = (payment_amounts[i], down_payment, payment_schedules[i], amortization_periods[i], product)
+
+            # Raising the asking price only ever raises the payment and the down payment required, so the asking prices
+            # that are approved for the payment run from the down payment up to the answer. The solutions for the two
+            # principals bracket it, and it is found by bisection over whole cents. Float rounding, and the rounding of
+            # down payment percentages near the tier breakpoints, can put an end of the bracket on the wrong side, so
+            # each end is first moved out, by steps that double, until it is known to be on its side. An asking price
+            # equal to the down payment needs no mortgage, so it is the lowest one searched.
+            lowest = math.ceil(down_payment * 100)
+            low = max(int(solve_asking_price(low_principals[i], down_payment, tiers, insurable_limit) * 100), lowest)
+            high = max(int(solve_asking_price(high_principals[i], down_payment, tiers, insurable_limit) * 100) + 1,
+                       low + 1)
+            step = 1
+            while low > lowest and not self.affordable(low / 100, *args):
+                high = low
+                low = max(low - step, lowest)
+                step *= 2
+            step = 1
+            while self.affordable(high / 100, *args):
+                low = high
+                high += step
+                step *= 2
+            while high - low > 1:
+                middle = (low + high) // 2
+                if self.affordable(middle / 100, *args):
+                    low = middle
+                else:
+                    high = middle
+            asking_prices.append(low / 100)
+
+        return asking_prices
+
+
+# Status values are module level constants so every result shares the same string objects
+APPROVED_STATUS = 'approved'
+DECLINED_STATUS = 'declined'
+APPROVED_TEXT = 'The mortgage was approved.'
 
 
 class Mortgage:
+    # Results use slots and set their attributes directly rather than through a chain of __init__ calls, since one
+    # is created for every quote
+    __slots__ = ('status', 'status_code', 'text')
+
     def __init__(self, status=None, status_text=''):
         self.status = status
-        self.status_text = status_text
+        self.status_code = None
+        self.text = status_text
+
+    @property
+    def status_text(self):
+        return self.text
+
+    @status_text.setter
+    def status_text(self, status_text):
+        self.text = status_text
 
 
 class DeclinedMortgage(Mortgage):
-    def __init__(self, status_text='You cannot create a mortgage with the given parameters.'):
-        super().__init__('declined', status_text)
+    __slots__ = ('asking_price', 'insurable_limit')
+
+    def __init__(self, status_text='You cannot create a mortgage with the given parameters.', status_code=None,
+                 asking_price=None, insurable_limit=None):
+        # Given a status code, the status text is only formatted when it is first read
+        self.status = DECLINED_STATUS
+        self.status_code = status_code
+        self.text = status_text if status_code is None else None
+        self.asking_price = asking_price
+        self.insurable_limit = insurable_limit
+
+    @property
+    def status_text(self):
+        if self.text is None:
+            self.text = format_decline_reason(self.status_code, self.asking_price, self.insurable_limit)
+        return self.text
+
+    @status_text.setter
+    def status_text(self, status_text):
+        self.text = status_text
 
 
 class ApprovedMortgage(Mortgage):
-    def __init__(self, payment_per_period):
-        super().__init__('approved', 'The mortgage was approved.')
+    __slots__ = ('payment_per_period', 'principal')
+
+    def __init__(self, payment_per_period, principal=None):
+        self.status = APPROVED_STATUS
+        self.status_code = APPROVED
+        self.text = APPROVED_TEXT
         self.payment_per_period = payment_per_period
+        # The amount borrowed including any mortgage insurance premium
+        self.principal = principal
+
+
+# The inputs of a quote that QuoteSession.update can change
+SESSION_INPUTS = ('asking_price', 'down_payment', 'payment_schedule', 'amortization_period', 'product')
+
+# Marks an input of QuoteSession.update that is not being changed, since a product of None is a change to the default
+# rate
+UNCHANGED = object()
+
+
+class QuoteSession:
+    # The inputs of one quote along with the state derived from them, for a client that changes one input at a time,
+    # such as a slider in a mortgage planner. update only recalculates what depends on the inputs that changed: the
+    # minimum down payment depends on the asking price, the down payment percentage, insurance rate and principal on
+    # the asking price and down payment, and the annuity factor on the schedule, period and product rate. The rate is
+    # read on every quote, so a rate change is picked up too. Quotes are the same as calculate_payment_per_period's.
+    __slots__ = ('calc', 'asking_price', 'down_payment', 'payment_schedule', 'amortization_period', 'product',
+                 'minimum_down_payment', 'down_payment_percentage', 'insurance_percentage', 'insurance_rate',
+                 'status_code', 'principal', 'rate_state', 'factor', 'result')
+
+    def __init__(self, calc, asking_price, down_payment, payment_schedule, amortization_period, product=None):
+        self.asking_price = asking_price
+        self.down_payment = down_payment
+        self.payment_schedule = payment_schedule
+        self.amortization_period = amortization_period
+        self.product = product
+        self.bind(calc)
+
+    def bind(self, calc):
+        # Switches to a calculator with other settings, which invalidates all of the derived state
+        calc.rate_state(self.product)
+        self.calc = calc
+        # The down payment percentage that insurance_rate was looked up for
+        self.insurance_percentage = None
+        self.update_minimum_down_payment()
+        self.update_principal()
+        self.factor = None
+
+    def update(self, asking_price=UNCHANGED, down_payment=UNCHANGED, payment_schedule=UNCHANGED,
+               amortization_period=UNCHANGED, product=UNCHANGED):
+        # Changes the given inputs and returns the new quote. Raises ValueError for a product without a rate.
+        if product is not UNCHANGED and product != self.product:
+            self.calc.rate_state(product)
+            self.product = product
+            self.factor = None
+        if asking_price is not UNCHANGED and asking_price != self.asking_price:
+            self.asking_price = asking_price
+            self.update_minimum_down_payment()
+            if down_payment is not UNCHANGED:
+                self.down_payment = down_payment
+            self.update_principal()
+        elif down_payment is not UNCHANGED and down_payment != self.down_payment:
+            self.down_payment = down_payment
+            self.update_principal()
+        if payment_schedule is not UNCHANGED and payment_schedule != self.payment_schedule:
+            self.payment_schedule = payment_schedule
+            self.factor = None
+        if amortization_period is not UNCHANGED and amortization_period != self.amortization_period:
+            self.amortization_period = amortization_period
+            self.factor = None
+        return self.quote()
+
+    def quote(self):
+        # The result is kept until something it depends on changes, so a repeated quote creates no objects
+        rate_state = self.calc.rate_state(self.product)
+        if self.factor is None or rate_state is not self.rate_state:
+            self.rate_state = rate_state
+            self.update_factor()
+        if self.result is None:
+            if self.status_code == APPROVED:
+                self.result = ApprovedMortgage(self.calculate_payment(), self.principal)
+            else:
+                self.result = DeclinedMortgage(status_code=self.status_code, asking_price=self.asking_price,
+                                               insurable_limit=self.calc.insurable_limit)
+        return self.result
+
+    def update_minimum_down_payment(self):
+        self.minimum_down_payment = minimum_down_payment(self.asking_price)
+
+    def update_principal(self):
+        # The same steps as calculate_payment_per_period. The insurance rate is only looked up again when the down
+        # payment percentage moves, which it does not for most small moves of a slider.
+        asking_price = self.asking_price
+        down_payment = self.down_payment
+        down_payment_pct = down_payment_percentage(asking_price, down_payment)
+        self.result = None
+        self.principal = None
+        if down_payment < self.minimum_down_payment:
+            self.status_code = DECLINED_MINIMUM_DOWN_PAYMENT
+        elif self.calc.insurable_limit < asking_price - down_payment and down_payment_pct < .2:
+            self.status_code = DECLINED_INSURABLE_LIMIT
+        else:
+            if down_payment_pct != self.insurance_percentage:
+                self.insurance_rate = self.calc.insurance_tiers.rate(down_payment_pct)
+                self.insurance_percentage = down_payment_pct
+            self.status_code = APPROVED
+            self.principal = asking_price - down_payment + asking_price * self.insurance_rate
+        self.down_payment_percentage = down_payment_pct
+
+    def update_factor(self):
+        interest_rate, factors, version = self.rate_state
+        self.factor = factors.get((self.payment_schedule, self.amortization_period))
+        if self.factor is None:
+            annual_payments = self.calc.annual_payments[self.payment_schedule]
+            self.factor = annuity_factor(interest_rate, annual_payments, annual_payments * self.amortization_period)
+        self.result = None
+
+    def calculate_payment(self):
+        return round(self.principal * self.factor, 2)
+
+    def inputs(self):
+        # The inputs in SESSION_INPUTS order
+        return self.asking_price, self.down_payment, self.payment_schedule, self.amortization_period, self.product
+
+    def state(self):
+        # The derived state that a client may show alongside the quote
+        return {'minimum_down_payment': self.minimum_down_payment,
+                'down_payment_percentage': self.down_payment_percentage,
+                'principal': self.principal}
+
+
+class InsuranceTiers:
+    # A compiled index of insurance tiers for looking up the premium rate of a down payment percentage by bisection.
+    # Tiers are sorted by their 'min' and each one covers percentages from its 'min' up to, but not including, the
+    # next tier's 'min'. The last tier ends at its 'max' inclusive. Down payment percentages are rounded to
+    # TIER_PRECISION, so consecutive tiers must neither overlap nor leave a gap of more than that between one tier's
+    # 'max' and the next tier's 'min', as with a 'max' of .0999 followed by a 'min' of .1.
+    def __init__(self, tiers):
+        for tier in tiers:
+            if not isinstance(tier, dict) or not all(is_number(tier.get(key)) for key in ('min', 'max', 'rate')):
+                raise ValueError('Each insurance tier must have a numeric "min", "max" and "rate".')
+            if not 0 <= tier['min'] <= tier['max'] <= 1 or not 0 <= tier['rate'] <= 1:
+                raise ValueError('Each insurance tier must have 0 <= "min" <= "max" <= 1 and a "rate" between 0 and 1.')
+        tiers = sorted(tiers, key=lambda tier: tier['min'])
+        if not tiers:
+            raise ValueError('At least one insurance tier must be configured.')
+        for tier, next_tier in zip(tiers, tiers[1:]):
+            if next_tier['min'] <= tier['max']:
+                raise ValueError('The insurance tiers overlap.')
+            if round(next_tier['min'] - tier['max'], 9) > TIER_PRECISION:
+                raise ValueError('There is a gap between the insurance tiers.')
+        self.tiers = tiers
+        self.breakpoints = [tier['min'] for tier in tiers]
+        self.rates = [tier['rate'] for tier in tiers]
+        self.upper_bound = tiers[-1]['max']
+
+    def __iter__(self):
+        return iter(self.tiers)
+
+    def __len__(self):
+        return len(self.tiers)
+
+    def rate(self, down_payment_pct):
+        index = bisect_right(self.breakpoints, down_payment_pct) - 1
+        if index < 0 or down_payment_pct > self.upper_bound:
+            raise ValueError('The down payment percentage is not in any configured insurance tier.')
+        return self.rates[index]
+
+    def rates_for(self, down_payment_pcts):
+        # Looks up many percentages at once, like numpy's searchsorted. Sorting the queries lets each one resume the
+        # search from where the previous one ended, so a column of n percentages over k tiers costs O(n log n + k).
+        order = sorted(range(len(down_payment_pcts)), key=down_payment_pcts.__getitem__)
+        rates = [None] * len(down_payment_pcts)
+        breakpoints = self.breakpoints
+        index = -1
+        for position in order:
+            down_payment_pct = down_payment_pcts[position]
+            while index + 1 < len(breakpoints) and breakpoints[index + 1] <= down_payment_pct:
+                index += 1
+            if index < 0 or down_payment_pct > self.upper_bound:
+                raise ValueError('The down payment percentage is not in any configured insurance tier.')
+            rates[position] = self.rates[index]
+        return rates
+
+    def bounds(self):
+        # (low, high, rate) for each tier where high is the next tier's low, or the last tier's max
+        highs = self.breakpoints[1:] + [self.upper_bound]
+        return list(zip(self.breakpoints, highs, self.rates))
 
 
 class Money:
     def __init__(self, amount):
-        whole, part = modf(amount)
-        whole = int(whole)
-        part = int(round(part, 2) * 100)
-        self.dollars = whole
-        self.cents = part
+        # Rounds to the nearest cent from the decimal value of the amount. Splitting the float with modf and
+        # truncating lost a cent on amounts like 0.29 and could give 100 cents for amounts like 1.999.
+        if isinstance(amount, float):
+            total_cents = int((Decimal(repr(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        else:
+            total_cents = int(amount) * 100
+        sign = -1 if total_cents < 0 else 1
+        dollars, cents = divmod(abs(total_cents), 100)
+        self.total_cents = total_cents
+        self.dollars = sign * dollars
+        self.cents = sign * cents
+
+
+def format_decline_reason(status, asking_price, insurable_limit):
+    if status == DECLINED_MINIMUM_DOWN_PAYMENT:
+        return f'The minimum down payment for an asking price of ${asking_price} is ${minimum_down_payment(asking_price)}.'
+    if status == DECLINED_INSURABLE_LIMIT:
+        return f'You must make a down payment of at least 20% on mortgages over ${insurable_limit}.'
+    if status == INVALID_INPUT:
+        return 'The payment schedule, amortization period or amounts of the mortgage are not valid.'
+    return ''
 
 
 def calculate_payment(principal, interest_rate, annual_payments, total_payments):
+    return principal * annuity_factor(interest_rate, annual_payments, total_payments)
+
+
+def is_number(value):
+    # Settings are read from JSON, where true and false would otherwise pass for 1 and 0
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def valid_interest_rate(interest_rate):
+    # NaN fails both comparisons and infinity the upper bound
+    return is_number(interest_rate) and 0 < interest_rate <= MAX_INTEREST_RATE
+
+
+def annuity_factor(interest_rate, annual_payments, total_payments):
+    # The payment for a principal of 1. Multiplying by this gives bit-for-bit the same result as the full formula.
+    period_interest_rate = interest_rate / annual_payments
+    return (period_interest_rate*(1+period_interest_rate)**total_payments) / ((1 + period_interest_rate)**total_payments - 1)
+
+
+# Column order of the tuples yielded by amortization_schedule
+SCHEDULE_COLUMNS = ('period', 'payment', 'interest', 'principal', 'balance', 'total_interest', 'total_principal')
+
+
+def amortization_schedule(principal, interest_rate, annual_payments, total_payments, payment=None):
+    # Lazily yields one tuple per payment in SCHEDULE_COLUMNS order. Every amount is rounded to the cent as it is
+    # posted, and the final payment is adjusted to clear whatever balance is left after rounding.
     period_interest_rate = interest_rate / annual_payments
-    return principal * ((period_interest_rate*(1+period_interest_rate)**total_payments) / ((1 + period_interest_rate)**total_payments - 1))
+    if payment is None:
+        payment = round(calculate_payment(principal, interest_rate, annual_payments, total_payments), 2)
+
+    balance = round(principal, 2)
+    total_interest = 0.
+    total_principal = 0.
+    for period in range(1, total_payments + 1):
+        interest = round(balance * period_interest_rate, 2)
+        period_payment = payment
+        if period == total_payments or balance + interest <= payment:
+            period_payment = round(balance + interest, 2)
+        principal_paid = round(period_payment - interest, 2)
+        balance = round(balance - principal_paid, 2)
+        total_interest = round(total_interest + interest, 2)
+        total_principal = round(total_principal + principal_paid, 2)
+        yield period, period_payment, interest, principal_paid, balance, total_interest, total_principal
+        if balance <= 0:
+            break
+
+
+def prepayment_schedule(principal, interest_rate, annual_payments, total_payments, payment, extra_payment=0.,
+                        lump_sum=0., payment_increase=0.):
+    # amortization_schedule with prepayments: extra_payment is added to every payment, lump_sum is paid along with
+    # the last payment of each year, and the regular payment grows by the fraction payment_increase every year. The
+    # rows are in SCHEDULE_COLUMNS order, with a lump sum counted in the payment and principal of its period. Without
+    # prepayments the rows are the same as amortization_schedule's.
+    period_interest_rate = interest_rate / annual_payments
+    balance = round(principal, 2)
+    total_interest = 0.
+    total_principal = 0.
+    for period in range(1, total_payments + 1):
+        interest = round(balance * period_interest_rate, 2)
+        period_payment = payment + extra_payment
+        if period == total_payments or balance + interest <= period_payment:
+            period_payment = round(balance + interest, 2)
+        principal_paid = round(period_payment - interest, 2)
+        balance = round(balance - principal_paid, 2)
+        if period % annual_payments == 0:
+            if lump_sum and balance > 0:
+                paid = min(lump_sum, balance)
+                period_payment = round(period_payment + paid, 2)
+                principal_paid = round(principal_paid + paid, 2)
+                balance = round(balance - paid, 2)
+            if payment_increase:
+                payment = round(payment * (1 + payment_increase), 2)
+        total_interest = round(total_interest + interest, 2)
+        total_principal = round(total_principal + principal_paid, 2)
+        yield period, period_payment, interest, principal_paid, balance, total_interest, total_principal
+        if balance <= 0:
+            break
+
+
+def prepayment_summary(principal, interest_rate, annual_payments, total_payments, payment, extra_payment=0.,
+                       lump_sum=0., payment_increase=0.):
+    # The (n_payments, total_interest) of prepayment_schedule. Prepayments change the balance that every later
+    # period's interest is rounded from, so there is no closed form; this steps through the periods one year at a
+    # time, keeping only the balance and interest in locals so that no objects are created per period and hundreds
+    # of strategies can be compared in one request. Every amount is a whole number of cents, so the interest can be
+    # summed unrounded and a period's principal and balance rounded in one step with the same results.
+    period_interest_rate = interest_rate / annual_payments
+    balance = round(principal, 2)
+    total_interest = 0.
+    period = 0
+    period_payment = payment + extra_payment
+    while True:
+        for _ in range(annual_payments):
+            period += 1
+            interest = round(balance * period_interest_rate, 2)
+            total_interest += interest
+            if period == total_payments or balance + interest <= period_payment:
+                return period, round(total_interest, 2)
+            balance = round(balance + interest - period_payment, 2)
+        if lump_sum:
+            if lump_sum >= balance:
+                return period, round(total_interest, 2)
+            balance = round(balance - lump_sum, 2)
+        if payment_increase:
+            payment = round(payment * (1 + payment_increase), 2)
+            period_payment = payment + extra_payment
+
+
+def closed_form_schedules(principals, interest_rate, annual_payments, total_payments):
+    # Produces the exact (unrounded) schedules for many principals sharing a rate and term at once. Each period
+    # yields a tuple of columns in SCHEDULE_COLUMNS order, where every column but the first is a list with one
+    # value per principal. The balance after k payments is principal * (g**n - g**k) / (g**n - 1) with
+    # g = 1 + the periodic rate, so each period costs a single multiplier shared by the whole batch.
+    period_interest_rate = interest_rate / annual_payments
+    growth = 1 + period_interest_rate
+    growth_total = growth ** total_payments
+    factor = annuity_factor(interest_rate, annual_payments, total_payments)
+
+    payments = [principal * factor for principal in principals]
+    balances = list(principals)
+    for period in range(1, total_payments + 1):
+        remaining = (growth_total - growth ** period) / (growth_total - 1)
+        interests = [balance * period_interest_rate for balance in balances]
+        principals_paid = [payment - interest for payment, interest in zip(payments, interests)]
+        balances = [principal * remaining for principal in principals]
+        total_principals = [principal - balance for principal, balance in zip(principals, balances)]
+        total_interests = [payment * period - paid for payment, paid in zip(payments, total_principals)]
+        yield period, payments, interests, principals_paid, balances, total_interests, total_principals
 
 
 def calculate_insurance_cost(insurance_tiers, asking_price, down_payment):
 
+    if not isinstance(insurance_tiers, InsuranceTiers):
+        insurance_tiers = InsuranceTiers(insurance_tiers)
+
     down_payment_pct = down_payment_percentage(asking_price, down_payment)
-    insurance_rate = None
-    for tier in insurance_tiers:
-        if tier['min'] <= down_payment_pct <= tier['max']:
-            insurance_rate = tier['rate']
-            break
+    return asking_price * insurance_tiers.rate(down_payment_pct)
+
+
+def solve_asking_price(max_principal, down_payment, tiers, insurable_limit):
+    # Each insurance tier bounds the asking price from above by the principal it can borrow, the lowest down
+    # payment percentage of the tier, the minimum down payment and, for insured tiers, the insurable limit.
+    # The highest bound that still keeps the down payment percentage inside its tier is the answer.
+    highest_asking_price = min(maximum_for_down_payment(down_payment), max_principal + down_payment)
+    best = 0.
+    for tier_min, tier_max, tier_rate in tiers:
+        asking_price = min(highest_asking_price, (max_principal + down_payment) / (1 + tier_rate))
+        if tier_min > 0:
+            asking_price = min(asking_price, down_payment / tier_min)
+        if tier_min < .2:
+            asking_price = min(asking_price, insurable_limit + down_payment)
+        if asking_price < down_payment or (tier_max > 0 and asking_price < down_payment / tier_max):
+            continue
+        best = max(best, asking_price)
+    return best
 
-    if insurance_rate is None:
-        raise ValueError('The down payment percentage is not in any configured insurance tier.')
 
-    return asking_price * insurance_rate
+def maximum_for_down_payment(down_payment):
+    # The inverse of minimum_down_payment
+    if down_payment <= 500000 * .05:
+        return down_payment / .05
+    return 500000 + (down_payment - 500000 * .05) / .1
 
 
 def minimum_down_payment(asking_price):
@@ -0,0 +1,112 @@
+from array import array
+import mmap
+import os
+
+# Columns of a bulk quote job. Each column is a file of raw values in native byte order named after the column,
+# e.g. asking_price.bin, with the array module typecode given here.
+INPUT_COLUMNS = {
+    'asking_price': 'd',
+    'down_payment': 'd',
+    'payment_schedule': 'B',
+    'amortization_period': 'H'
+}
+OUTPUT_COLUMNS = {
+    'payment_per_period': 'd',
+    'status': 'B'
+}
+
+
+class MappedColumn:
+    # A column file mapped into memory and exposed as a typed memoryview, so values are read and written in place
+    # without copying the file. Giving a length creates or resizes the file for writing.
+    def __init__(self, path, typecode, length=None):
+        self.path = path
+        self.typecode = typecode
+        writable = length is not None
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY, 0o644)
+        if writable:
+            os.ftruncate(self.fd, length * array(typecode).itemsize)
+
+        size = os.fstat(self.fd).st_size
+        if size == 0:
+            # An empty file cannot be mapped
+            self.map = None
+            self.values = memoryview(bytearray()).cast(typecode)
+        else:
+            self.map = mmap.mmap(self.fd, size, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+            self.values = memoryview(self.map).cast(typecode)
+
+    def __len__(self):
+        return len(self.values)
+
+    def close(self):
+        self.values.release()
+        if self.map is not None:
+            self.map.close()
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def column_path(directory, column):
+    return os.path.join(directory, f'{column}.bin')
+
+
+def write_column(path, typecode, values):
+    with open(path, 'wb') as file:
+        array(typecode, values).tofile(file)
+
+
+class ColumnarQuoteResult:
+    # The mapped output columns of a job. Reason text is only built for the rows a caller asks about.
+    def __init__(self, calc, asking_prices, payments, statuses):
+        self.calc = calc
+        self.asking_prices = asking_prices
+        self.payments = payments
+        self.statuses = statuses
+
+    def reason(self, index):
+        return self.calc.decline_reason(self.statuses.values[index], self.asking_prices.values[index])
+
+    def close(self):
+        for column in (self.asking_prices, self.payments, self.statuses):
+            column.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_columnar_job(calc, input_directory, output_directory=None):
+    # Quotes every row of the input columns in input_directory and writes the output columns to output_directory
+    # (input_directory by default). Schedules are codes from calc.payment_schedule_codes(). Returns a
+    # ColumnarQuoteResult over the mapped output, which should be closed once it is no longer needed.
+    output_directory = output_directory or input_directory
+    columns = {}
+    result = None
+    try:
+        for column, typecode in INPUT_COLUMNS.items():
+            columns[column] = MappedColumn(column_path(input_directory, column), typecode)
+        length = len(columns['asking_price'])
+        for column, typecode in OUTPUT_COLUMNS.items():
+            columns[column] = MappedColumn(column_path(output_directory, column), typecode, length)
+        calc.payment_per_period_into(columns['asking_price'].values,
+                                     columns['down_payment'].values,
+                                     columns['payment_schedule'].values,
+                                     columns['amortization_period'].values,
+                                     columns['payment_per_period'].values,
+                                     columns['status'].values)
+        result = ColumnarQuoteResult(calc, columns['asking_price'], columns['payment_per_period'], columns['status'])
+    finally:
+        # The result keeps the asking prices and the output columns open. Every other column is closed here, and if
+        # the job failed every column is.
+        for column, mapped in columns.items():
+            if result is None or column not in ('asking_price', *OUTPUT_COLUMNS):
+                mapped.close()
+    return result
@@ -0,0 +1,133 @@
+import fcntl
+import json
+import os
+import struct
+import zlib
+
+# The settings kept in the log. product_rates changes are merged into the current product rates rather than
+# replacing them, so that workers changing different products do not undo each other.
+CONFIG_KEYS = ('interest_rate', 'product_rates', 'insurance_tiers', 'insurable_limit', 'minimum_amortization_period',
+               'maximum_amortization_period')
+
+
+def apply_change(config, change):
+    for key, value in change.items():
+        if key not in CONFIG_KEYS:
+            raise ValueError(f'"{key}" is not a configuration setting.')
+        if key == 'product_rates':
+            if not isinstance(value, dict):
+                raise ValueError('The product rates must be an object of products and their interest rates.')
+            value = {**config.get(key, {}), **value}
+        config[key] = value
+
+
+class ConfigLog:
+    # A durable, append-only log of configuration changes kept in a directory, along with a snapshot of the whole
+    # configuration so that loading only replays the changes written after it.
+    # config.log holds one record per change, framed as [length: uint32][crc32: uint32][json], and is only ever
+    # appended to, under an exclusive file lock and followed by an fsync. Readers do not lock. A record that is
+    # incomplete or fails its checksum ends the log for now; a reader picks it up once it has been written, and the
+    # next writer cuts off what a writer that crashed mid-record left behind.
+    # config.snapshot is {"offset": ..., "config": {...}}, the configuration after the first offset bytes of the log,
+    # and is replaced atomically every snapshot_interval records.
+    RECORD = struct.Struct('<II')
+
+    def __init__(self, directory, defaults, snapshot_interval=100):
+        self.directory = directory
+        self.log_path = os.path.join(directory, 'config.log')
+        self.snapshot_path = os.path.join(directory, 'config.snapshot')
+        self.snapshot_interval = snapshot_interval
+        os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(self.log_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self.config = dict(defaults)
+        # The end of the last record applied to config
+        self.offset = 0
+        self.records_since_snapshot = 0
+        # The size and modification time of the log when it was last read
+        self.read_stamp = None
+        self.load_snapshot()
+        self.read_tail()
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_path) as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            return
+        self.config.update(snapshot['config'])
+        self.offset = snapshot['offset']
+
+    def stamp(self):
+        stat = os.fstat(self.fd)
+        return stat.st_size, stat.st_mtime_ns
+
+    def changed(self):
+        # Whether the log was written to since it was last read. A torn or corrupt record at the end is not applied,
+        # so the size stays ahead of the offset until a writer completes or replaces it.
+        return self.stamp() != self.read_stamp
+
+    def read_tail(self):
+        # Applies the records written since the last read. Returns the number of records applied.
+        self.read_stamp = self.stamp()
+        size = self.read_stamp[0]
+        if size <= self.offset:
+            return 0
+        buffer = os.pread(self.fd, size - self.offset, self.offset)
+        position = 0
+        n_records = 0
+        while position + self.RECORD.size <= len(buffer):
+            length, checksum = self.RECORD.unpack_from(buffer, position)
+            start = position + self.RECORD.size
+            payload = buffer[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            apply_change(self.config, json.loads(payload))
+            position = start + length
+            n_records += 1
+        self.offset += position
+        self.records_since_snapshot += n_records
+        return n_records
+
+    def append(self, change, validate=None):
+        # Writes a change to the log and applies it. Records written by other processes are applied first, so the
+        # configuration is always the result of every record in log order. validate is called under the lock with
+        # the configuration the change results in, after those records, and raises ValueError to reject the change
+        # before anything is written. Returns what validate returns.
+        apply_change(dict(self.config), change)
+        payload = json.dumps(change, separators=(',', ':')).encode()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            self.read_tail()
+            config = dict(self.config)
+            apply_change(config, change)
+            result = None if validate is None else validate(config)
+            if os.fstat(self.fd).st_size > self.offset:
+                os.ftruncate(self.fd, self.offset)
+            os.write(self.fd, self.RECORD.pack(len(payload), zlib.crc32(payload)) + payload)
+            os.fsync(self.fd)
+            self.read_stamp = self.stamp()
+            self.config = config
+            self.offset += self.RECORD.size + len(payload)
+            self.records_since_snapshot += 1
+            if self.records_since_snapshot >= self.snapshot_interval:
+                self.write_snapshot()
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return result
+
+    def write_snapshot(self):
+        temporary_path = f'{self.snapshot_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump({'offset': self.offset, 'config': self.config}, file, separators=(',', ':'))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.snapshot_path)
+        directory_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+        self.records_since_snapshot = 0
+
+    def close(self):
+        os.close(self.fd)
@@ -1,5 +1,5 @@
 from starlette.exceptions import HTTPException
-from starlette.status import HTTP_400_BAD_REQUEST
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_429_TOO_MANY_REQUESTS
 
 class ValidationError(HTTPException):
     def __init__(self, error_text='The parameter could not be validated.'):
@@ -7,27 +7,57 @@ class ValidationError(HTTPException):
 
 class AskingPriceValidationError(ValidationError):
     def __init__(self):
-        super().__init__('The asking price must be a positive whole number or decimal >= 0.')
+        super().__init__('The asking price must be a positive whole number or decimal >= 0.01 and <= 1000000000000.')
 
 class DownPaymentValidationError(ValidationError):
     def __init__(self):
-        super().__init__('The down payment must be a positive whole number or decimal >= 0 and cannot exceed the asking price.')
+        super().__init__('The down payment must be a positive whole number or decimal >= 0 and <= 1000000000000 and '
+                         'cannot exceed the asking price.')
 
 class PaymentScheduleValidationError(ValidationError):
     def __init__(self):
         super().__init__('The allowed values for "payment_schedule" are "weekly", "biweekly", and "monthly".')
 
 class AmortizationPeriodValidationError(ValidationError):
-    def __init__(self):
-        super().__init__('The amortization period must be a whole number between 5 and 25 (inclusive).')
+    def __init__(self, minimum=5, maximum=25):
+        super().__init__(f'The amortization period must be a whole number between {minimum} and {maximum} (inclusive).')
 
 class PaymentValidationError(ValidationError):
     def __init__(self):
-        super().__init__('The payment must be a positive whole number or decimal >= 0.')
+        super().__init__('The payment must be a positive whole number or decimal >= 0 and <= 1000000000000.')
 
 class InterestRateValidationError(ValidationError):
     def __init__(self):
-        super().__init__('The interest rate must be expressed as a percentage >= 0., such as 3.99 or 15. Decimal values are treated as percentages less than 1%')
+        super().__init__('The interest rate must be expressed as a percentage > 0. and <= 100., such as 3.99 or 15. '
+                         'Decimal values are treated as percentages less than 1%')
+
+class InterestRateRangeValidationError(ValidationError):
+    def __init__(self):
+        super().__init__('The interest rate range must be percentages > 0. with "rate_min" <= "rate_max" and a "rate_step" > 0.')
+
+class DownPaymentPercentagesValidationError(ValidationError):
+    def __init__(self):
+        super().__init__('The down payment percentages must be a comma separated list of percentages between 0 and 100, such as 5,10,20.')
+
+class AmortizationPeriodsValidationError(ValidationError):
+    def __init__(self, minimum=5, maximum=25):
+        super().__init__('The amortization periods must be a comma separated list of whole numbers between '
+                         f'{minimum} and {maximum} (inclusive).')
+
+class PrepaymentValidationError(ValidationError):
+    def __init__(self):
+        super().__init__('The extra payment and lump sum must be numbers >= 0 and <= 1000000000000 and the payment '
+                         'increase a percentage between 0 and 100.')
+
+class ProductValidationError(ValidationError):
+    def __init__(self):
+        super().__init__('There is no interest rate for the product. The products are listed by GET /interest-rates.')
+
+
+class ServerBusyError(HTTPException):
+    def __init__(self):
+        super().__init__(HTTP_429_TOO_MANY_REQUESTS, 'The server is busy with other large requests. Try again shortly.',
+                         headers={'Retry-After': '1'})
 
 
 class ConversionError(HTTPException):
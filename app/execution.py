@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+
+EXECUTION_MODES = ('inline', 'thread', 'process')
+
+
+class ExecutorOverloaded(Exception):
+    pass
+
+
+class ExecutionPolicy:
+    # Decides where the calculation of a request runs. Work smaller than offload_threshold (rows, grid cells or
+    # schedule periods) runs inline on the event loop, where a thread hop would cost more than the work itself.
+    # Larger work runs in a thread or process pool so that it does not hold up the quotes being served alongside it.
+    # At most max_pending offloaded requests are admitted at once, running or queued, and admit raises
+    # ExecutorOverloaded beyond that so a request can be turned away straight away instead of waiting in a queue.
+    # The counters are only touched from the event loop thread so they need no lock.
+    def __init__(self, mode='thread', offload_threshold=1000, max_workers=None, max_pending=None):
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f'The execution mode must be one of {", ".join(EXECUTION_MODES)}.')
+        self.mode = mode
+        self.offload_threshold = offload_threshold
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.pending = 0
+        self.inline = 0
+        self.offloaded = 0
+        self.rejected = 0
+        self._executor = None
+        self._thread_executor = None
+
+    def executor(self):
+        # Pools are started on first use so that an app that never offloads never starts any workers. The process
+        # pool module pulls in multiprocessing, so it is only imported in process mode.
+        if self._executor is None:
+            if self.mode == 'process':
+                from concurrent.futures import ProcessPoolExecutor
+                self._executor = ProcessPoolExecutor(self.max_workers)
+            else:
+                self._executor = self.thread_executor()
+        return self._executor
+
+    def thread_executor(self):
+        if self._thread_executor is None:
+            self._thread_executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='calculation')
+        return self._thread_executor
+
+    def admit(self, size):
+        # Returns whether work of this size is offloaded, reserving a place for it if so. Every admitted request
+        # must call release once it is done.
+        if self.mode == 'inline' or size < self.offload_threshold:
+            self.inline += 1
+            return False
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorOverloaded
+        self.pending += 1
+        self.offloaded += 1
+        return True
+
+    def release(self):
+        self.pending -= 1
+
+    async def call(self, func, *args):
+        # Runs func in the pool. In process mode func and its arguments must be picklable, so they should be module
+        # level functions and plain values rather than bound methods of a calculator.
+        return await asyncio.get_running_loop().run_in_executor(self.executor(), func, *args)
+
+    async def iterate(self, iterator):
+        # Yields the items of a blocking iterator, producing each one on a thread. Generators cannot be moved to
+        # another process, so this uses a thread pool in process mode too. The caller admits the request first and
+        # releases it when the iteration ends.
+        loop = asyncio.get_running_loop()
+        executor = self.thread_executor()
+        done = object()
+        while True:
+            item = await loop.run_in_executor(executor, next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    def stats(self):
+        return {'mode': self.mode, 'offload_threshold': self.offload_threshold, 'max_workers': self.max_workers,
+                'max_pending': self.max_pending, 'pending': self.pending, 'inline': self.inline,
+                'offloaded': self.offloaded, 'rejected': self.rejected}
+
+    def shutdown(self):
+        for executor in {self._executor, self._thread_executor} - {None}:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._thread_executor = None
@@ -0,0 +1,391 @@
+from bisect import bisect_right
+from decimal import Decimal, Context, ROUND_HALF_UP
+from functools import lru_cache
+from calculator import *
+
+# Annuity factors are stored as integers scaled by FACTOR_SCALE, which keeps a payment exact to well below a cent
+# for any principal under a trillion dollars
+FACTOR_SCALE = 10 ** 18
+
+# Down payment percentages are compared as whole numbers of ten thousandths, the same precision that
+# down_payment_percentage rounds to
+PERCENTAGE_SCALE = 10 ** 4
+
+# Decimal is only used to build the integer constants below, never per quote
+FACTOR_CONTEXT = Context(prec=50)
+
+
+def div_round_half_up(numerator, denominator):
+    # Integer division rounded to the nearest integer, with halves rounded away from zero
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def to_cents(amount):
+    # Converts an amount in dollars to whole cents, rounding half up. Floats are read by their shortest repr, so
+    # 1.005 is treated as the decimal 1.005 and rounds up to 101 cents instead of following its binary value down.
+    if isinstance(amount, int):
+        return amount * 100
+    text = repr(amount) if isinstance(amount, float) else str(amount)
+    if 'e' in text or 'E' in text or 'n' in text:
+        return int(Decimal(text).scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+    # Plain decimal notation is split on the point to avoid building a Decimal for every amount
+    negative = text.startswith('-')
+    whole, _, fraction = text.lstrip('+-').partition('.')
+    cents = int(whole or '0') * 100 + int(fraction[:2].ljust(2, '0'))
+    if fraction[2:3] >= '5':
+        cents += 1
+    return -cents if negative else cents
+
+
+def from_cents(cents):
+    return cents / 100
+
+
+def rate_ratio(rate):
+    # An exact (numerator, denominator) for a rate such as .025
+    return (Decimal(repr(rate)) if isinstance(rate, float) else Decimal(rate)).as_integer_ratio()
+
+
+@lru_cache(maxsize=4096)
+def fixed_annuity_factor(interest_rate, annual_payments, total_payments):
+    numerator, denominator = rate_ratio(interest_rate)
+    period_rate = FACTOR_CONTEXT.divide(Decimal(numerator), Decimal(denominator * annual_payments))
+    growth = FACTOR_CONTEXT.power(FACTOR_CONTEXT.add(1, period_rate), total_payments)
+    factor = FACTOR_CONTEXT.divide(FACTOR_CONTEXT.multiply(period_rate, growth), FACTOR_CONTEXT.subtract(growth, 1))
+    return int(factor.scaleb(18).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def payment_cents(principal_cents, interest_rate, annual_payments, total_payments):
+    factor = fixed_annuity_factor(interest_rate, annual_payments, total_payments)
+    return div_round_half_up(principal_cents * factor, FACTOR_SCALE)
+
+
+def minimum_down_payment_cents(asking_price_cents):
+    # 5% of the first $500,000 and 10% of the rest, rounded up to the cent so that paying it is always enough
+    if asking_price_cents <= 50000000:
+        return -(-asking_price_cents * 5 // 100)
+    return 2500000 + -(-(asking_price_cents - 50000000) // 10)
+
+
+def down_payment_percentage_scaled(asking_price_cents, down_payment_cents):
+    return div_round_half_up(down_payment_cents * PERCENTAGE_SCALE, asking_price_cents)
+
+
+class FixedInsuranceTiers:
+    # The integer counterpart of InsuranceTiers, with breakpoints in ten thousandths and rates as exact ratios
+    def __init__(self, insurance_tiers):
+        self.breakpoints = [to_scaled(low, PERCENTAGE_SCALE) for low, high, rate in insurance_tiers.bounds()]
+        self.upper_bound = to_scaled(insurance_tiers.upper_bound, PERCENTAGE_SCALE)
+        self.rates = [rate_ratio(rate) for rate in insurance_tiers.rates]
+
+    def cost_cents(self, asking_price_cents, down_payment_cents):
+        down_payment_pct = down_payment_percentage_scaled(asking_price_cents, down_payment_cents)
+        index = bisect_right(self.breakpoints, down_payment_pct) - 1
+        if index < 0 or down_payment_pct > self.upper_bound:
+            raise ValueError('The down payment percentage is not in any configured insurance tier.')
+        numerator, denominator = self.rates[index]
+        return div_round_half_up(asking_price_cents * numerator, denominator)
+
+
+def to_scaled(value, scale):
+    numerator, denominator = rate_ratio(value)
+    return div_round_half_up(numerator * scale, denominator)
+
+
+def amortization_schedule_cents(principal_cents, interest_rate, annual_payments, total_payments, payment=None):
+    # The integer version of calculator.amortization_schedule. Yields the same columns in whole cents, with the
+    # interest of each period rounded half up from the exact periodic rate.
+    numerator, denominator = rate_ratio(interest_rate)
+    denominator *= annual_payments
+    if payment is None:
+        payment = payment_cents(principal_cents, interest_rate, annual_payments, total_payments)
+
+    balance = principal_cents
+    total_interest = 0
+    total_principal = 0
+    for period in range(1, total_payments + 1):
+        interest = div_round_half_up(balance * numerator, denominator)
+        period_payment = payment
+        if period == total_payments or balance + interest <= payment:
+            period_payment = balance + interest
+        principal_paid = period_payment - interest
+        balance -= principal_paid
+        total_interest += interest
+        total_principal += principal_paid
+        yield period, period_payment, interest, principal_paid, balance, total_interest, total_principal
+        if balance <= 0:
+            break
+
+
+def prepayment_schedule_cents(principal_cents, interest_rate, annual_payments, total_payments, payment, extra_payment=0,
+                              lump_sum=0, payment_increase=0.):
+    # The integer version of calculator.prepayment_schedule, with the payment, extra payment and lump sum in cents.
+    # A payment increase is applied as an exact ratio, rounded half up to the cent. Without prepayments the rows are
+    # the same as amortization_schedule_cents's.
+    numerator, denominator = rate_ratio(interest_rate)
+    denominator *= annual_payments
+    increase_numerator, increase_denominator = rate_ratio(payment_increase)
+
+    balance = principal_cents
+    total_interest = 0
+    total_principal = 0
+    for period in range(1, total_payments + 1):
+        interest = div_round_half_up(balance * numerator, denominator)
+        period_payment = payment + extra_payment
+        if period == total_payments or balance + interest <= period_payment:
+            period_payment = balance + interest
+        principal_paid = period_payment - interest
+        balance -= principal_paid
+        if period % annual_payments == 0:
+            if lump_sum and balance > 0:
+                paid = min(lump_sum, balance)
+                period_payment += paid
+                principal_paid += paid
+                balance -= paid
+            if increase_numerator:
+                payment += div_round_half_up(payment * increase_numerator, increase_denominator)
+        total_interest += interest
+        total_principal += principal_paid
+        yield period, period_payment, interest, principal_paid, balance, total_interest, total_principal
+        if balance <= 0:
+            break
+
+
+def prepayment_summary_cents(principal_cents, interest_rate, annual_payments, total_payments, payment, extra_payment=0,
+                             lump_sum=0, payment_increase=0.):
+    # The (n_payments, total_interest) of prepayment_schedule_cents, with the total interest in cents, stepped through
+    # the same way as calculator.prepayment_summary
+    numerator, denominator = rate_ratio(interest_rate)
+    denominator *= annual_payments
+    increase_numerator, increase_denominator = rate_ratio(payment_increase)
+
+    balance = principal_cents
+    total_interest = 0
+    period = 0
+    period_payment = payment + extra_payment
+    while True:
+        for _ in range(annual_payments):
+            period += 1
+            interest = div_round_half_up(balance * numerator, denominator)
+            total_interest += interest
+            if period == total_payments or balance + interest <= period_payment:
+                return period, total_interest
+            balance += interest - period_payment
+        if lump_sum:
+            if lump_sum >= balance:
+                return period, total_interest
+            balance -= lump_sum
+        if increase_numerator:
+            payment += div_round_half_up(payment * increase_numerator, increase_denominator)
+            period_payment = payment + extra_payment
+
+
+class FixedPointCalculator(MortgageCalculator):
+    # A MortgageCalculator that works in whole cents with integer arithmetic. Inputs are converted to cents once,
+    # insurance premiums and payments are rounded half up to the cent from exact rates, and the annuity factors
+    # are exact integers cached per rate, schedule and period, so results are penny-exact and reproducible
+    # across platforms. Amounts are still returned in dollars, and are always a whole number of cents.
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.fixed_insurance_tiers = FixedInsuranceTiers(self.insurance_tiers)
+
+    def apply_config(self, config):
+        super().apply_config(config)
+        self.fixed_insurance_tiers = FixedInsuranceTiers(self.insurance_tiers)
+
+    def principal_cents(self, asking_price_cents, down_payment_cents):
+        # Returns (status, principal_cents) with the insurance premium included, or None for a declined mortgage
+        if down_payment_cents < minimum_down_payment_cents(asking_price_cents):
+            return DECLINED_MINIMUM_DOWN_PAYMENT, None
+
+        principal = asking_price_cents - down_payment_cents
+        if (self.insurable_limit * 100 < principal and
+                down_payment_percentage_scaled(asking_price_cents, down_payment_cents) < PERCENTAGE_SCALE // 5):
+            return DECLINED_INSURABLE_LIMIT, None
+
+        return APPROVED, principal + self.fixed_insurance_tiers.cost_cents(asking_price_cents, down_payment_cents)
+
+    def quote_cents(self, asking_price_cents, down_payment_cents, payment_schedule, amortization_period, product=None):
+        # Returns (status, payment_cents, principal_cents), with None for the amounts of a declined mortgage
+        status, principal = self.principal_cents(asking_price_cents, down_payment_cents)
+        if status != APPROVED:
+            return status, None, None
+
+        annual_payments = self.annual_payments[payment_schedule]
+        payment = payment_cents(principal, self.rate_state(product)[0], annual_payments,
+                                annual_payments * amortization_period)
+        return APPROVED, payment, principal
+
+    def calculate_payment_per_period(self, asking_price, down_payment, payment_schedule, amortization_period,
+                                     product=None):
+        status, payment, principal = self.quote_cents(to_cents(asking_price), to_cents(down_payment),
+                                                      payment_schedule, amortization_period, product)
+        if status != APPROVED:
+            return DeclinedMortgage(status_code=status, asking_price=asking_price, insurable_limit=self.insurable_limit)
+        return ApprovedMortgage(from_cents(payment), from_cents(principal))
+
+    def quote_session(self, asking_price, down_payment, payment_schedule, amortization_period, product=None):
+        return FixedPointQuoteSession(self, asking_price, down_payment, payment_schedule, amortization_period, product)
+
+    def payment_grid(self, asking_price, down_payments, payment_schedule, interest_rates, amortization_periods):
+        # The same grid as MortgageCalculator.payment_grid, with each payment calculated like quote_cents
+        annual_payments = self.annual_payments[payment_schedule]
+        factors = [[fixed_annuity_factor(interest_rate, annual_payments, annual_payments * amortization_period)
+                    for amortization_period in amortization_periods]
+                   for interest_rate in interest_rates]
+
+        asking_price_cents = to_cents(asking_price)
+        statuses = []
+        grids = []
+        for down_payment in down_payments:
+            status, principal = self.principal_cents(asking_price_cents, to_cents(down_payment))
+            statuses.append(status)
+            if status != APPROVED:
+                grids.append(None)
+                continue
+            grids.append([[from_cents(div_round_half_up(principal * factor, FACTOR_SCALE)) for factor in row]
+                          for row in factors])
+        return statuses, grids
+
+    def calculate_maximum(self, payment_amount, payment_schedule, amortization_period, product=None):
+        # The present value of the payments in whole cents, rounded down so that its payment never exceeds the given
+        # one
+        annual_payments = self.annual_payments[payment_schedule]
+        factor = fixed_annuity_factor(self.rate_state(product)[0], annual_payments,
+                                      annual_payments * amortization_period)
+        return from_cents(to_cents(payment_amount) * FACTOR_SCALE // factor)
+
+    def maximum_batch(self, payment_amounts, payment_schedules, amortization_periods, product=None):
+        if not len(payment_amounts) == len(payment_schedules) == len(amortization_periods):
+            raise ValueError('All input columns must have the same length.')
+
+        calculate_maximum = self.calculate_maximum
+        return [calculate_maximum(payment_amount, payment_schedule, amortization_period, product)
+                for payment_amount, payment_schedule, amortization_period
+                in zip(payment_amounts, payment_schedules, amortization_periods)]
+
+    def payment_per_period_batch(self, asking_prices, down_payments, payment_schedules, amortization_periods,
+                                 product=None):
+        n_rows = len(asking_prices)
+        if not n_rows == len(down_payments) == len(payment_schedules) == len(amortization_periods):
+            raise ValueError('All input columns must have the same length.')
+
+        payments = [None] * n_rows
+        statuses = [APPROVED] * n_rows
+        quote_cents = self.quote_cents
+        for i in range(n_rows):
+            status, payment, principal = quote_cents(to_cents(asking_prices[i]), to_cents(down_payments[i]),
+                                                     payment_schedules[i], amortization_periods[i], product)
+            statuses[i] = status
+            if status == APPROVED:
+                payments[i] = from_cents(payment)
+        return payments, statuses
+
+    def payment_per_period_into(self, asking_prices, down_payments, schedule_codes, amortization_periods,
+                                payments, statuses, product=None):
+        n_rows = len(asking_prices)
+        if not n_rows == len(down_payments) == len(schedule_codes) == len(amortization_periods) == len(payments) == \
+                len(statuses):
+            raise ValueError('All input and output columns must have the same length.')
+
+        payment_schedules = self.payment_schedule_codes()
+        quote_cents = self.quote_cents
+        for i in range(n_rows):
+            asking_price = asking_prices[i]
+            down_payment = down_payments[i]
+            code = schedule_codes[i]
+            amortization_period = amortization_periods[i]
+            payments[i] = 0.
+
+            if (not 0 <= code < len(payment_schedules) or
+                    not self.minimum_amortization_period <= amortization_period <= self.maximum_amortization_period or
+                    not .01 <= asking_price <= MAX_AMOUNT or not 0 <= down_payment <= asking_price):
+                statuses[i] = INVALID_INPUT
+                continue
+
+            status, payment, principal = quote_cents(to_cents(asking_price), to_cents(down_payment),
+                                                     payment_schedules[code], amortization_period, product)
+            statuses[i] = status
+            if status == APPROVED:
+                payments[i] = from_cents(payment)
+
+    def amortization_schedule(self, asking_price, down_payment, payment_schedule, amortization_period, product=None):
+        mortgage = self.payment_per_period(asking_price, down_payment, payment_schedule, amortization_period, product)
+        if mortgage.status == 'declined':
+            return mortgage, None
+
+        annual_payments = self.annual_payments[payment_schedule]
+        rows = amortization_schedule_cents(to_cents(mortgage.principal),
+                                           self.rate_state(product)[0],
+                                           annual_payments,
+                                           annual_payments * amortization_period,
+                                           to_cents(mortgage.payment_per_period))
+        return mortgage, (row[:1] + tuple(from_cents(cents) for cents in row[1:]) for row in rows)
+
+    def prepayment_schedule(self, asking_price, down_payment, payment_schedule, amortization_period, extra_payment=0.,
+                            lump_sum=0., payment_increase=0., product=None):
+        mortgage = self.payment_per_period(asking_price, down_payment, payment_schedule, amortization_period, product)
+        if mortgage.status == 'declined':
+            return mortgage, None
+
+        annual_payments = self.annual_payments[payment_schedule]
+        rows = prepayment_schedule_cents(to_cents(mortgage.principal),
+                                         self.rate_state(product)[0],
+                                         annual_payments,
+                                         annual_payments * amortization_period,
+                                         to_cents(mortgage.payment_per_period),
+                                         to_cents(extra_payment),
+                                         to_cents(lump_sum),
+                                         payment_increase)
+        return mortgage, (row[:1] + tuple(from_cents(cents) for cents in row[1:]) for row in rows)
+
+    def prepayment_summarizer(self, mortgage, payment_schedule, amortization_period, product=None):
+        annual_payments = self.annual_payments[payment_schedule]
+        args = (to_cents(mortgage.principal), self.rate_state(product)[0], annual_payments,
+                annual_payments * amortization_period, to_cents(mortgage.payment_per_period))
+
+        def summarize(extra_payment, lump_sum, payment_increase):
+            n_payments, total_interest = prepayment_summary_cents(*args, to_cents(extra_payment), to_cents(lump_sum),
+                                                                  payment_increase)
+            return n_payments, from_cents(total_interest)
+        return summarize
+
+
+class FixedPointQuoteSession(QuoteSession):
+    # A QuoteSession that keeps its amounts in whole cents, with the same steps as FixedPointCalculator.quote_cents
+    __slots__ = ('asking_price_cents', 'down_payment_cents', 'minimum_down_payment_cents', 'principal_cents')
+
+    def update_minimum_down_payment(self):
+        self.asking_price_cents = to_cents(self.asking_price)
+        self.minimum_down_payment_cents = minimum_down_payment_cents(self.asking_price_cents)
+        self.minimum_down_payment = from_cents(self.minimum_down_payment_cents)
+
+    def update_principal(self):
+        asking_price = self.asking_price_cents
+        down_payment = self.down_payment_cents = to_cents(self.down_payment)
+        down_payment_pct = down_payment_percentage_scaled(asking_price, down_payment)
+        self.result = None
+        self.principal = self.principal_cents = None
+        if down_payment < self.minimum_down_payment_cents:
+            self.status_code = DECLINED_MINIMUM_DOWN_PAYMENT
+        elif self.calc.insurable_limit * 100 < asking_price - down_payment and down_payment_pct < PERCENTAGE_SCALE // 5:
+            self.status_code = DECLINED_INSURABLE_LIMIT
+        else:
+            self.status_code = APPROVED
+            self.principal_cents = asking_price - down_payment + \
+                self.calc.fixed_insurance_tiers.cost_cents(asking_price, down_payment)
+            self.principal = from_cents(self.principal_cents)
+        self.down_payment_percentage = down_payment_pct / PERCENTAGE_SCALE
+
+    def update_factor(self):
+        annual_payments = self.calc.annual_payments[self.payment_schedule]
+        self.factor = fixed_annuity_factor(self.rate_state[0], annual_payments,
+                                           annual_payments * self.amortization_period)
+        self.result = None
+
+    def calculate_payment(self):
+        return from_cents(div_round_half_up(self.principal_cents * self.factor, FACTOR_SCALE))
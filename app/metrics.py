@@ -0,0 +1,151 @@
+from threading import Lock
+from time import perf_counter
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5.)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class MetricsRegistry:
+    # Collects per-route request latencies and the time handlers spend in each stage of a request, and renders them
+    # in the Prometheus text format. A disabled registry hands out a timer that does nothing.
+    def __init__(self, enabled=False, routes=()):
+        self.enabled = enabled
+        # Requests to paths outside of this set are grouped together to keep the number of label values bounded
+        self.routes = set(routes)
+        self.lock = Lock()
+        self.requests = {}
+        self.request_counts = {}
+        self.stages = {}
+        self.collectors = []
+
+    def observe_request(self, route, method, status, seconds):
+        if route not in self.routes:
+            route = 'unmatched'
+        with self.lock:
+            histogram = self.requests.get((route, method))
+            if histogram is None:
+                histogram = self.requests[(route, method)] = Histogram()
+            histogram.observe(seconds)
+            key = (route, method, status)
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    def observe_stage(self, route, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get((route, stage))
+            if histogram is None:
+                histogram = self.stages[(route, stage)] = Histogram()
+            histogram.observe(seconds)
+
+    def stage_timer(self, route):
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self, route)
+
+    def add_collector(self, collector):
+        # A collector is called on every render and returns a list of (name, type, help, value) tuples
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = ['# HELP http_request_duration_seconds Time taken to handle a request.',
+                 '# TYPE http_request_duration_seconds histogram']
+        with self.lock:
+            for (route, method), histogram in sorted(self.requests.items()):
+                lines.extend(histogram.render('http_request_duration_seconds', f'route="{route}",method="{method}"'))
+
+            lines.append('# HELP http_requests_total Number of requests handled.')
+            lines.append('# TYPE http_requests_total counter')
+            for (route, method, status), count in sorted(self.request_counts.items()):
+                lines.append(f'http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+
+            lines.append('# HELP http_request_stage_duration_seconds Time taken by each stage of a request handler.')
+            lines.append('# TYPE http_request_stage_duration_seconds histogram')
+            for (route, stage), histogram in sorted(self.stages.items()):
+                lines.extend(histogram.render('http_request_stage_duration_seconds',
+                                              f'route="{route}",stage="{stage}"'))
+
+        for collector in self.collectors:
+            for name, metric_type, help_text, value in collector():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class StageTimer:
+    # Records the time since the previous mark (or since the timer was created) against the named stage
+    def __init__(self, registry, route):
+        self.registry = registry
+        self.route = route
+        self.last = perf_counter()
+
+    def mark(self, stage):
+        now = perf_counter()
+        self.registry.observe_stage(self.route, stage, now - self.last)
+        self.last = now
+
+
+class NullTimer:
+    def mark(self, stage):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class MetricsMiddleware:
+    # ASGI middleware that records the latency and status of every HTTP request in a MetricsRegistry
+    def __init__(self, app, registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Requests are labelled by the path template of the route they matched, such as /payment-sessions/{id}
+            route = scope.get('route')
+            path = scope['path'] if route is None else getattr(route, 'path', scope['path'])
+            self.registry.observe_request(path, scope['method'], status, perf_counter() - start)
@@ -0,0 +1,97 @@
+from abc import ABC, abstractmethod
+from threading import Lock
+import fcntl
+import mmap
+import os
+import struct
+
+
+class RateStore(ABC):
+    # Shared storage for the interest rate. Every write gets a new, increasing version so readers can tell
+    # whether the rate has changed since they last looked without comparing floats.
+    @abstractmethod
+    def read(self):
+        # Returns a (version, interest_rate) tuple
+        pass
+
+    @abstractmethod
+    def write(self, interest_rate):
+        # Stores the rate and returns its version
+        pass
+
+
+class MemoryRateStore(RateStore):
+    # Keeps the rate in the current process only
+    def __init__(self, interest_rate):
+        self.lock = Lock()
+        self.state = (1, interest_rate)
+
+    def read(self):
+        return self.state
+
+    def write(self, interest_rate):
+        with self.lock:
+            version = self.state[0] + 1
+            self.state = (version, interest_rate)
+        return version
+
+
+class FileRateStore(RateStore):
+    # Shares the rate between processes through a small memory mapped file laid out as
+    # [sequence: uint64][version: uint64][interest_rate: float64].
+    # Writers take an exclusive file lock and make the sequence odd while they update the file. Readers do not lock;
+    # they retry until they read the same even sequence before and after the data (a seqlock), and only fall back to
+    # a shared lock after READ_RETRIES attempts.
+    SEQUENCE = struct.Struct('<Q')
+    DATA = struct.Struct('<Qd')
+    SIZE = SEQUENCE.size + DATA.size
+    # The number of times a reader retries without the lock, which is only ever exceeded while writes keep racing it
+    # or after a writer died part way through a write
+    READ_RETRIES = 1000
+
+    def __init__(self, path, interest_rate):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            # The first process to open the file sets the initial rate
+            if os.fstat(self.fd).st_size < self.SIZE:
+                os.ftruncate(self.fd, self.SIZE)
+                os.pwrite(self.fd, self.SEQUENCE.pack(0) + self.DATA.pack(1, interest_rate), 0)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.map = mmap.mmap(self.fd, self.SIZE)
+
+    def read(self):
+        sequence_struct, data_struct, buffer = self.SEQUENCE, self.DATA, self.map
+        for _ in range(self.READ_RETRIES):
+            sequence = sequence_struct.unpack_from(buffer, 0)[0]
+            if sequence & 1:
+                continue
+            version, interest_rate = data_struct.unpack_from(buffer, sequence_struct.size)
+            if sequence_struct.unpack_from(buffer, 0)[0] == sequence:
+                return version, interest_rate
+        # The sequence stays odd if a writer died part way through a write, so rather than spin for ever the reader
+        # waits for the lock, which no writer holds once it is done or dead
+        fcntl.flock(self.fd, fcntl.LOCK_SH)
+        try:
+            return data_struct.unpack_from(buffer, sequence_struct.size)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def write(self, interest_rate):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            # A sequence left odd by a writer that died part way through is made even again
+            sequence = self.SEQUENCE.unpack_from(self.map, 0)[0] & ~1
+            version = self.DATA.unpack_from(self.map, self.SEQUENCE.size)[0] + 1
+            self.SEQUENCE.pack_into(self.map, 0, sequence + 1)
+            self.DATA.pack_into(self.map, self.SEQUENCE.size, version, interest_rate)
+            self.SEQUENCE.pack_into(self.map, 0, sequence + 2)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        return version
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
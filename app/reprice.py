@@ -0,0 +1,163 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from calculator import MortgageCalculator, APPROVED, MAX_AMOUNT, MAX_INTEREST_RATE, valid_interest_rate
+from fixed_point import FixedPointCalculator
+import argparse
+import csv
+import os
+import sys
+import time
+
+INPUT_COLUMNS = ('asking_price', 'down_payment', 'payment_schedule', 'amortization_period')
+OUTPUT_COLUMNS = ('payment_per_period', 'mortgage_status', 'reason')
+
+# The calculator of each worker process, built once by init_worker
+worker_calc = None
+
+
+def init_worker(interest_rate, money_mode):
+    global worker_calc
+    worker_calc = FixedPointCalculator() if money_mode == 'cents' else MortgageCalculator()
+    worker_calc.interest_rate = interest_rate
+
+
+def reprice_chunk(columns):
+    # Reprices one chunk of mortgages given as a tuple of string columns in INPUT_COLUMNS order. Returns a list of
+    # (payment_per_period, mortgage_status, reason) tuples in the same order as the rows.
+    calc = worker_calc
+    n_rows = len(columns[0])
+    results = [None] * n_rows
+    indices = []
+    values = ([], [], [], [])
+    for i in range(n_rows):
+        row = parse_row(calc, columns[0][i], columns[1][i], columns[2][i], columns[3][i])
+        if isinstance(row, str):
+            results[i] = ('', 'error', row)
+            continue
+        indices.append(i)
+        for column, value in zip(values, row):
+            column.append(value)
+
+    payments, statuses = calc.payment_per_period_batch(*values)
+    for position, i in enumerate(indices):
+        if statuses[position] == APPROVED:
+            results[i] = (payments[position], 'approved', '')
+        else:
+            results[i] = ('', 'declined', calc.decline_reason(statuses[position], values[0][position]))
+    return results
+
+
+def parse_row(calc, asking_price, down_payment, payment_schedule, amortization_period):
+    # Returns the converted values of a row, or the reason the row is invalid
+    try:
+        asking_price = float(asking_price)
+        down_payment = float(down_payment)
+        amortization_period = int(amortization_period)
+    except (TypeError, ValueError):
+        return 'The row has a malformed or missing value.'
+
+    payment_schedule = (payment_schedule or '').strip().lower()
+    if payment_schedule not in calc.annual_payments:
+        return 'The allowed values for "payment_schedule" are "weekly", "biweekly", and "monthly".'
+    if not calc.minimum_amortization_period <= amortization_period <= calc.maximum_amortization_period:
+        return 'The amortization period is out of range.'
+    if not .01 <= asking_price <= MAX_AMOUNT:
+        return f'The asking price must be between 0.01 and {MAX_AMOUNT:.0f}.'
+    if not 0 <= down_payment <= asking_price:
+        return 'The down payment must be between 0 and the asking price.'
+    return asking_price, down_payment, payment_schedule, amortization_period
+
+
+def read_chunks(reader, chunk_size):
+    # Yields (rows, columns) for each chunk of the input, where columns holds only the values the workers need
+    rows = []
+    for row in reader:
+        rows.append(row)
+        if len(rows) == chunk_size:
+            yield rows, split_columns(rows)
+            rows = []
+    if rows:
+        yield rows, split_columns(rows)
+
+
+def split_columns(rows):
+    return tuple([row.get(column) for row in rows] for column in INPUT_COLUMNS)
+
+
+def reprice(input_file, output_file, interest_rate, money_mode='float', workers=None, chunk_size=20000,
+            progress=None):
+    # Reprices every mortgage in the input CSV and writes it to the output CSV with the OUTPUT_COLUMNS appended,
+    # keeping the input order. At most two chunks per worker are in flight, which bounds memory use regardless
+    # of the size of the input. Returns the number of rows written.
+    reader = csv.DictReader(input_file)
+    missing = [column for column in INPUT_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f'The input is missing the columns: {", ".join(missing)}.')
+
+    writer = csv.writer(output_file)
+    writer.writerow(list(reader.fieldnames) + list(OUTPUT_COLUMNS))
+
+    workers = workers or os.cpu_count() or 1
+    started = time.monotonic()
+    n_rows = 0
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(interest_rate, money_mode)) as executor:
+        pending = deque()
+        for rows, columns in read_chunks(reader, chunk_size):
+            pending.append((rows, executor.submit(reprice_chunk, columns)))
+            if len(pending) >= workers * 2:
+                n_rows += write_chunk(writer, reader.fieldnames, *pending.popleft())
+                report_progress(progress, n_rows, started)
+        while pending:
+            n_rows += write_chunk(writer, reader.fieldnames, *pending.popleft())
+            report_progress(progress, n_rows, started)
+    return n_rows
+
+
+def write_chunk(writer, fieldnames, rows, future):
+    results = future.result()
+    writer.writerows([[row.get(column) for column in fieldnames] + list(result) for row, result in zip(rows, results)])
+    return len(rows)
+
+
+def report_progress(progress, n_rows, started):
+    if progress is None:
+        return
+    elapsed = time.monotonic() - started
+    rate = n_rows / elapsed if elapsed > 0 else 0.
+    print(f'Repriced {n_rows} rows ({rate:.0f} rows/s)', file=progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reprice a CSV of mortgages at a given interest rate.')
+    parser.add_argument('input', help='CSV with the columns ' + ', '.join(INPUT_COLUMNS) + '. Use - for stdin.')
+    parser.add_argument('output', help='Path of the CSV to write. Use - for stdout.')
+    parser.add_argument('--interest-rate', type=float, required=True,
+                        help='The interest rate as a percentage, such as 3.99.')
+    parser.add_argument('--money-mode', choices=['float', 'cents'], default='float')
+    parser.add_argument('--workers', type=int, help='Number of worker processes. Defaults to the number of CPUs.')
+    parser.add_argument('--chunk-size', type=int, default=20000, help='Number of rows sent to a worker at a time.')
+    parser.add_argument('--quiet', action='store_true', help='Do not report progress on stderr.')
+    args = parser.parse_args(argv)
+
+    if not valid_interest_rate(args.interest_rate / 100):
+        parser.error(f'The interest rate must be greater than 0 and at most {MAX_INTEREST_RATE * 100:.0f}.')
+
+    input_file = sys.stdin if args.input == '-' else open(args.input, newline='')
+    output_file = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        n_rows = reprice(input_file, output_file, args.interest_rate / 100, args.money_mode, args.workers,
+                         args.chunk_size, None if args.quiet else sys.stderr)
+    except ValueError as error:
+        parser.exit(1, f'{error}\n')
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    if not args.quiet:
+        print(f'Done, {n_rows} rows written.', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+
+class SessionTokens:
+    # Self-contained ids for what-if sessions. A token holds the inputs of a session and the time it was issued, signed
+    # with an HMAC of a secret that every worker shares, so any worker can carry on a session that another one created
+    # without shared storage. A token is accepted for ttl seconds after it was issued.
+    def __init__(self, secret, ttl):
+        self.secret = secret
+        self.ttl = ttl
+
+    def issue(self, inputs):
+        payload = encode(json.dumps([int(time.time()), *inputs], separators=(',', ':')).encode())
+        return f'{payload}.{self.sign(payload)}'
+
+    def read(self, token):
+        # Returns the inputs a token was issued for, or None if it was not signed with the secret or has expired
+        payload, _, signature = token.partition('.')
+        if not hmac.compare_digest(signature.encode(), self.sign(payload).encode()):
+            return None
+        issued, *inputs = json.loads(decode(payload))
+        if time.time() - issued > self.ttl:
+            return None
+        return inputs
+
+    def sign(self, payload):
+        return encode(hmac.new(self.secret, payload.encode(), hashlib.sha256).digest()[:16])
+
+
+def encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
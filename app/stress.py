@@ -0,0 +1,239 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from calculator import MortgageCalculator, APPROVED, MAX_INTEREST_RATE, annuity_factor, valid_interest_rate
+from reprice import parse_row
+import argparse
+import csv
+import json
+import math
+import random
+import sys
+
+DEFAULT_PERCENTILES = (5, 50, 95, 99)
+
+
+class RateShockModel:
+    # Simulates the interest rate once a year along n_paths paths with a discrete mean-reverting random walk. Each year
+    # the rate moves mean_reversion of the way towards long_run_rate, plus a normal shock with a standard deviation of
+    # volatility, and never falls below floor. The paths only depend on the parameters and the seed, and the first
+    # years of a path are the same however many years are simulated.
+    def __init__(self, initial_rate, n_paths=10000, volatility=.01, mean_reversion=.1, long_run_rate=None, floor=.0025,
+                 seed=0):
+        if n_paths < 1 or volatility < 0 or not 0 <= mean_reversion <= 1 or floor <= 0 or initial_rate <= 0:
+            raise ValueError('The rate model needs at least one path, a volatility >= 0, a mean reversion between 0 '
+                             'and 1 and rates > 0.')
+        self.initial_rate = initial_rate
+        self.n_paths = n_paths
+        self.volatility = volatility
+        self.mean_reversion = mean_reversion
+        self.long_run_rate = initial_rate if long_run_rate is None else long_run_rate
+        self.floor = floor
+        self.seed = seed
+
+    def rates_by_year(self, years):
+        # Returns one array per year from 0 to years holding the rate of that year on every path
+        gauss = random.Random(self.seed).gauss
+        volatility, mean_reversion, long_run_rate, floor = (self.volatility, self.mean_reversion, self.long_run_rate,
+                                                           self.floor)
+        rates = array('d', [self.initial_rate]) * self.n_paths
+        by_year = [rates]
+        for _ in range(years):
+            rates = array('d', [max(floor, rate + mean_reversion * (long_run_rate - rate) + volatility * gauss(0., 1.))
+                                for rate in rates])
+            by_year.append(rates)
+        return by_year
+
+
+def percentile_ranks(n_values, percentiles):
+    # Nearest-rank indices into n sorted values. Taking an order statistic rather than interpolating means the
+    # percentile of a scaled and rounded value is the scaled and rounded percentile.
+    return [min(n_values - 1, max(0, math.ceil(percentile / 100 * n_values) - 1)) for percentile in percentiles]
+
+
+def renewal_table(rates_by_year, annual_payments, amortization_period, term, percentiles):
+    # Simulates a mortgage with a principal of 1 that is renewed every term years at the rate of that year on each
+    # path, with the payment recalculated by the same annuity factor as a live quote for the payments left. Payments
+    # and balances are proportional to the principal, so every mortgage with the same schedule, period and term
+    # shares this table.
+    # Returns (years, payment_percentiles, shock_percentiles): the renewal years, the percentiles of the payment per
+    # unit of principal at each of them, and the percentiles of the payment shock, the largest payment over the life
+    # of the mortgage relative to the first one, minus 1.
+    total_payments = annual_payments * amortization_period
+    initial_payment = annuity_factor(rates_by_year[0][0], annual_payments, total_payments)
+    n_paths = len(rates_by_year[0])
+    ranks = percentile_ranks(n_paths, percentiles)
+
+    balances = [1.] * n_paths
+    payments = [initial_payment] * n_paths
+    highest = list(payments)
+    previous_rates = rates_by_year[0]
+    remaining = total_payments
+    years = list(range(term, amortization_period, term))
+    payment_percentiles = []
+    for year in years:
+        # The balance left after a term of payments follows the closed form used by closed_form_schedules
+        paid = annual_payments * term
+        growths = [(1 + rate / annual_payments) for rate in previous_rates]
+        balances = [balance * (growth ** remaining - growth ** paid) / (growth ** remaining - 1)
+                    for balance, growth in zip(balances, growths)]
+        remaining -= paid
+        rates = rates_by_year[year]
+        payments = [balance * annuity_factor(rate, annual_payments, remaining)
+                    for balance, rate in zip(balances, rates)]
+        highest = [max(payment, high) for payment, high in zip(payments, highest)]
+        ordered = sorted(payments)
+        payment_percentiles.append([ordered[rank] for rank in ranks])
+        previous_rates = rates
+
+    ordered = sorted(highest)
+    shock_percentiles = [ordered[rank] / initial_payment - 1 for rank in ranks]
+    return years, payment_percentiles, shock_percentiles
+
+
+# The rates of each worker process, simulated once by init_worker
+worker_rates = None
+
+
+def init_worker(model, years):
+    global worker_rates
+    worker_rates = model.rates_by_year(years)
+
+
+def renewal_table_task(key, term, percentiles):
+    annual_payments, amortization_period = key
+    return renewal_table(worker_rates, annual_payments, amortization_period, term, percentiles)
+
+
+def stress_test(calc, mortgages, model, term=5, percentiles=DEFAULT_PERCENTILES, workers=1, chunk_size=10000):
+    # Yields a result for each (asking_price, down_payment, payment_schedule, amortization_period) in mortgages, in
+    # order. The mortgages are read chunk_size at a time, and the renewal table of each schedule and period that a
+    # chunk needs is simulated once, across workers processes when there is more than one, and kept for later chunks.
+    # Memory therefore depends on the number of paths and not on the size of the portfolio.
+    # The first payment of each mortgage is the live quote from calc. An approved result is a dict with the keys
+    # "payment_per_period", "renewals", a list of {"year", "payment_percentiles"}, and "payment_shock_percentiles",
+    # with percentiles keyed like "p95"; a declined one has the keys "mortgage_status" and "reason".
+    # The renewal tables scale from the first payment at the model's initial rate, so it must be calc's rate.
+    if model.initial_rate != calc.interest_rate:
+        raise ValueError(f'The rate model starts at {model.initial_rate} but the calculator quotes at '
+                         f'{calc.interest_rate}.')
+    return stress_results(calc, mortgages, model, term, percentiles, workers, chunk_size)
+
+
+def stress_results(calc, mortgages, model, term, percentiles, workers, chunk_size):
+    years = calc.maximum_amortization_period
+    keys = [f'p{percentile:g}' for percentile in percentiles]
+    tables = {}
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(model, years))
+    else:
+        init_worker(model, years)
+    try:
+        chunk = []
+        for mortgage in mortgages:
+            chunk.append(mortgage)
+            if len(chunk) == chunk_size:
+                yield from stress_chunk(calc, chunk, tables, executor, term, percentiles, keys)
+                chunk = []
+        if chunk:
+            yield from stress_chunk(calc, chunk, tables, executor, term, percentiles, keys)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def stress_chunk(calc, chunk, tables, executor, term, percentiles, keys):
+    quotes = [calc.calculate_payment_per_period(*mortgage) for mortgage in chunk]
+    missing = sorted({(calc.annual_payments[payment_schedule], amortization_period)
+                      for (asking_price, down_payment, payment_schedule, amortization_period), quote
+                      in zip(chunk, quotes) if quote.status_code == APPROVED} - set(tables))
+    if executor is None:
+        results = map(renewal_table_task, missing, [term] * len(missing), [percentiles] * len(missing))
+    else:
+        results = executor.map(renewal_table_task, missing, [term] * len(missing), [percentiles] * len(missing))
+    tables.update(zip(missing, results))
+
+    for (asking_price, down_payment, payment_schedule, amortization_period), quote in zip(chunk, quotes):
+        if quote.status_code != APPROVED:
+            yield {'mortgage_status': 'declined', 'reason': quote.status_text}
+            continue
+        years, payment_percentiles, shock_percentiles = tables[(calc.annual_payments[payment_schedule],
+                                                                amortization_period)]
+        principal = quote.principal
+        yield {
+            'payment_per_period': quote.payment_per_period,
+            'renewals': [{'year': year,
+                          'payment_percentiles': {key: round(principal * value, 2) for key, value in zip(keys, values)}}
+                         for year, values in zip(years, payment_percentiles)],
+            'payment_shock_percentiles': {key: round(value, 4) for key, value in zip(keys, shock_percentiles)}
+        }
+
+
+def read_mortgages(reader, calc, errors):
+    # Yields the converted values of each valid row. Rows that cannot be quoted are reported on errors.
+    for line, row in enumerate(reader, start=2):
+        values = parse_row(calc, row.get('asking_price'), row.get('down_payment'), row.get('payment_schedule'),
+                           row.get('amortization_period'))
+        if isinstance(values, str):
+            print(f'Skipping line {line}: {values}', file=errors)
+            continue
+        yield values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Stress test a CSV of mortgages against simulated interest rate paths.')
+    parser.add_argument('input', help='CSV with the columns asking_price, down_payment, payment_schedule and '
+                                      'amortization_period. Use - for stdin.')
+    parser.add_argument('output', help='Path of the NDJSON report to write, one line per mortgage. Use - for stdout.')
+    parser.add_argument('--interest-rate', type=float, required=True,
+                        help='The current interest rate as a percentage, such as 3.99.')
+    parser.add_argument('--term', type=int, default=5, help='Years between renewals.')
+    parser.add_argument('--paths', type=int, default=10000, help='Number of simulated rate paths.')
+    parser.add_argument('--volatility', type=float, default=1.,
+                        help='Yearly standard deviation of the rate, in percentage points.')
+    parser.add_argument('--mean-reversion', type=float, default=.1,
+                        help='Share of the distance to the long run rate the rate moves each year.')
+    parser.add_argument('--long-run-rate', type=float,
+                        help='Percentage the rate reverts to. Defaults to the current rate.')
+    parser.add_argument('--floor', type=float, default=.25, help='Lowest simulated rate as a percentage.')
+    parser.add_argument('--percentiles', default='5,50,95,99', help='Comma separated percentiles to report.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes.')
+    parser.add_argument('--money-mode', choices=['float', 'cents'], default='float')
+    args = parser.parse_args(argv)
+
+    if not valid_interest_rate(args.interest_rate / 100):
+        parser.error(f'The interest rate must be greater than 0 and at most {MAX_INTEREST_RATE * 100:.0f}.')
+    try:
+        percentiles = [float(percentile) for percentile in args.percentiles.split(',')]
+        if args.term < 1 or not all(0 < percentile <= 100 for percentile in percentiles):
+            raise ValueError('The term must be at least a year and the percentiles between 0 and 100.')
+        model = RateShockModel(args.interest_rate / 100, args.paths, args.volatility / 100, args.mean_reversion,
+                               None if args.long_run_rate is None else args.long_run_rate / 100, args.floor / 100,
+                               args.seed)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.money_mode == 'cents':
+        from fixed_point import FixedPointCalculator
+        calc = FixedPointCalculator()
+    else:
+        calc = MortgageCalculator()
+    calc.interest_rate = args.interest_rate / 100
+
+    input_file = sys.stdin if args.input == '-' else open(args.input, newline='')
+    output_file = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        mortgages = read_mortgages(csv.DictReader(input_file), calc, sys.stderr)
+        for result in stress_test(calc, mortgages, model, args.term, percentiles, args.workers):
+            output_file.write(json.dumps(result) + '\n')
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+from calculator import MAX_AMOUNT
 from errors import *
 
 class Validator:
@@ -20,7 +21,8 @@ class ValidatorHandler:
     def add(self, key, error, func, *args):
         self.validators[key] = Validator(error, func, *args)
 
-    def validate_all(self, params, query_keys):
+    def validate_all(self, params, query_keys, fail_fast=False):
+        # With fail_fast, stops at the first error for callers that only report one
         validators = self.validators
         errors = None
         for key in query_keys:
@@ -28,11 +30,111 @@ class ValidatorHandler:
             validator = validators[key]
             error = validator.validate(param)
             if error:
+                if fail_fast:
+                    return [error]
                 if errors is None:
                     errors = []
                 errors.append(error)
         return errors
 
+class Field:
+    def __init__(self, key, dtype, error, func, *args, required=True):
+        self.key = key
+        self.dtype = dtype
+        self.error = error
+        self.func = func
+        self.args = args
+        self.required = required
+
+class CompiledValidator:
+    # Converts and validates the params of an endpoint in a single pass over a schema of Fields that is built once,
+    # instead of constructing a ValidatorHandler and converting the params separately on every request. The errors
+    # for missing and malformed params are built with the schema too, so rejecting a request allocates no errors.
+    def __init__(self, fields):
+        self.fields = tuple((field.key, field.dtype, field.error, field.func, field.args,
+                             missing_param_error(field.key) if field.required else None,
+                             HTTPException(HTTP_400_BAD_REQUEST, f'The parameter {field.key} is malformed.'))
+                            for field in fields)
+
+    def validate(self, params, fail_fast=False):
+        # Returns the converted values in schema order, with None for missing optional params, and a list of the
+        # errors found or None if there were none. With fail_fast, validation stops at the first error, which is
+        # then the only one returned, for callers that only report one.
+        values = []
+        errors = None
+        for key, dtype, error, func, args, missing, malformed in self.fields:
+            value = params.get(key)
+            if value is None:
+                error = missing
+            else:
+                try:
+                    value = dtype(value)
+                except ValueError:
+                    error = malformed
+                else:
+                    if func(value, *args):
+                        error = None
+            if error is not None:
+                if fail_fast:
+                    return values, [error]
+                if errors is None:
+                    errors = []
+                errors.append(error)
+                value = None
+            values.append(value)
+        return values, errors
+
+    def validate_present(self, params, fail_fast=False):
+        # Converts and validates only the params that are present, for a request that changes some of them. Returns
+        # a dict of the converted values by key and a list of the errors found or None.
+        values = {}
+        errors = None
+        for key, dtype, error, func, args, missing, malformed in self.fields:
+            value = params.get(key)
+            if value is None:
+                continue
+            try:
+                value = dtype(value)
+            except ValueError:
+                error = malformed
+            else:
+                if func(value, *args):
+                    values[key] = value
+                    continue
+            if fail_fast:
+                return values, [error]
+            if errors is None:
+                errors = []
+            errors.append(error)
+        return values, errors
+
+    def report(self, params):
+        # Every invalid param as {"param": key, "detail": message} in schema order, for clients that want to fix them
+        # all at once rather than one request at a time
+        report = []
+        for key, dtype, error, func, args, missing, malformed in self.fields:
+            value = params.get(key)
+            if value is None:
+                error = missing
+            else:
+                try:
+                    value = dtype(value)
+                except ValueError:
+                    error = malformed
+                else:
+                    if func(value, *args):
+                        error = None
+            if error is not None:
+                report.append({'param': key, 'detail': error_detail(error)})
+        return report
+
+def missing_param_error(key):
+    return HTTPException(HTTP_400_BAD_REQUEST, f'The required query parameter "{key}" is missing.')
+
+def error_detail(error):
+    # Schema errors are either HTTPException instances or ValidationError classes
+    return (error() if isinstance(error, type) else error).detail
+
 def validate_params(params, query_keys, validators):
     validators = validators.validators
     errors = []
@@ -49,6 +151,13 @@ def validate_positive_float(value):
         return False
     return validate_positive_value(value)
 
+def validate_amount(value):
+    return validate_positive_float(value) and value <= MAX_AMOUNT
+
+def validate_price(value):
+    # The down payment percentage divides by the asking price, which would be 0 in cents below a cent
+    return validate_amount(value) and value >= .01
+
 def validate_float(value):
     return isinstance(value, float)
 
@@ -67,11 +176,26 @@ def validate_positive_integer_in_range(value, low, high):
         return False
     return all((validate_positive_value(value), validate_value_in_range(value, low, high)))
 
+def validate_interest_rate(value, high):
+    return validate_positive_float(value) and 0 < value <= high
+
+def validate_percentage(value):
+    return validate_positive_float(value) and value <= 100.
+
+def validate_positive_float_list(values, high):
+    return all(validate_positive_float(value) and value <= high for value in values)
+
+def validate_positive_integer_list_in_range(values, low, high):
+    return all(validate_positive_integer_in_range(value, low, high) for value in values)
+
 def validate_payment_schedule(payment_schedule, payment_schedules):
     if payment_schedule not in payment_schedules.keys():
         return False
     return True
 
+def validate_product(product, has_product):
+    return has_product(product)
+
 def convert_params(params, dtypes):
     if params.keys() != dtypes.keys():
         raise ValueError('The keys to the params dict and the dtypes dict must by the same.')
@@ -97,5 +221,12 @@ def convert_param(param, dtype):
 
     return param
 
+def float_list(value):
+    # Converts a comma separated string to a list of floats, raising ValueError if any item is malformed
+    return [float(item) for item in value.split(',')]
+
+def integer_list(value):
+    return [int(item) for item in value.split(',')]
+
 def clean_string(value):
     return value.strip().lower()
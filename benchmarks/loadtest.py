@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from run import git_revision, percentile
+
+# The app modules import each other by their bare names, the same way uvicorn loads them from the app directory
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+
+# A handful of listings that are quoted over and over, the way a listing page is viewed by many buyers
+LISTINGS = [
+    (asking_price, asking_price * down_payment_pct, payment_schedule, amortization_period)
+    for asking_price in (349900, 499000, 625000, 789000, 1150000)
+    for down_payment_pct, payment_schedule, amortization_period in ((.05, 'monthly', 25), (.1, 'biweekly', 25),
+                                                                    (.2, 'weekly', 20), (.25, 'monthly', 15))
+]
+
+# Requests that fail validation and are answered by the HTTPException paths
+MALFORMED_PARAMS = [
+    {'asking_price': 'abc', 'down_payment': '50000', 'payment_schedule': 'monthly', 'amortization_period': '25'},
+    {'asking_price': '500000', 'payment_schedule': 'monthly', 'amortization_period': '25'},
+    {'asking_price': '500000', 'down_payment': '50000', 'payment_schedule': 'daily', 'amortization_period': '25'},
+    {'asking_price': '500000', 'down_payment': '50000', 'payment_schedule': 'monthly', 'amortization_period': '40'},
+    {'asking_price': '500000', 'down_payment': '600000', 'payment_schedule': 'monthly', 'amortization_period': '25'}
+]
+
+# Interest rates, as percentages, that PATCH /interest-rate moves between
+INTEREST_RATES = (2.5, 3.49, 3.99, 4.79, 5.2)
+
+# The status each kind of request is expected to get; anything else counts as an error
+EXPECTED_STATUS = {'quote': 200, 'malformed': 400, 'rate': 200}
+
+DEFAULT_MIX = 'quote=90,malformed=8,rate=2'
+
+
+def parse_mix(text):
+    # "quote=90,malformed=8,rate=2" -> {'quote': 90., 'malformed': 8., 'rate': 2.}
+    mix = {}
+    for pair in text.split(','):
+        kind, _, weight = pair.partition('=')
+        kind = kind.strip()
+        if kind not in EXPECTED_STATUS:
+            raise ValueError(f'The kinds of request are {", ".join(EXPECTED_STATUS)}.')
+        mix[kind] = float(weight)
+    if not mix or any(weight < 0 for weight in mix.values()) or not sum(mix.values()):
+        raise ValueError('The traffic mix needs at least one kind of request with a weight > 0.')
+    return mix
+
+
+def build_request(kind, rnd):
+    # Returns (method, path, params, json body) for a request of the given kind
+    if kind == 'quote':
+        asking_price, down_payment, payment_schedule, amortization_period = rnd.choice(LISTINGS)
+        params = {'asking_price': str(asking_price), 'down_payment': str(down_payment),
+                  'payment_schedule': payment_schedule, 'amortization_period': str(amortization_period)}
+        return 'GET', '/payment-amount', params, None
+    if kind == 'malformed':
+        return 'GET', '/payment-amount', rnd.choice(MALFORMED_PARAMS), None
+    return 'PATCH', '/interest-rate', None, {'interest_rate': rnd.choice(INTEREST_RATES)}
+
+
+def run_client(target, base_url, concurrency, duration, warmup, mix, seed):
+    # Runs in a client process. Returns {kind: (latencies in ns, number of errors)} for the requests started after
+    # the warmup.
+    if target == 'asgi':
+        sys.path.insert(0, APP_DIR)
+        import api
+        transport = httpx.ASGITransport(app=api.create_app())
+    else:
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=concurrency))
+    return asyncio.run(drive(transport, base_url, concurrency, duration, warmup, mix, seed))
+
+
+async def drive(transport, base_url, concurrency, duration, warmup, mix, seed):
+    rnd = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    results = {kind: ([], 0) for kind in kinds}
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def user(client):
+        perf_counter_ns = time.perf_counter_ns
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                return
+            kind = rnd.choices(kinds, weights)[0]
+            method, path, params, body = build_request(kind, rnd)
+            start = perf_counter_ns()
+            try:
+                response = await client.request(method, path, params=params, json=body)
+                ok = response.status_code == EXPECTED_STATUS[kind]
+            except httpx.HTTPError:
+                ok = False
+            elapsed = perf_counter_ns() - start
+            if now >= measure_from:
+                latencies, errors = results[kind]
+                latencies.append(elapsed)
+                if not ok:
+                    results[kind] = (latencies, errors + 1)
+            # An in-process transport never waits on a socket, so each user yields to let the others run
+            await asyncio.sleep(0)
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=30) as client:
+        await asyncio.gather(*[user(client) for _ in range(concurrency)])
+    return results
+
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {'requests': 0, 'throughput_per_second': 0., 'error_rate': 0.}
+    return {
+        'requests': len(latencies),
+        'throughput_per_second': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 50) / 1e6,
+        'p90_ms': percentile(latencies, 90) / 1e6,
+        'p99_ms': percentile(latencies, 99) / 1e6,
+        'max_ms': latencies[-1] / 1e6,
+        'error_rate': errors / len(latencies)
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, env):
+    # Starts uvicorn with the production app factory and waits until it answers. Returns (process, base_url).
+    port = free_port()
+    command = [sys.executable, '-m', 'uvicorn', '--factory', 'api:create_app', '--app-dir', APP_DIR,
+               '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers), '--log-level', 'warning',
+               '--no-access-log']
+    process = subprocess.Popen(command, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'uvicorn exited with status {process.returncode}.')
+        try:
+            if httpx.get(f'{base_url}/interest-rates', timeout=1).status_code == 200:
+                # Give the other workers a moment to finish starting too
+                time.sleep(.2 * workers)
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(.1)
+    stop_server(process)
+    raise RuntimeError('uvicorn did not start within 30 seconds.')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_load(target, workers, args, mix, env):
+    # One run at a worker count. Over HTTP, uvicorn runs that many worker processes and --client-processes drive
+    # them. In-process, each of that many client processes drives its own app, which measures how the app itself
+    # scales across cores without the network in between.
+    process = None
+    base_url = args.url or 'http://loadtest'
+    client_processes = args.client_processes
+    if target == 'asgi':
+        client_processes = workers
+    elif not args.url:
+        process, base_url = start_server(workers, env)
+
+    try:
+        with ProcessPoolExecutor(client_processes) as executor:
+            futures = [executor.submit(run_client, target, base_url, args.concurrency, args.duration, args.warmup, mix,
+                                       args.seed + i)
+                       for i in range(client_processes)]
+            client_results = [future.result() for future in futures]
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    kinds = {}
+    all_latencies = []
+    all_errors = 0
+    for kind in mix:
+        latencies = [latency for results in client_results for latency in results[kind][0]]
+        errors = sum(results[kind][1] for results in client_results)
+        kinds[kind] = summarize(latencies, errors, args.duration)
+        all_latencies.extend(latencies)
+        all_errors += errors
+    return {'workers': workers, 'total': summarize(all_latencies, all_errors, args.duration), 'kinds': kinds}
+
+
+def print_run(run):
+    print(f'workers={run["workers"]}')
+    for name, result in [('total', run['total']), *run['kinds'].items()]:
+        if not result['requests']:
+            continue
+        print(f'  {name:<10} {result["requests"]:>8} req  {result["throughput_per_second"]:>9.0f}/s  '
+              f'p50 {result["p50_ms"]:>7.2f}ms  p90 {result["p90_ms"]:>7.2f}ms  p99 {result["p99_ms"]:>7.2f}ms  '
+              f'errors {result["error_rate"]:.2%}')
+
+
+def check_gates(results, args, baseline):
+    # Returns a list of the gates that failed
+    failures = []
+    runs = results['runs']
+    for run in runs:
+        total = run['total']
+        if total['error_rate'] > args.max_error_rate:
+            failures.append(f'workers={run["workers"]}: error rate {total["error_rate"]:.2%} is above '
+                            f'{args.max_error_rate:.2%}')
+
+    if args.min_scaling is not None and len(runs) > 1:
+        first, last = runs[0], runs[-1]
+        scaling = last['total']['throughput_per_second'] / max(first['total']['throughput_per_second'], 1e-9)
+        if scaling < args.min_scaling:
+            failures.append(f'throughput with {last["workers"]} workers is x{scaling:.2f} that of '
+                            f'{first["workers"]}, below x{args.min_scaling:.2f}')
+
+    if baseline is not None:
+        if baseline.get('target') != results['target'] or baseline.get('mix') != results['mix']:
+            failures.append('the baseline was recorded with a different target or traffic mix')
+        previous_runs = {run['workers']: run for run in baseline['runs']}
+        for run in runs:
+            previous = previous_runs.get(run['workers'])
+            if previous is None:
+                continue
+            throughput = run['total']['throughput_per_second'] / previous['total']['throughput_per_second']
+            p99 = run['total']['p99_ms'] / previous['total']['p99_ms']
+            print(f'workers={run["workers"]} compared to {baseline.get("revision")}: throughput x{throughput:.2f}  '
+                  f'p99 x{p99:.2f}')
+            if throughput < 1 - args.max_throughput_drop:
+                failures.append(f'workers={run["workers"]}: throughput dropped to x{throughput:.2f} of the baseline')
+            if p99 > 1 + args.max_p99_increase:
+                failures.append(f'workers={run["workers"]}: p99 latency rose to x{p99:.2f} of the baseline')
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the API with a realistic traffic mix.')
+    parser.add_argument('--target', choices=['http', 'asgi'], default='http',
+                        help='Drive uvicorn over HTTP, or apps in the client processes over ASGI.')
+    parser.add_argument('--url', help='Drive an already running server instead of starting uvicorn.')
+    parser.add_argument('--workers', default='1,2,4',
+                        help='Comma separated worker counts to run, one after the other.')
+    parser.add_argument('--client-processes', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Processes generating load over HTTP.')
+    parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight per client process.')
+    parser.add_argument('--duration', type=float, default=10., help='Seconds measured per run.')
+    parser.add_argument('--warmup', type=float, default=2., help='Seconds run before measuring.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Weights of the kinds of request quote, malformed and rate.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path.')
+    parser.add_argument('--baseline', help='Compare against results previously written with --output.')
+    parser.add_argument('--max-throughput-drop', type=float, default=.1,
+                        help='Largest fraction of the baseline throughput that may be lost.')
+    parser.add_argument('--max-p99-increase', type=float, default=.25,
+                        help='Largest fraction the p99 latency may rise above the baseline.')
+    parser.add_argument('--max-error-rate', type=float, default=0.,
+                        help='Largest fraction of requests that may get an unexpected status.')
+    parser.add_argument('--min-scaling', type=float,
+                        help='Smallest throughput of the last worker count relative to the first.')
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+        worker_counts = [int(workers) for workers in args.workers.split(',')]
+        if not worker_counts or min(worker_counts) < 1 or args.duration <= 0 or args.concurrency < 1:
+            raise ValueError('Worker counts, the duration and the concurrency must be > 0.')
+    except ValueError as error:
+        parser.error(str(error))
+    target = 'http' if args.url else args.target
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'target': target,
+        'mix': mix,
+        'duration': args.duration,
+        'concurrency': args.concurrency,
+        'client_processes': args.client_processes,
+        'runs': []
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Every worker shares the interest rate through a rate store so that the rate writes reach all of them
+        env = {**os.environ, 'RATE_STORE_PATH': os.path.join(directory, 'rate')}
+        if target == 'asgi':
+            os.environ['RATE_STORE_PATH'] = env['RATE_STORE_PATH']
+        for workers in ([1] if args.url else worker_counts):
+            run = run_load(target, workers, args, mix, env)
+            results['runs'].append(run)
+            print_run(run)
+
+    first = results['runs'][0]['total']['throughput_per_second']
+    for run in results['runs'][1:]:
+        print(f'workers={run["workers"]}: x{run["total"]["throughput_per_second"] / max(first, 1e-9):.2f} the '
+              f'throughput of workers={results["runs"][0]["workers"]}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    failures = check_gates(results, args, baseline)
+    for failure in failures:
+        print(f'FAILED: {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
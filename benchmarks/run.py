@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# The app modules import each other by their bare names, the same way uvicorn loads them from the app directory
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+from calculator import MortgageCalculator, calculate_insurance_cost
+from validation import *
+
+
+def benchmark_cases():
+    calc = MortgageCalculator()
+
+    def payment_per_period():
+        calc.payment_per_period(500000., 50000., 'monthly', 25)
+
+    def insurance_cost():
+        calculate_insurance_cost(calc.insurance_tiers, 500000., 50000.)
+
+    required_keys = ['asking_price', 'down_payment', 'payment_schedule', 'amortization_period']
+    param_dtypes = {key: calc.param_dtypes[key] for key in required_keys}
+
+    def validation():
+        params = convert_params({'asking_price': '500000', 'down_payment': '50000', 'payment_schedule': 'monthly',
+                                 'amortization_period': '25'}, param_dtypes)
+        validators = ValidatorHandler()
+        validators.add('asking_price', AskingPriceValidationError, validate_positive_float)
+        validators.add('down_payment', DownPaymentValidationError, validate_positive_float)
+        validators.add('payment_schedule', PaymentScheduleValidationError, validate_payment_schedule,
+                       calc.annual_payments)
+        validators.add('amortization_period',
+                       AmortizationPeriodValidationError,
+                       validate_positive_integer_in_range,
+                       calc.minimum_amortization_period,
+                       calc.maximum_amortization_period + 1)
+        validators.validate_all(params, required_keys)
+
+    compiled = CompiledValidator([
+        Field('asking_price', float, AskingPriceValidationError, validate_positive_float),
+        Field('down_payment', float, DownPaymentValidationError, validate_positive_float),
+        Field('payment_schedule', clean_string, PaymentScheduleValidationError, validate_payment_schedule,
+              calc.annual_payments),
+        Field('amortization_period',
+              int,
+              AmortizationPeriodValidationError,
+              validate_positive_integer_in_range,
+              calc.minimum_amortization_period,
+              calc.maximum_amortization_period + 1)
+    ])
+
+    def compiled_validation():
+        compiled.validate({'asking_price': '500000', 'down_payment': '50000', 'payment_schedule': 'monthly',
+                           'amortization_period': '25'})
+
+    def compiled_validation_rejected():
+        compiled.validate({'asking_price': 'abc', 'payment_schedule': 'yearly'}, fail_fast=True)
+
+    cases = {
+        'payment_per_period': payment_per_period,
+        'calculate_insurance_cost': insurance_cost,
+        'validation': validation,
+        'compiled_validation': compiled_validation,
+        'compiled_validation_rejected': compiled_validation_rejected
+    }
+
+    try:
+        from starlette.testclient import TestClient
+        import api
+    except ImportError as error:
+        print(f'Skipping API benchmarks: {error}', file=sys.stderr)
+        return cases
+
+    client = TestClient(api.app)
+    payment_params = {'asking_price': '500000', 'down_payment': '50000', 'payment_schedule': 'monthly',
+                      'amortization_period': '25'}
+    maximum_params = {'payment': '2000', 'payment_schedule': 'monthly', 'amortization_period': '25'}
+
+    def get_payment_amount():
+        client.get('/payment-amount', params=payment_params)
+
+    def get_mortgage_amount():
+        client.get('/mortgage-amount', params=maximum_params)
+
+    def get_payment_amount_rejected():
+        client.get('/payment-amount', params={'asking_price': 'abc', 'payment_schedule': 'yearly'})
+
+    cases['GET /payment-amount'] = get_payment_amount
+    cases['GET /mortgage-amount'] = get_mortgage_amount
+    cases['GET /payment-amount rejected'] = get_payment_amount_rejected
+    return cases
+
+
+def measure(func, iterations, warmup):
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    perf_counter_ns = time.perf_counter_ns
+    started = perf_counter_ns()
+    for _ in range(iterations):
+        start = perf_counter_ns()
+        func()
+        timings.append(perf_counter_ns() - start)
+    elapsed = perf_counter_ns() - started
+    timings.sort()
+
+    # Allocations are measured in a separate pass so tracing does not distort the timings
+    allocation_iterations = min(iterations, 200)
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    peak_bytes = 0
+    for _ in range(allocation_iterations):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func()
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1] - baseline)
+    retained_blocks = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'throughput_per_second': iterations / (elapsed / 1e9),
+        'p50_us': percentile(timings, 50) / 1e3,
+        'p99_us': percentile(timings, 99) / 1e3,
+        'peak_alloc_bytes_per_call': peak_bytes,
+        'retained_blocks_per_call': retained_blocks / allocation_iterations
+    }
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline):
+    print()
+    print(f'Compared to {baseline.get("revision")}:')
+    for name, result in results['cases'].items():
+        previous = baseline['cases'].get(name)
+        if previous is None:
+            continue
+        ratio = result['throughput_per_second'] / previous['throughput_per_second']
+        p99_ratio = result['p99_us'] / previous['p99_us']
+        print(f'{name:<28} throughput x{ratio:.2f}  p99 x{p99_ratio:.2f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the calculator and API hot paths.')
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--warmup', type=int, default=1000)
+    parser.add_argument('--only', action='append', help='Only run the named case. Can be given more than once.')
+    parser.add_argument('--output', help='Write the results as JSON to this path.')
+    parser.add_argument('--compare', help='Compare against results previously written with --output.')
+    args = parser.parse_args(argv)
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cases': {}
+    }
+    for name, func in benchmark_cases().items():
+        if args.only and name not in args.only:
+            continue
+        # The API cases go through the full HTTP stack so they are run for fewer iterations
+        iterations = args.iterations if not name.startswith('GET') else max(1, args.iterations // 20)
+        warmup = args.warmup if not name.startswith('GET') else max(1, args.warmup // 20)
+        result = measure(func, iterations, warmup)
+        results['cases'][name] = result
+        print(f'{name:<28} {result["throughput_per_second"]:>12.0f}/s  p50 {result["p50_us"]:>9.2f}us  '
+              f'p99 {result["p99_us"]:>9.2f}us  peak alloc {result["peak_alloc_bytes_per_call"]:>7}B')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
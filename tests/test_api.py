@@ -0,0 +1,465 @@
+from app import api
+from starlette.testclient import TestClient
+from unittest import mock
+from urllib.parse import urlencode
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+# The environment variables the app is configured from, cleared so the tests start from the defaults
+API_ENVIRON = ('QUOTE_CACHE_SIZE', 'QUOTE_CACHE_TTL', 'RATE_STORE_PATH', 'CONFIG_LOG_DIR', 'QUOTE_SESSION_LIMIT',
+               'QUOTE_SESSION_TTL', 'EXECUTION_MODE', 'EXECUTION_OFFLOAD_THRESHOLD', 'EXECUTION_MAX_WORKERS',
+               'EXECUTION_MAX_PENDING', 'MONEY_MODE', 'METRICS_ENABLED', 'PRODUCT_RATES', 'QUOTE_SESSION_SECRET')
+
+QUOTE = {'asking_price': '500000', 'down_payment': '50000', 'payment_schedule': 'monthly', 'amortization_period': '25'}
+
+
+def create_client(**environ):
+    # Each client gets a freshly configured app. The environment is only read while the app is created.
+    environ = {key: value for key, value in os.environ.items() if key not in API_ENVIRON} | environ
+    with mock.patch.dict(os.environ, environ, clear=True):
+        app = api.create_app()
+    return TestClient(app)
+
+
+class TestPaymentAmount(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client()
+
+    def test_approved(self):
+        response = self.client.get('/payment-amount', params=QUOTE)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'payment_per_period': 2072.61})
+
+    def test_declined(self):
+        response = self.client.get('/payment-amount', params={**QUOTE, 'down_payment': '10000'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['mortgage_status'], 'declined')
+
+    def test_invalid_params(self):
+        response = self.client.get('/payment-amount', params={**QUOTE, 'asking_price': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.text, 'The parameter asking_price is malformed.')
+        response = self.client.get('/payment-amount', params={**QUOTE, 'down_payment': '600000'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.text, 'The down payment cannot exceed the asking price.')
+
+    def test_error_report(self):
+        response = self.client.get('/payment-amount', params={'asking_price': 'abc', 'payment_schedule': 'yearly',
+                                                              'amortization_period': '25', 'errors': 'all'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['param'] for error in response.json()['errors']],
+                         ['asking_price', 'down_payment', 'payment_schedule'])
+        response = self.client.get('/payment-amount', params={**QUOTE, 'down_payment': '600000', 'errors': 'all'})
+        self.assertEqual(response.json()['errors'][0]['param'], 'down_payment')
+
+
+class TestCentsMode(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client(MONEY_MODE='cents')
+
+    def test_approved(self):
+        self.assertEqual(self.client.get('/payment-amount', params=QUOTE).json(), {'payment_per_period': 2072.61})
+
+    def test_out_of_range_amounts(self):
+        for asking_price, down_payment in [('inf', '1'), ('1e300', '1e299'), ('0', '0'), ('0.004', '0'),
+                                           ('500000', 'inf'), ('nan', '0')]:
+            for path in ['/payment-amount', '/amortization-schedule', '/payment-sessions']:
+                response = self.client.request('POST' if path == '/payment-sessions' else 'GET', path,
+                                               params={**QUOTE, 'asking_price': asking_price,
+                                                       'down_payment': down_payment})
+                self.assertEqual(response.status_code, 400)
+        response = self.client.post('/payment-amount/batch', json=[{**QUOTE, 'asking_price': 1e300}])
+        self.assertIn('error', response.json())
+        response = self.client.post('/prepayment-scenarios', json={**QUOTE, 'strategies': [{'lump_sum': 'inf'}]})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/payment-grid', params={'asking_price': 'inf', 'payment_schedule': 'monthly',
+                                                            'rate_min': '2', 'rate_max': '3', 'down_payment': '1'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_prepayments_in_cents(self):
+        schedule = self.client.get('/amortization-schedule', params={**QUOTE, 'format': 'ndjson'}).text.splitlines()
+        response = self.client.post('/prepayment-scenarios', json={**QUOTE, 'strategies': [{'lump_sum': 10000}]})
+        self.assertEqual(response.json()['baseline']['total_interest'], json.loads(schedule[-1])['total_interest'])
+        rows = self.client.get('/amortization-schedule', params={**QUOTE, 'format': 'ndjson', 'lump_sum': '10000'})
+        last_row = json.loads(rows.text.splitlines()[-1])
+        self.assertEqual(last_row['total_interest'], response.json()['strategies'][0]['total_interest'])
+        self.assertEqual(last_row['period'], response.json()['strategies'][0]['payments'])
+
+
+class TestPaymentAmountBatch(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client()
+
+    def test_json_array(self):
+        response = self.client.post('/payment-amount/batch', json=[QUOTE, {**QUOTE, 'asking_price': 'abc'}, 1])
+        self.assertEqual(response.status_code, 200)
+        results = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(results, [{'payment_per_period': 2072.61},
+                                   {'error': 'The parameter asking_price is malformed.'},
+                                   {'error': 'The row is not a JSON object.'}])
+
+    def test_ndjson(self):
+        body = '\n'.join([json.dumps(QUOTE), 'not json', json.dumps({**QUOTE, 'down_payment': '10000'})])
+        response = self.client.post('/payment-amount/batch', content=body,
+                                    headers={'content-type': 'application/x-ndjson'})
+        results = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], {'payment_per_period': 2072.61})
+        self.assertIn('error', results[1])
+        self.assertEqual(results[2]['mortgage_status'], 'declined')
+
+    def test_invalid_body(self):
+        response = self.client.post('/payment-amount/batch', json={'rows': []})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/payment-amount/batch', content='[{',
+                                    headers={'content-type': 'application/json'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_empty_batch(self):
+        response = self.client.post('/payment-amount/batch', json=[])
+        self.assertEqual((response.status_code, response.text), (200, ''))
+        response = self.client.post('/payment-amount/batch', content='\n\n',
+                                    headers={'content-type': 'application/x-ndjson'})
+        self.assertEqual((response.status_code, response.text), (200, ''))
+
+    def test_matches_single_quotes(self):
+        rows = [{**QUOTE, 'asking_price': str(price), 'down_payment': str(price * percentage / 100),
+                 'payment_schedule': schedule, 'amortization_period': str(period)}
+                for price in (100000, 750000, 1200000) for percentage in (3, 10, 25)
+                for schedule in ('weekly', 'biweekly', 'monthly') for period in (5, 25)]
+        response = self.client.post('/payment-amount/batch', json=rows)
+        results = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(results, [self.client.get('/payment-amount', params=row).json() for row in rows])
+
+    def test_rows_stay_in_order_across_chunks(self):
+        rows = [{**QUOTE, 'asking_price': str(500000 + index)} for index in range(7)] + ['row']
+        expected = [self.client.get('/payment-amount', params=row).json() for row in rows[:-1]]
+        expected.append({'error': 'The row is not a JSON object.'})
+        with mock.patch.object(api, 'BATCH_CHUNK_SIZE', 3):
+            response = self.client.post('/payment-amount/batch', json=rows)
+            self.assertEqual([json.loads(line) for line in response.text.splitlines()], expected)
+            body = ''.join(json.dumps(row) + '\n' for row in rows).encode()
+            # Lines split across the chunks of the request body, with the last one left unterminated
+            response = self.client.post('/payment-amount/batch', content=iter([body[:50], body[50:-1]]),
+                                        headers={'content-type': 'application/x-ndjson'})
+            self.assertEqual([json.loads(line) for line in response.text.splitlines()], expected)
+
+
+class TestPaymentSessions(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client()
+
+    def test_session(self):
+        response = self.client.post('/payment-sessions', params=QUOTE)
+        self.assertEqual(response.status_code, 201)
+        session = response.json()
+        self.assertEqual(session['payment_per_period'], 2072.61)
+        response = self.client.patch(f'/payment-sessions/{session["session_id"]}', params={'down_payment': '100000'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['payment_per_period'],
+                         self.client.get('/payment-amount', params={**QUOTE, 'down_payment': '100000'}).json()[
+                             'payment_per_period'])
+
+    def test_invalid_update(self):
+        session_id = self.client.post('/payment-sessions', params=QUOTE).json()['session_id']
+        response = self.client.patch(f'/payment-sessions/{session_id}', params={'amortization_period': '40'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/payment-sessions/{session_id}', params={'down_payment': '900000'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_session(self):
+        response = self.client.patch('/payment-sessions/missing', params={'down_payment': '100000'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_session_on_another_worker(self):
+        # Workers share nothing but the secret, like separate processes under uvicorn --workers
+        session_id = create_client(QUOTE_SESSION_SECRET='shared').post('/payment-sessions', params=QUOTE).json()[
+            'session_id']
+        client = create_client(QUOTE_SESSION_SECRET='shared')
+        response = client.patch(f'/payment-sessions/{session_id}', params={'amortization_period': '20'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['payment_per_period'],
+                         client.get('/payment-amount', params={**QUOTE, 'amortization_period': '20'}).json()[
+                             'payment_per_period'])
+        # Each change returns an id holding every input so far
+        session_id = response.json()['session_id']
+        api.quote_sessions.clear()
+        response = client.patch(f'/payment-sessions/{session_id}', params={'down_payment': '100000'})
+        self.assertEqual(response.json()['payment_per_period'],
+                         client.get('/payment-amount', params={**QUOTE, 'amortization_period': '20',
+                                                               'down_payment': '100000'}).json()['payment_per_period'])
+        # A worker with another secret cannot read it
+        client = create_client(QUOTE_SESSION_SECRET='other')
+        self.assertEqual(client.patch(f'/payment-sessions/{session_id}', params={'down_payment': '1'}).status_code,
+                         404)
+
+    def test_old_session_id(self):
+        session_id = self.client.post('/payment-sessions', params=QUOTE).json()['session_id']
+        self.client.patch(f'/payment-sessions/{session_id}', params={'down_payment': '100000'})
+        # The first id still holds the first inputs
+        response = self.client.patch(f'/payment-sessions/{session_id}', params={'amortization_period': '20'})
+        self.assertEqual(response.json()['payment_per_period'],
+                         self.client.get('/payment-amount', params={**QUOTE, 'amortization_period': '20'}).json()[
+                             'payment_per_period'])
+
+
+class TestAmortizationSchedule(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client()
+
+    def test_csv(self):
+        response = self.client.get('/amortization-schedule', params=QUOTE)
+        self.assertEqual(response.status_code, 200)
+        lines = response.text.splitlines()
+        self.assertEqual(lines[0], 'period,payment,interest,principal,balance,total_interest,total_principal')
+        self.assertEqual(len(lines), 12 * 25 + 1)
+
+    def test_ndjson_with_prepayments(self):
+        response = self.client.get('/amortization-schedule',
+                                   params={**QUOTE, 'format': 'ndjson', 'extra_payment': '500', 'lump_sum': '10000'})
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertLess(len(rows), 12 * 25)
+        self.assertEqual(rows[-1]['balance'], 0)
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get('/amortization-schedule', params={**QUOTE, 'format': 'xml'}).status_code, 400)
+        response = self.client.get('/amortization-schedule', params={**QUOTE, 'extra_payment': '-1'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_declined(self):
+        response = self.client.get('/amortization-schedule', params={**QUOTE, 'down_payment': '10000'})
+        self.assertEqual(response.json()['mortgage_status'], 'declined')
+
+
+class TestOffloadedSchedule(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client(EXECUTION_OFFLOAD_THRESHOLD='1', EXECUTION_MAX_PENDING='2')
+
+    def call_app(self, receive, send):
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                 'path': '/amortization-schedule', 'raw_path': b'/amortization-schedule', 'root_path': '',
+                 'headers': [], 'query_string': urlencode(QUOTE).encode(), 'server': ('test', 80),
+                 'client': ('test', 1)}
+        try:
+            asyncio.run(self.client.app(scope, receive, send))
+        except OSError:
+            pass
+
+    def test_streamed(self):
+        response = self.client.get('/amortization-schedule', params=QUOTE)
+        self.assertEqual(len(response.text.splitlines()), 12 * 25 + 1)
+        self.assertEqual((api.execution.offloaded, api.execution.pending), (1, 0))
+
+    def test_client_gone_before_streaming(self):
+        async def disconnect():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            pass
+
+        async def failing_send(message):
+            raise OSError('The client went away.')
+
+        for _ in range(5):
+            self.call_app(disconnect, send)
+            self.call_app(disconnect, failing_send)
+        self.assertEqual(api.execution.offloaded, 10)
+        self.assertEqual(api.execution.pending, 0)
+        self.assertEqual(self.client.get('/amortization-schedule', params=QUOTE).status_code, 200)
+
+
+class TestPaymentGrid(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client()
+
+    def test_grid(self):
+        response = self.client.get('/payment-grid', params={'asking_price': '500000', 'payment_schedule': 'monthly',
+                                                            'rate_min': '2', 'rate_max': '3', 'rate_step': '.5',
+                                                            'down_payment_percentages': '2,10',
+                                                            'amortization_periods': '20,25'})
+        self.assertEqual(response.status_code, 200)
+        grid = response.json()
+        self.assertEqual(grid['interest_rates'], [2., 2.5, 3.])
+        self.assertEqual(grid['rows'][0]['mortgage_status'], 'declined')
+        self.assertEqual(len(grid['rows'][1]['payments']), 3)
+        self.assertEqual(len(grid['rows'][1]['payments'][0]), 2)
+
+    def test_invalid_params(self):
+        params = {'asking_price': '500000', 'payment_schedule': 'monthly', 'rate_min': '3', 'rate_max': '2'}
+        response = self.client.get('/payment-grid', params={**params, 'down_payment': '50000'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/payment-grid', params={**params, 'rate_min': '2', 'rate_max': '3'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/payment-grid', params={**params, 'rate_min': '1', 'rate_max': '5',
+                                                            'rate_step': '0.00000001', 'down_payment': '50000'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.text, 'The grid cannot have more than 20000 payments.')
+        response = self.client.get('/payment-grid', params={**params, 'rate_max': '1e6', 'rate_step': '1e6',
+                                                            'down_payment': '50000'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestPrepaymentScenarios(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client()
+
+    def test_scenarios(self):
+        response = self.client.post('/prepayment-scenarios',
+                                    json={**QUOTE, 'strategies': [{'extra_payment': 500}, {'payment_increase': 5}]})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['baseline']['payments'], 12 * 25)
+        self.assertEqual(len(result['strategies']), 2)
+        self.assertTrue(all(strategy['interest_saved'] > 0 for strategy in result['strategies']))
+
+    def test_invalid_body(self):
+        self.assertEqual(self.client.post('/prepayment-scenarios', json=QUOTE).status_code, 400)
+        response = self.client.post('/prepayment-scenarios', json={**QUOTE, 'strategies': []})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/prepayment-scenarios', json={**QUOTE, 'strategies': [{'lump_sum': -1}]})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestMortgageAmount(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client()
+
+    def test_maximum(self):
+        response = self.client.get('/mortgage-amount', params={'payment': '2000', 'payment_schedule': 'monthly',
+                                                               'amortization_period': '25', 'down_payment': '100000'})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertGreater(result['maximum_asking_price'], result['maximum_mortgage'])
+
+    def test_invalid_params(self):
+        response = self.client.get('/mortgage-amount', params={'payment': '-1', 'payment_schedule': 'monthly',
+                                                               'amortization_period': '25'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_huge_amounts(self):
+        params = {'payment': '1e12', 'payment_schedule': 'monthly', 'amortization_period': '25'}
+        response = self.client.get('/mortgage-amount', params={**params, 'down_payment': '1e17'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/mortgage-amount', params={**params, 'payment': 'inf', 'down_payment': '1e12'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/mortgage-amount', params={**params, 'down_payment': '1e12'})
+        self.assertEqual(response.status_code, 200)
+
+
+class TestInterestRates(unittest.TestCase):
+    def setUp(self):
+        self.client = create_client(PRODUCT_RATES='variable=5')
+
+    def test_change_rates(self):
+        self.assertEqual(self.client.patch('/interest-rate', json={'interest_rate': 3}).status_code, 200)
+        response = self.client.patch('/interest-rate', json={'interest_rate': '4.5', 'product': 'Fixed'})
+        self.assertEqual(response.json()['product'], 'fixed')
+        rates = self.client.get('/interest-rates').json()
+        self.assertAlmostEqual(rates['interest_rate'], 3.)
+        self.assertEqual(set(rates['products']), {'variable', 'fixed'})
+        quote = self.client.get('/payment-amount', params={**QUOTE, 'product': 'fixed'}).json()
+        self.assertNotEqual(quote, self.client.get('/payment-amount', params=QUOTE).json())
+
+    def test_invalid_rate(self):
+        self.assertEqual(self.client.patch('/interest-rate', json={'interest_rate': 'abc'}).status_code, 400)
+        for interest_rate in [-1., 0, '0', 1e308, 'inf', 'nan', 101]:
+            response = self.client.patch('/interest-rate', json={'interest_rate': interest_rate})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.patch('/interest-rate', json={'interest_rate': interest_rate, 'product': 'variable'})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/interest-rates').json()['products'], {'variable': 5.})
+        self.assertEqual(self.client.get('/payment-amount', params=QUOTE).status_code, 200)
+        response = self.client.patch('/interest-rate', json={'interest_rate': 3, 'product': ''})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/payment-amount', params={**QUOTE, 'product': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestConfig(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.client = create_client(CONFIG_LOG_DIR=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_change_config(self):
+        response = self.client.patch('/config', json={'maximum_amortization_period': 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['maximum_amortization_period'], 30)
+        self.assertTrue(response.json()['persisted'])
+        self.assertEqual(self.client.get('/payment-amount', params={**QUOTE, 'amortization_period': '30'}).status_code,
+                         200)
+        # A restarted app loads the change from the log
+        client = create_client(CONFIG_LOG_DIR=self.directory.name)
+        self.assertEqual(client.get('/config').json()['maximum_amortization_period'], 30)
+
+    def test_period_errors_follow_config(self):
+        self.client.patch('/config', json={'minimum_amortization_period': 10, 'maximum_amortization_period': 30})
+        response = self.client.get('/payment-amount', params={**QUOTE, 'amortization_period': '5'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('between 10 and 30', response.text)
+        response = self.client.get('/payment-grid', params={'asking_price': '500000', 'payment_schedule': 'monthly',
+                                                            'rate_min': '3', 'rate_max': '4', 'down_payment': '50000',
+                                                            'amortization_periods': '5,10'})
+        self.assertIn('between 10 and 30', response.text)
+
+    def test_invalid_config(self):
+        for change in [[], {'interest_rate': .05}, {'minimum_amortization_period': 40}, {'insurable_limit': 'many'},
+                       {'insurance_tiers': [{'min': .05, 'max': .0999, 'rate': .02},
+                                            {'min': .15, 'max': 1, 'rate': 0}]},
+                       {'insurance_tiers': [{'min': .05, 'max': .2, 'rate': .02},
+                                            {'min': .15, 'max': 1, 'rate': 0}]},
+                       {'insurance_tiers': [{'min': '0.05', 'max': '1', 'rate': '0'}]},
+                       {'insurance_tiers': [{'min': .05, 'max': 1, 'rate': -5}]},
+                       {'insurable_limit': None}, {'insurance_tiers': [{'min': .2, 'max': .5, 'rate': 0}]}]:
+            self.assertEqual(self.client.patch('/config', json=change).status_code, 400)
+        self.assertEqual(self.client.get('/config').json()['maximum_amortization_period'], 25)
+        self.assertEqual(self.client.get('/payment-amount', params=QUOTE).json(), {'payment_per_period': 2072.61})
+        # Nothing was logged, so a restarted app still has the defaults
+        client = create_client(CONFIG_LOG_DIR=self.directory.name)
+        self.assertEqual(client.get('/config').json()['insurance_tiers'], self.client.get('/config').json()[
+            'insurance_tiers'])
+        self.assertEqual(client.get('/payment-amount', params=QUOTE).json(), {'payment_per_period': 2072.61})
+
+    def test_change_invalid_with_another_workers_change(self):
+        # Another worker raises the minimum period, which this worker has not reloaded yet
+        other = api.ConfigLog(self.directory.name, api.calc.config())
+        other.append({'minimum_amortization_period': 20})
+        other.close()
+        size = os.path.getsize(api.config_log.log_path)
+        self.assertEqual(self.client.patch('/config', json={'maximum_amortization_period': 10}).status_code, 400)
+        self.assertEqual(os.path.getsize(api.config_log.log_path), size)
+        client = create_client(CONFIG_LOG_DIR=self.directory.name)
+        self.assertEqual(client.get('/config').json()['minimum_amortization_period'], 20)
+
+    def test_reload_without_changes(self):
+        with open(api.config_log.log_path, 'ab') as file:
+            file.write(b'\x20\x00\x00\x00partial')
+        calculator = api.calc
+        api.reload_config()
+        self.assertIs(api.calc, calculator)
+        other = api.ConfigLog(self.directory.name, api.calc.config())
+        other.append({'insurable_limit': 1500000})
+        other.close()
+        api.reload_config()
+        self.assertEqual(api.calc.insurable_limit, 1500000)
+
+
+class TestQuoteCacheStats(unittest.TestCase):
+    def test_disabled(self):
+        self.assertEqual(create_client().get('/quote-cache').json(), {'enabled': False})
+
+    def test_enabled(self):
+        client = create_client(QUOTE_CACHE_SIZE='10')
+        client.get('/payment-amount', params=QUOTE)
+        client.get('/payment-amount', params=QUOTE)
+        stats = client.get('/quote-cache').json()
+        self.assertEqual((stats['enabled'], stats['hits'], stats['misses']), (True, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
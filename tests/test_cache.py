@@ -0,0 +1,61 @@
+from app.cache import *
+from app.calculator import MortgageCalculator
+import unittest
+
+class TestQuoteCache(unittest.TestCase):
+    def test_hit_and_miss(self):
+        cache = QuoteCache(2)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_least_recently_used_evicted(self):
+        cache = QuoteCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_expired_entry(self):
+        cache = QuoteCache(2, ttl=0)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, QuoteCache, 0)
+
+
+class TestCachedCalculator(unittest.TestCase):
+    def test_cached_quote(self):
+        calc = MortgageCalculator(quote_cache=QuoteCache(10))
+        first = calc.payment_per_period(500000., 50000., 'monthly', 25)
+        second = calc.payment_per_period(500000., 50000., 'monthly', 25)
+        self.assertIs(first, second)
+        self.assertEqual(calc.maximum(2000., 'monthly', 25), calc.calculate_maximum(2000., 'monthly', 25))
+
+    def test_rate_change_invalidates(self):
+        calc = MortgageCalculator(quote_cache=QuoteCache(10))
+        first = calc.payment_per_period(500000., 50000., 'monthly', 25)
+        calc.interest_rate = .05
+        second = calc.payment_per_period(500000., 50000., 'monthly', 25)
+        self.assertGreater(second.payment_per_period, first.payment_per_period)
+
+    def test_quotes_are_cached_per_product(self):
+        calc = MortgageCalculator(quote_cache=QuoteCache(10))
+        calc.set_product_rates({'fixed': .05})
+        default = calc.payment_per_period(500000., 50000., 'monthly', 25)
+        fixed = calc.payment_per_period(500000., 50000., 'monthly', 25, 'fixed')
+        self.assertGreater(fixed.payment_per_period, default.payment_per_period)
+        calc.set_product_rate('fixed', .06)
+        self.assertGreater(calc.payment_per_period(500000., 50000., 'monthly', 25, 'fixed').payment_per_period,
+                           fixed.payment_per_period)
+
+
+if __name__ == '__main__':
+    unittest.main()
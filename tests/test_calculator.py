@@ -1,4 +1,6 @@
 from app.calculator import *
+from unittest import mock
+import random
 import unittest
 
 class TestDownPaymentPercentage(unittest.TestCase):
@@ -89,5 +91,447 @@ class TestCalculateInsuranceCost(unittest.TestCase):
         self.assertRaises(ValueError, calculate_insurance_cost, insurance_tiers, asking_price, down_payment)
 
 
+class TestMortgageResults(unittest.TestCase):
+    def test_approved_attributes(self):
+        mortgage = ApprovedMortgage(100., 1000.)
+        self.assertEqual((mortgage.status, mortgage.status_code), ('approved', APPROVED))
+        self.assertEqual(mortgage.status_text, 'The mortgage was approved.')
+        self.assertEqual((mortgage.payment_per_period, mortgage.principal), (100., 1000.))
+        self.assertFalse(hasattr(mortgage, '__dict__'))
+
+    def test_declined_text_is_lazy(self):
+        mortgage = DeclinedMortgage(status_code=DECLINED_MINIMUM_DOWN_PAYMENT, asking_price=500000.)
+        self.assertIsNone(mortgage.text)
+        self.assertEqual(mortgage.status_text, 'The minimum down payment for an asking price of $500000.0 is $25000.0.')
+        self.assertEqual(mortgage.status, 'declined')
+
+    def test_declined_with_text(self):
+        mortgage = DeclinedMortgage('No.')
+        self.assertEqual(mortgage.status_text, 'No.')
+        self.assertEqual(DeclinedMortgage().status_text, 'You cannot create a mortgage with the given parameters.')
+
+
+class TestMoney(unittest.TestCase):
+    def test_rounds_to_nearest_cent(self):
+        self.assertEqual((Money(0.29).dollars, Money(0.29).cents), (0, 29))
+        self.assertEqual((Money(1.999).dollars, Money(1.999).cents), (2, 0))
+        self.assertEqual(Money(1.005).total_cents, 101)
+
+    def test_negative_amount(self):
+        self.assertEqual((Money(-1.5).dollars, Money(-1.5).cents), (-1, -50))
+
+
+class TestInsuranceTiers(unittest.TestCase):
+    def setUp(self):
+        self.tiers = InsuranceTiers([
+            {'min': .15, 'max': .1999, 'rate': .018},
+            {'min': .05, 'max': .0999, 'rate': .0315},
+            {'min': .2, 'max': 1.00, 'rate': 0},
+            {'min': .1, 'max': .1499, 'rate': .024}
+        ])
+
+    def test_lookup(self):
+        self.assertEqual(self.tiers.rate(.05), .0315)
+        self.assertEqual(self.tiers.rate(.1), .024)
+        self.assertEqual(self.tiers.rate(.1999), .018)
+        self.assertEqual(self.tiers.rate(1.), 0)
+
+    def test_no_gaps_between_tiers(self):
+        self.assertEqual(self.tiers.rate(.09995), .0315)
+        self.assertEqual(self.tiers.rate(.14999), .024)
+
+    def test_outside_tiers(self):
+        self.assertRaises(ValueError, self.tiers.rate, .0499)
+        self.assertRaises(ValueError, self.tiers.rate, 1.01)
+
+    def test_rates_for(self):
+        pcts = [.2, .05, .09995, .15, .5, .1, 1.]
+        self.assertEqual(self.tiers.rates_for(pcts), [self.tiers.rate(pct) for pct in pcts])
+        self.assertEqual(self.tiers.rates_for([]), [])
+        self.assertRaises(ValueError, self.tiers.rates_for, [.2, .01])
+        self.assertRaises(ValueError, self.tiers.rates_for, [.2, 1.01])
+
+    def test_many_tiers(self):
+        tiers = InsuranceTiers([{'min': i / 1000, 'max': (i + 1) / 1000 - .0001 if i < 999 else 1., 'rate': i / 1000}
+                                for i in range(1000)])
+        self.assertEqual(tiers.rate(.5), .5)
+        self.assertEqual(tiers.rate(.5005), .5)
+
+    def test_overlapping_tiers(self):
+        self.assertRaises(ValueError, InsuranceTiers, [{'min': .05, 'max': .1, 'rate': .01},
+                                                       {'min': .05, 'max': .2, 'rate': .02}])
+        self.assertRaises(ValueError, InsuranceTiers, [{'min': .05, 'max': .1, 'rate': .01},
+                                                       {'min': .1, 'max': .2, 'rate': .02}])
+        self.assertRaises(ValueError, InsuranceTiers, [])
+
+    def test_gap_between_tiers(self):
+        with self.assertRaises(ValueError):
+            InsuranceTiers([{'min': .05, 'max': .0999, 'rate': .02}, {'min': .15, 'max': .1999, 'rate': .01}])
+        with self.assertRaises(ValueError):
+            InsuranceTiers([{'min': .05, 'max': .0998, 'rate': .02}, {'min': .1, 'max': 1., 'rate': .01}])
+
+    def test_configured_tiers(self):
+        calc = MortgageCalculator(insurance_tiers=[{'min': .05, 'max': 1., 'rate': .01}])
+        mortgage = calc.payment_per_period(100000., 50000., 'monthly', 25)
+        self.assertEqual(mortgage.principal, 51000.)
+
+
+class TestPaymentPerPeriodBatch(unittest.TestCase):
+    def test_matches_scalar(self):
+        calc = MortgageCalculator()
+        asking_prices = [100000., 500000., 750000., 1200000., 1500000., 320000.]
+        down_payments = [5000., 50000., 40000., 240000., 100000., 31999.99]
+        schedules = ['weekly', 'biweekly', 'monthly', 'monthly', 'weekly', 'biweekly']
+        periods = [5, 25, 20, 10, 25, 15]
+        payments, statuses = calc.payment_per_period_batch(asking_prices, down_payments, schedules, periods)
+        for i in range(len(asking_prices)):
+            mortgage = calc.payment_per_period(asking_prices[i], down_payments[i], schedules[i], periods[i])
+            if mortgage.status == 'approved':
+                self.assertEqual(statuses[i], APPROVED)
+                self.assertEqual(payments[i], mortgage.payment_per_period)
+            else:
+                self.assertNotEqual(statuses[i], APPROVED)
+                self.assertIsNone(payments[i])
+                self.assertEqual(calc.decline_reason(statuses[i], asking_prices[i]), mortgage.status_text)
+
+    def test_decline_codes(self):
+        calc = MortgageCalculator()
+        payments, statuses = calc.payment_per_period_batch([750000., 1500000.], [40000., 150000.],
+                                                           ['monthly', 'monthly'], [25, 25])
+        self.assertEqual(statuses, [DECLINED_MINIMUM_DOWN_PAYMENT, DECLINED_INSURABLE_LIMIT])
+        self.assertEqual(payments, [None, None])
+
+    def test_mismatched_columns(self):
+        calc = MortgageCalculator()
+        self.assertRaises(ValueError, calc.payment_per_period_batch, [1.], [], ['weekly'], [5])
+
+
+class TestPaymentFactors(unittest.TestCase):
+    def test_factor_matches_formula(self):
+        calc = MortgageCalculator()
+        principal = 475000.
+        expected = calculate_payment(principal, calc.interest_rate, 26, 26 * 25)
+        self.assertEqual(principal * calc.payment_factor('biweekly', 25), expected)
+
+    def test_rate_change_rebuilds_factors(self):
+        calc = MortgageCalculator()
+        before = calc.payment_per_period(500000., 100000., 'monthly', 20).payment_per_period
+        calc.interest_rate = .05
+        after = calc.payment_per_period(500000., 100000., 'monthly', 20).payment_per_period
+        self.assertEqual(after, round(calculate_payment(400000., .05, 12, 240), 2))
+        self.assertGreater(after, before)
+
+    def test_factor_outside_table(self):
+        calc = MortgageCalculator()
+        self.assertEqual(calc.payment_factor('monthly', 30), annuity_factor(calc.interest_rate, 12, 360))
+
+
+class TestAmortizationSchedule(unittest.TestCase):
+    def test_schedule_pays_off_principal(self):
+        rows = list(amortization_schedule(100000., .025, 12, 60))
+        self.assertEqual(len(rows), 60)
+        self.assertEqual(rows[0][1], round(calculate_payment(100000., .025, 12, 60), 2))
+        self.assertEqual(rows[-1][4], 0.)
+        self.assertEqual(rows[-1][6], 100000.)
+        self.assertEqual(rows[-1][5], round(sum(row[2] for row in rows), 2))
+
+    def test_schedule_is_lazy(self):
+        rows = amortization_schedule(100000., .025, 52, 1300)
+        self.assertEqual(next(rows)[0], 1)
+
+    def test_declined_mortgage(self):
+        calc = MortgageCalculator()
+        mortgage, rows = calc.amortization_schedule(750000., 40000., 'monthly', 25)
+        self.assertEqual(mortgage.status, 'declined')
+        self.assertIsNone(rows)
+
+    def test_insurance_included_in_balance(self):
+        calc = MortgageCalculator()
+        mortgage, rows = calc.amortization_schedule(100000., 10000., 'monthly', 10)
+        self.assertEqual(mortgage.principal, 92400.)
+        self.assertEqual(next(rows)[4], round(92400. - next(iter(amortization_schedule(92400., .025, 12, 120)))[3], 2))
+
+    def test_closed_form_matches_balances(self):
+        principals = [100000., 250000.]
+        periods = list(closed_form_schedules(principals, .025, 12, 60))
+        self.assertEqual(len(periods), 60)
+        for balance in periods[-1][4]:
+            self.assertAlmostEqual(balance, 0., places=6)
+        for principal, payment in zip(principals, periods[0][1]):
+            self.assertAlmostEqual(payment, calculate_payment(principal, .025, 12, 60))
+        for principal, total in zip(principals, periods[-1][6]):
+            self.assertAlmostEqual(total, principal, places=6)
+
+
+class TestProductRates(unittest.TestCase):
+    def setUp(self):
+        self.calc = MortgageCalculator()
+        self.calc.set_product_rates({'fixed': .0479, 'variable': .052})
+
+    def test_product_quote_uses_its_rate(self):
+        reference = MortgageCalculator()
+        reference.interest_rate = .0479
+        self.assertEqual(self.calc.payment_per_period(500000., 50000., 'monthly', 25, 'fixed').payment_per_period,
+                         reference.payment_per_period(500000., 50000., 'monthly', 25).payment_per_period)
+        self.assertEqual(self.calc.maximum(2000., 'weekly', 10, 'fixed'), reference.maximum(2000., 'weekly', 10))
+        # Quotes without a product still use the default rate
+        self.assertEqual(self.calc.payment_per_period(500000., 50000., 'monthly', 25).payment_per_period,
+                         MortgageCalculator().payment_per_period(500000., 50000., 'monthly', 25).payment_per_period)
+
+    def test_unknown_product(self):
+        self.assertFalse(self.calc.has_product('other'))
+        with self.assertRaises(ValueError):
+            self.calc.payment_per_period(500000., 50000., 'monthly', 25, 'other')
+
+    def test_update_swaps_the_table(self):
+        fixed_factors = self.calc.rate_state('fixed')[1]
+        self.calc.set_product_rate('variable', .06)
+        self.assertEqual(self.calc.product_table(), (2, {'fixed': .0479, 'variable': .06}))
+        # Factors of unchanged products are reused rather than rebuilt
+        self.assertIs(self.calc.rate_state('fixed')[1], fixed_factors)
+        self.assertEqual(self.calc.rate_state('variable')[2], 2)
+
+    def test_invalid_rates(self):
+        for interest_rate in [0, -.01, 1e308, float('inf'), float('nan'), '.05']:
+            with self.assertRaises(ValueError):
+                self.calc.interest_rate = interest_rate
+            with self.assertRaises(ValueError):
+                self.calc.set_product_rate('fixed', interest_rate)
+        self.assertEqual(self.calc.interest_rate, .025)
+        self.assertEqual(self.calc.product_table(), (1, {'fixed': .0479, 'variable': .052}))
+
+    def test_batch(self):
+        payments, statuses = self.calc.payment_per_period_batch([500000., 400000.], [50000., 80000.],
+                                                                ['monthly', 'weekly'], [25, 20], 'variable')
+        self.assertEqual(payments, [self.calc.payment_per_period(500000., 50000., 'monthly', 25,
+                                                                 'variable').payment_per_period,
+                                    self.calc.payment_per_period(400000., 80000., 'weekly', 20,
+                                                                 'variable').payment_per_period])
+
+
+class TestApplyConfig(unittest.TestCase):
+    def test_round_trip(self):
+        calc = MortgageCalculator()
+        calc.set_product_rates({'fixed': .05})
+        other = MortgageCalculator()
+        other.apply_config(calc.config())
+        self.assertEqual(other.config(), calc.config())
+
+    def test_derived_state_is_rebuilt(self):
+        calc = MortgageCalculator()
+        config = calc.config()
+        config.update(maximum_amortization_period=30, insurable_limit=2000000,
+                      insurance_tiers=[{'min': .05, 'max': 1., 'rate': .01}], product_rates={'fixed': .05})
+        calc.apply_config(config)
+        self.assertIn(('monthly', 30), calc.rate_state()[1])
+        self.assertIn(('monthly', 30), calc.rate_state('fixed')[1])
+        self.assertEqual(calc.insurance_tiers.rate(.5), .01)
+        self.assertEqual(calc.payment_per_period(1500000., 150000., 'monthly', 30).status, 'approved')
+
+    def test_invalid_config(self):
+        calc = MortgageCalculator()
+        for change in [{'minimum_amortization_period': 30}, {'insurable_limit': 'many'},
+                       {'insurance_tiers': [{'min': .05}]}, {'interest_rate': 0},
+                       {'interest_rate': float('inf')}, {'product_rates': {'fixed': float('nan')}},
+                       {'product_rates': {'fixed': 1e308}}, {'product_rates': ['fixed']},
+                       {'insurable_limit': float('nan')}, {'insurable_limit': True},
+                       {'insurance_tiers': [{'min': '0.05', 'max': '1', 'rate': '0'}]},
+                       {'insurance_tiers': [{'min': .05, 'max': 1, 'rate': -5}]},
+                       {'insurance_tiers': [{'min': .05, 'max': 1, 'rate': float('inf')}]},
+                       {'insurance_tiers': [{'min': .5, 'max': .2, 'rate': 0}]},
+                       {'insurance_tiers': [{'min': -.1, 'max': 1.5, 'rate': 0}]},
+                       {'insurance_tiers': [[.05, 1, 0]]}, {'insurance_tiers': 5},
+                       {'insurance_tiers': [{'min': .2, 'max': .5, 'rate': 0}]},
+                       {'insurance_tiers': [{'min': .1, 'max': 1, 'rate': 0}]},
+                       {'insurance_tiers': [{'min': .05, 'max': .9, 'rate': 0}]}]:
+            config = calc.config()
+            config.update(change)
+            with self.assertRaises(ValueError):
+                calc.apply_config(config)
+        self.assertEqual(calc.config(), MortgageCalculator().config())
+
+
+class TestQuoteSession(unittest.TestCase):
+    def setUp(self):
+        self.calc = MortgageCalculator()
+        self.calc.set_product_rates({'fixed': .05})
+        self.session = self.calc.quote_session(500000., 50000., 'monthly', 25)
+
+    def assertQuote(self, mortgage, *inputs):
+        expected = self.calc.calculate_payment_per_period(*inputs)
+        self.assertEqual(mortgage.status_text, expected.status_text)
+        if expected.status == 'approved':
+            self.assertEqual(mortgage.payment_per_period, expected.payment_per_period)
+            self.assertEqual(mortgage.principal, expected.principal)
+
+    def test_updates_match_full_quotes(self):
+        self.assertQuote(self.session.quote(), 500000., 50000., 'monthly', 25)
+        self.assertQuote(self.session.update(down_payment=100000.), 500000., 100000., 'monthly', 25)
+        self.assertQuote(self.session.update(amortization_period=20), 500000., 100000., 'monthly', 20)
+        self.assertQuote(self.session.update(payment_schedule='weekly', product='fixed'),
+                         500000., 100000., 'weekly', 20, 'fixed')
+        self.assertQuote(self.session.update(asking_price=1200000.), 1200000., 100000., 'weekly', 20, 'fixed')
+        self.assertQuote(self.session.update(asking_price=700000., down_payment=70000., product=None),
+                         700000., 70000., 'weekly', 20)
+        self.assertEqual(self.session.state(), {'minimum_down_payment': 45000., 'down_payment_percentage': .1,
+                                                'principal': 646800.})
+
+    def test_only_affected_state_is_recalculated(self):
+        self.session.quote()
+        factor = self.session.factor
+        self.session.update(down_payment=60000.)
+        self.assertIs(self.session.factor, factor)
+        minimum = self.session.minimum_down_payment
+        self.session.update(amortization_period=20)
+        self.assertIsNot(self.session.factor, factor)
+        self.assertIs(self.session.minimum_down_payment, minimum)
+        # An unchanged quote is the same object
+        self.assertIs(self.session.update(amortization_period=20), self.session.quote())
+
+    def test_rate_change(self):
+        self.session.quote()
+        self.calc.interest_rate = .04
+        self.assertQuote(self.session.quote(), 500000., 50000., 'monthly', 25)
+
+    def test_bind(self):
+        other = MortgageCalculator(insurance_tiers=[{'min': .05, 'max': 1., 'rate': 0}])
+        self.session.bind(other)
+        self.assertEqual(self.session.quote().principal, 450000.)
+
+    def test_unknown_product(self):
+        with self.assertRaises(ValueError):
+            self.session.update(product='variable')
+        self.assertIsNone(self.session.product)
+
+
+class TestPrepayments(unittest.TestCase):
+    def setUp(self):
+        self.args = (462000., .025, 12, 300, 2072.61)
+
+    def test_without_prepayments(self):
+        self.assertEqual(list(prepayment_schedule(*self.args)), list(amortization_schedule(*self.args)))
+
+    def test_summary_matches_schedule(self):
+        for prepayments in [(), (200.,), (0., 10000.), (0., 0., .05), (150.25, 7500., .02), (0., 500000.)]:
+            rows = list(prepayment_schedule(*self.args, *prepayments))
+            self.assertEqual(rows[-1][4], 0.)
+            self.assertEqual(prepayment_summary(*self.args, *prepayments), (rows[-1][0], rows[-1][5]))
+
+    def test_lump_sum(self):
+        rows = list(prepayment_schedule(*self.args, 0., 10000.))
+        self.assertEqual(rows[11][1], round(2072.61 + 10000., 2))
+        self.assertEqual(rows[10][1], 2072.61)
+
+    def test_payment_increase(self):
+        rows = list(prepayment_schedule(*self.args, 0., 0., .1))
+        self.assertEqual(rows[11][1], 2072.61)
+        self.assertEqual(rows[12][1], round(2072.61 * 1.1, 2))
+
+    def test_scenarios(self):
+        calc = MortgageCalculator()
+        mortgage, baseline, results = calc.prepayment_scenarios(500000., 50000., 'monthly', 25, [0., 200., 200.],
+                                                                [0., 0., 0.], [0., 0., 0.])
+        self.assertEqual(mortgage.payment_per_period, 2072.61)
+        self.assertEqual(baseline, results[0])
+        self.assertEqual(baseline, (300, list(amortization_schedule(*self.args))[-1][5]))
+        self.assertLess(results[1][0], 300)
+        self.assertLess(results[1][1], baseline[1])
+        self.assertEqual(results[1], results[2])
+        self.assertEqual(calc.prepayment_scenarios(500000., 10000., 'monthly', 25, [0.], [0.], [0.])[1:], (None, None))
+
+
+class TestMaximum(unittest.TestCase):
+    def test_inverse_of_payment(self):
+        calc = MortgageCalculator()
+        principal = calc.maximum(2000., 'monthly', 25)
+        self.assertAlmostEqual(calculate_payment(principal, calc.interest_rate, 12, 300), 2000.)
+
+    def test_batch_matches_scalar(self):
+        calc = MortgageCalculator()
+        result = calc.maximum_batch([2000., 500.], ['monthly', 'weekly'], [25, 10])
+        self.assertEqual(result, [calc.maximum(2000., 'monthly', 25), calc.maximum(500., 'weekly', 10)])
+
+    def test_maximum_asking_price_is_approved(self):
+        calc = MortgageCalculator()
+        for payment, down_payment in [(2000., 50000.), (1500., 30000.), (20000., 500000.), (5000., 100000.)]:
+            asking_price = calc.maximum_asking_price(payment, down_payment, 'monthly', 25)
+            mortgage = calc.payment_per_period(asking_price, down_payment, 'monthly', 25)
+            self.assertEqual(mortgage.status, 'approved')
+            self.assertLessEqual(mortgage.payment_per_period, payment)
+
+    def test_maximum_asking_price_limits(self):
+        calc = MortgageCalculator()
+        # Limited by the minimum down payment
+        self.assertEqual(calc.maximum_asking_price(2000., 10000., 'monthly', 25), 200000.)
+        # Limited by the insurable limit
+        self.assertEqual(calc.maximum_asking_price(20000., 100000., 'monthly', 25), 1100000.)
+        # Limited by the 20% down payment required above the insurable limit. Down payment percentages are rounded to
+        # TIER_PRECISION, so 19.995% still counts as 20%.
+        self.assertEqual(calc.maximum_asking_price(20000., 500000., 'monthly', 25), 2500625.15)
+        self.assertEqual(calc.maximum_asking_price(2000., 0., 'monthly', 25), 0.)
+
+    def test_maximum_asking_price_batch(self):
+        calc = MortgageCalculator()
+        result = calc.maximum_asking_price_batch([2000., 1500.], [50000., 30000.], ['monthly', 'monthly'], [25, 25])
+        self.assertEqual(result, [calc.maximum_asking_price(2000., 50000., 'monthly', 25),
+                                  calc.maximum_asking_price(1500., 30000., 'monthly', 25)])
+
+    def assertHighestAskingPrice(self, calc, asking_price, *args):
+        self.assertTrue(calc.affordable(asking_price, *args))
+        self.assertFalse(calc.affordable(round(asking_price + .01, 2), *args))
+
+    def test_maximum_asking_price_to_the_cent(self):
+        # A payment that rounds down to the given one is approved, so the answer can be above the present value
+        calc = MortgageCalculator()
+        self.assertEqual(calc.maximum_asking_price(2773.85, 508460.24, 'weekly', 13), 2109045.93)
+        rng = random.Random(5)
+        for _ in range(300):
+            args = (round(rng.uniform(100, 20000), 2), round(rng.uniform(0, 600000), 2),
+                    rng.choice(['weekly', 'biweekly', 'monthly']), rng.randint(5, 25))
+            self.assertHighestAskingPrice(calc, calc.maximum_asking_price(*args), *args)
+
+    def test_maximum_asking_price_far_from_solution(self):
+        # Estimates on the wrong side of the answer are moved out before the bisection, which then finds the same answer
+        calc = MortgageCalculator()
+        expected = calc.maximum_asking_price(2000., 50000., 'monthly', 25)
+        for estimate in (expected * 10, expected / 2, 60000.):
+            with mock.patch('app.calculator.solve_asking_price', return_value=estimate):
+                self.assertEqual(calc.maximum_asking_price(2000., 50000., 'monthly', 25), expected)
+        self.assertHighestAskingPrice(calc, expected, 2000., 50000., 'monthly', 25)
+
+    def test_maximum_asking_price_of_huge_amounts(self):
+        # Above about 1e15 a cent no longer changes the float, which the search must not depend on
+        calc = MortgageCalculator()
+        for payment, down_payment in [(1e12, 1e17), (1e12, 1e12)]:
+            asking_price = calc.maximum_asking_price(payment, down_payment, 'monthly', 25)
+            self.assertTrue(calc.affordable(asking_price, payment, down_payment, 'monthly', 25))
+
+
+class TestPaymentGrid(unittest.TestCase):
+    def test_matches_scalar(self):
+        calc = MortgageCalculator()
+        rates = [.02, .025, .05]
+        periods = [5, 25]
+        statuses, grids = calc.payment_grid(500000., [50000., 100000.], 'biweekly', rates, periods)
+        self.assertEqual(statuses, [APPROVED, APPROVED])
+        for down_payment, grid in zip([50000., 100000.], grids):
+            for rate, row in zip(rates, grid):
+                calc.interest_rate = rate
+                expected = [calc.payment_per_period(500000., down_payment, 'biweekly', period).payment_per_period
+                            for period in periods]
+                self.assertEqual(row, expected)
+
+    def test_declined_down_payment(self):
+        calc = MortgageCalculator()
+        statuses, grids = calc.payment_grid(500000., [20000.], 'monthly', [.025], [25])
+        self.assertEqual(statuses, [DECLINED_MINIMUM_DOWN_PAYMENT])
+        self.assertEqual(grids, [None])
+
+    def test_rate_unchanged(self):
+        calc = MortgageCalculator()
+        calc.payment_grid(500000., [50000.], 'monthly', [.05], [25])
+        self.assertEqual(calc.interest_rate, .025)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,62 @@
+from app.columnar import *
+from app.calculator import *
+from app.fixed_point import FixedPointCalculator
+import math
+import os
+import tempfile
+import unittest
+
+class TestColumnarJob(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.asking_prices = [500000., 750000., 1500000., 100000., 100000.]
+        self.down_payments = [50000., 40000., 150000., 5000., 5000.]
+        self.schedules = [2, 2, 0, 1, 9]
+        self.periods = [25, 25, 20, 5, 5]
+        write_column(column_path(self.directory, 'asking_price'), 'd', self.asking_prices)
+        write_column(column_path(self.directory, 'down_payment'), 'd', self.down_payments)
+        write_column(column_path(self.directory, 'payment_schedule'), 'B', self.schedules)
+        write_column(column_path(self.directory, 'amortization_period'), 'H', self.periods)
+
+    def test_matches_batch(self):
+        calc = MortgageCalculator()
+        codes = calc.payment_schedule_codes()
+        payments, statuses = calc.payment_per_period_batch(self.asking_prices[:4], self.down_payments[:4],
+                                                           [codes[code] for code in self.schedules[:4]],
+                                                           self.periods[:4])
+        with run_columnar_job(calc, self.directory) as result:
+            self.assertEqual(list(result.statuses.values[:4]), statuses)
+            self.assertEqual(list(result.payments.values[:4]), [payment or 0. for payment in payments])
+            self.assertEqual(result.statuses.values[4], INVALID_INPUT)
+
+    def test_lazy_reasons(self):
+        calc = MortgageCalculator()
+        with run_columnar_job(calc, self.directory) as result:
+            self.assertEqual(result.reason(1), calc.payment_per_period(750000., 40000., 'monthly', 25).status_text)
+            self.assertEqual(result.reason(0), '')
+
+    def test_output_written_to_files(self):
+        calc = MortgageCalculator()
+        run_columnar_job(calc, self.directory).close()
+        with MappedColumn(column_path(self.directory, 'status'), 'B') as statuses:
+            self.assertEqual(len(statuses), 5)
+            self.assertEqual(statuses.values[0], APPROVED)
+
+    def test_out_of_range_amounts(self):
+        write_column(column_path(self.directory, 'asking_price'), 'd', [math.inf, 1e13, math.nan, .001, 100000.])
+        write_column(column_path(self.directory, 'down_payment'), 'd', [1., 1., 1., 0., math.inf])
+        for calc in (MortgageCalculator(), FixedPointCalculator()):
+            with run_columnar_job(calc, self.directory) as result:
+                self.assertEqual(list(result.statuses.values), [INVALID_INPUT] * 5)
+                self.assertEqual(list(result.payments.values), [0.] * 5)
+
+    def test_columns_closed_on_error(self):
+        write_column(column_path(self.directory, 'down_payment'), 'd', self.down_payments[:4])
+        open_files = len(os.listdir('/proc/self/fd'))
+        with self.assertRaises(ValueError):
+            run_columnar_job(MortgageCalculator(), self.directory)
+        self.assertEqual(len(os.listdir('/proc/self/fd')), open_files)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+from app.config_log import *
+import os
+import tempfile
+import unittest
+
+DEFAULTS = {'interest_rate': .025, 'product_rates': {}, 'insurable_limit': 1000000}
+
+
+class TestConfigLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_defaults(self):
+        log = ConfigLog(self.path, DEFAULTS)
+        self.assertEqual(log.config, DEFAULTS)
+        self.assertFalse(log.changed())
+
+    def test_changes_are_durable(self):
+        writer = ConfigLog(self.path, DEFAULTS)
+        writer.append({'interest_rate': .04})
+        writer.append({'product_rates': {'fixed': .05}})
+        writer.append({'product_rates': {'variable': .06}})
+        reader = ConfigLog(self.path, DEFAULTS)
+        self.assertEqual(reader.config, {'interest_rate': .04, 'product_rates': {'fixed': .05, 'variable': .06},
+                                         'insurable_limit': 1000000})
+
+    def test_read_tail(self):
+        reader = ConfigLog(self.path, DEFAULTS)
+        writer = ConfigLog(self.path, DEFAULTS)
+        writer.append({'insurable_limit': 1500000})
+        self.assertTrue(reader.changed())
+        self.assertEqual(reader.read_tail(), 1)
+        self.assertEqual(reader.config['insurable_limit'], 1500000)
+        self.assertFalse(reader.changed())
+
+    def test_torn_record_is_not_a_change(self):
+        reader = ConfigLog(self.path, DEFAULTS)
+        with open(reader.log_path, 'ab') as file:
+            file.write(b'\x20\x00\x00\x00partial')
+        self.assertTrue(reader.changed())
+        self.assertEqual(reader.read_tail(), 0)
+        self.assertFalse(reader.changed())
+        ConfigLog(self.path, DEFAULTS).append({'insurable_limit': 1500000})
+        self.assertTrue(reader.changed())
+        self.assertEqual(reader.read_tail(), 1)
+
+    def test_unknown_setting(self):
+        log = ConfigLog(self.path, DEFAULTS)
+        with self.assertRaises(ValueError):
+            log.append({'colour': 'blue'})
+        with self.assertRaises(ValueError):
+            log.append({'product_rates': ['fixed']})
+        self.assertEqual(os.path.getsize(log.log_path), 0)
+
+    def test_validate_after_other_writers(self):
+        log = ConfigLog(self.path, DEFAULTS)
+        ConfigLog(self.path, DEFAULTS).append({'insurable_limit': 2000000})
+        configs = []
+        self.assertEqual(log.append({'interest_rate': .03}, lambda config: configs.append(config) or 'valid'), 'valid')
+        self.assertEqual(configs, [{'interest_rate': .03, 'product_rates': {}, 'insurable_limit': 2000000}])
+
+    def test_rejected_change_is_not_written(self):
+        log = ConfigLog(self.path, DEFAULTS)
+        size = os.path.getsize(log.log_path)
+
+        def reject(config):
+            raise ValueError('The change is not valid.')
+
+        with self.assertRaises(ValueError):
+            log.append({'interest_rate': .03}, reject)
+        self.assertEqual(os.path.getsize(log.log_path), size)
+        self.assertEqual(log.config, DEFAULTS)
+
+    def test_snapshot(self):
+        writer = ConfigLog(self.path, DEFAULTS, snapshot_interval=2)
+        for rate in (.03, .035, .04):
+            writer.append({'interest_rate': rate})
+        self.assertTrue(os.path.exists(writer.snapshot_path))
+        reader = ConfigLog(self.path, DEFAULTS)
+        # Only the record written after the snapshot is replayed
+        self.assertEqual(reader.records_since_snapshot, 1)
+        self.assertEqual(reader.config['interest_rate'], .04)
+
+    def test_torn_record(self):
+        writer = ConfigLog(self.path, DEFAULTS)
+        writer.append({'interest_rate': .03})
+        with open(writer.log_path, 'ab') as file:
+            file.write(b'\x20\x00\x00\x00partial')
+        reader = ConfigLog(self.path, DEFAULTS)
+        self.assertEqual(reader.config['interest_rate'], .03)
+        self.assertFalse(reader.changed())
+        # The next append replaces the torn record
+        reader.append({'interest_rate': .045})
+        self.assertEqual(ConfigLog(self.path, DEFAULTS).config['interest_rate'], .045)
+
+
+if __name__ == '__main__':
+    unittest.main()
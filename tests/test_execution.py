@@ -0,0 +1,65 @@
+from app.execution import *
+import asyncio
+import threading
+import unittest
+
+
+def current_thread_name():
+    return threading.current_thread().name
+
+
+class TestExecutionPolicy(unittest.TestCase):
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            ExecutionPolicy('fiber')
+
+    def test_inline_mode_never_offloads(self):
+        policy = ExecutionPolicy('inline', offload_threshold=10)
+        self.assertFalse(policy.admit(10 ** 6))
+        self.assertEqual((policy.inline, policy.offloaded, policy.pending), (1, 0, 0))
+
+    def test_threshold(self):
+        policy = ExecutionPolicy('thread', offload_threshold=10)
+        self.assertFalse(policy.admit(9))
+        self.assertTrue(policy.admit(10))
+        self.assertEqual(policy.pending, 1)
+        policy.release()
+        self.assertEqual(policy.pending, 0)
+
+    def test_overload(self):
+        policy = ExecutionPolicy('thread', offload_threshold=10, max_pending=2)
+        policy.admit(10)
+        policy.admit(10)
+        with self.assertRaises(ExecutorOverloaded):
+            policy.admit(10)
+        # Small requests are still served inline while the executor is full
+        self.assertFalse(policy.admit(1))
+        self.assertEqual(policy.stats()['rejected'], 1)
+        policy.release()
+        self.assertTrue(policy.admit(10))
+
+    def test_call_runs_on_thread(self):
+        policy = ExecutionPolicy('thread', max_workers=1)
+        try:
+            name = asyncio.run(policy.call(current_thread_name))
+        finally:
+            policy.shutdown()
+        self.assertTrue(name.startswith('calculation'))
+
+    def test_call_runs_in_process(self):
+        policy = ExecutionPolicy('process', max_workers=1)
+        try:
+            self.assertEqual(asyncio.run(policy.call(divmod, 7, 2)), (3, 1))
+        finally:
+            policy.shutdown()
+
+    def test_iterate(self):
+        policy = ExecutionPolicy('process', max_workers=1)
+
+        async def collect():
+            return [item async for item in policy.iterate(iter(range(5)))]
+
+        try:
+            self.assertEqual(asyncio.run(collect()), [0, 1, 2, 3, 4])
+        finally:
+            policy.shutdown()
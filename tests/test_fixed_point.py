@@ -0,0 +1,143 @@
+from app.fixed_point import *
+from decimal import Decimal
+import random
+import unittest
+
+class TestToCents(unittest.TestCase):
+    def test_rounds_decimal_value_half_up(self):
+        self.assertEqual(to_cents(1.005), 101)
+        self.assertEqual(to_cents(2.675), 268)
+        self.assertEqual(to_cents(-1.005), -101)
+        self.assertEqual(to_cents(0.1), 10)
+
+    def test_other_types(self):
+        self.assertEqual(to_cents(5), 500)
+        self.assertEqual(to_cents('3.1'), 310)
+        self.assertEqual(to_cents(1e20), 10 ** 22)
+
+
+class TestDivRoundHalfUp(unittest.TestCase):
+    def test_rounding(self):
+        self.assertEqual(div_round_half_up(5, 10), 1)
+        self.assertEqual(div_round_half_up(4, 10), 0)
+        self.assertEqual(div_round_half_up(-5, 10), -1)
+
+
+class TestFixedAnnuityFactor(unittest.TestCase):
+    def test_matches_decimal_formula(self):
+        rate = Decimal('0.025') / 12
+        growth = (1 + rate) ** 300
+        expected = rate * growth / (growth - 1)
+        self.assertAlmostEqual(fixed_annuity_factor(.025, 12, 300) / FACTOR_SCALE, float(expected), places=15)
+
+
+class TestMinimumDownPaymentCents(unittest.TestCase):
+    def test_breakpoints(self):
+        self.assertEqual(minimum_down_payment_cents(to_cents(100000.)), to_cents(5000.))
+        self.assertEqual(minimum_down_payment_cents(to_cents(500000.)), to_cents(25000.))
+        self.assertEqual(minimum_down_payment_cents(to_cents(1000000.)), to_cents(75000.))
+
+    def test_rounds_up(self):
+        self.assertEqual(minimum_down_payment_cents(1), 1)
+
+
+class TestFixedPointCalculator(unittest.TestCase):
+    def test_agrees_with_float_calculator(self):
+        fixed = FixedPointCalculator()
+        calc = MortgageCalculator()
+        for quote in [(500000., 50000., 'monthly', 25), (100000., 5000., 'weekly', 5), (1200000., 240000., 'biweekly', 15)]:
+            expected = calc.payment_per_period(*quote).payment_per_period
+            self.assertAlmostEqual(fixed.payment_per_period(*quote).payment_per_period, expected, delta=.01)
+
+    def test_insurance_is_exact(self):
+        fixed = FixedPointCalculator()
+        mortgage = fixed.payment_per_period(100., 19.99, 'monthly', 25)
+        self.assertEqual(mortgage.principal, 81.81)
+
+    def test_declines(self):
+        fixed = FixedPointCalculator()
+        self.assertEqual(fixed.payment_per_period(750000., 40000., 'monthly', 25).status, 'declined')
+        payments, statuses = fixed.payment_per_period_batch([750000., 1500000., 500000.], [40000., 150000., 50000.],
+                                                            ['monthly'] * 3, [25] * 3)
+        self.assertEqual(statuses, [DECLINED_MINIMUM_DOWN_PAYMENT, DECLINED_INSURABLE_LIMIT, APPROVED])
+        self.assertEqual(payments[2], fixed.payment_per_period(500000., 50000., 'monthly', 25).payment_per_period)
+
+    def test_schedule_in_whole_cents(self):
+        fixed = FixedPointCalculator()
+        mortgage, rows = fixed.amortization_schedule(500000., 50000., 'weekly', 25)
+        rows = list(rows)
+        self.assertEqual(len(rows), 1300)
+        self.assertEqual(rows[-1][4], 0.)
+        self.assertEqual(rows[-1][6], mortgage.principal)
+        total_interest = sum(to_cents(row[2]) for row in rows)
+        self.assertEqual(to_cents(rows[-1][5]), total_interest)
+
+    def test_prepayment_schedule_without_prepayments(self):
+        fixed = FixedPointCalculator()
+        mortgage, rows = fixed.amortization_schedule(500000., 50000., 'monthly', 25)
+        self.assertEqual(list(fixed.prepayment_schedule(500000., 50000., 'monthly', 25)[1]), list(rows))
+
+    def test_prepayment_summary_matches_schedule(self):
+        fixed = FixedPointCalculator()
+        strategies = [(0., 0., 0.), (100.01, 0., 0.), (0., 10000., 0.), (50., 5000., .02)]
+        mortgage, baseline, results = fixed.prepayment_scenarios(500000., 50000., 'biweekly', 25,
+                                                                 *zip(*strategies))
+        self.assertEqual(results[0], baseline)
+        for strategy, result in zip(strategies, results):
+            rows = list(fixed.prepayment_schedule(500000., 50000., 'biweekly', 25, *strategy)[1])
+            self.assertEqual(result, (len(rows), rows[-1][5]))
+            self.assertEqual(rows[-1][4], 0.)
+            self.assertEqual(rows[-1][6], mortgage.principal)
+            self.assertTrue(all(round(value, 2) == value for row in rows for value in row[1:]))
+
+    def test_grid_matches_payment_per_period(self):
+        fixed = FixedPointCalculator()
+        rng = random.Random(13)
+        for _ in range(200):
+            asking_price = round(rng.uniform(50000, 2000000), 2)
+            down_payments = [round(asking_price * rng.uniform(.05, .5), 2) for _ in range(3)]
+            periods = [5, 17, 25]
+            statuses, grids = fixed.payment_grid(asking_price, down_payments, 'weekly', [.025], periods)
+            for down_payment, status, grid in zip(down_payments, statuses, grids):
+                for period, payment in zip(periods, grid[0] if grid else periods):
+                    mortgage = fixed.payment_per_period(asking_price, down_payment, 'weekly', period)
+                    self.assertEqual(status, mortgage.status_code)
+                    if grid:
+                        self.assertEqual(payment, mortgage.payment_per_period)
+
+    def test_maximum_in_whole_cents(self):
+        fixed = FixedPointCalculator()
+        for payment in (2072.61, 999.99, 12345.67):
+            principal = fixed.maximum(payment, 'monthly', 25)
+            self.assertEqual(round(principal, 2), principal)
+            self.assertLessEqual(payment_cents(to_cents(principal), .025, 12, 300), to_cents(payment))
+            # The present value rounded down to the cent
+            factor = fixed_annuity_factor(.025, 12, 300)
+            self.assertLessEqual(to_cents(principal) * factor, to_cents(payment) * FACTOR_SCALE)
+            self.assertGreater((to_cents(principal) + 1) * factor, to_cents(payment) * FACTOR_SCALE)
+        self.assertEqual(fixed.maximum_batch([2072.61], ['monthly'], [25]), [fixed.maximum(2072.61, 'monthly', 25)])
+
+    def test_product_rate(self):
+        fixed = FixedPointCalculator()
+        fixed.set_product_rates({'fixed': .0479})
+        reference = FixedPointCalculator()
+        reference.interest_rate = .0479
+        self.assertEqual(fixed.payment_per_period(500000., 50000., 'monthly', 25, 'fixed').payment_per_period,
+                         reference.payment_per_period(500000., 50000., 'monthly', 25).payment_per_period)
+
+    def test_quote_session(self):
+        calc = FixedPointCalculator()
+        session = calc.quote_session(500000., 50000., 'monthly', 25)
+        changes = [({'down_payment': 100000.29}, (500000., 100000.29, 'monthly', 25)),
+                   ({'asking_price': 1000000.01}, (1000000.01, 100000.29, 'monthly', 25)),
+                   ({'asking_price': 750000., 'amortization_period': 10}, (750000., 100000.29, 'monthly', 10))]
+        for change, inputs in changes:
+            mortgage = session.update(**change)
+            expected = calc.calculate_payment_per_period(*inputs)
+            self.assertEqual(mortgage.status_text, expected.status_text)
+            self.assertEqual(getattr(mortgage, 'payment_per_period', None),
+                             getattr(expected, 'payment_per_period', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+from app.metrics import *
+import unittest
+
+class TestHistogram(unittest.TestCase):
+    def test_observe(self):
+        histogram = Histogram(buckets=(1., 2.))
+        for value in [.5, 1., 1.5, 3.]:
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 6.)
+
+    def test_render_is_cumulative(self):
+        histogram = Histogram(buckets=(1., 2.))
+        histogram.observe(.5)
+        histogram.observe(1.5)
+        lines = histogram.render('latency', 'route="/a"')
+        self.assertEqual(lines[:3], ['latency_bucket{route="/a",le="1.0"} 1',
+                                     'latency_bucket{route="/a",le="2.0"} 2',
+                                     'latency_bucket{route="/a",le="+Inf"} 2'])
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_disabled_timer(self):
+        registry = MetricsRegistry()
+        registry.stage_timer('/a').mark('validation')
+        self.assertEqual(registry.stages, {})
+
+    def test_stage_timer(self):
+        registry = MetricsRegistry(enabled=True, routes=['/a'])
+        timer = registry.stage_timer('/a')
+        timer.mark('validation')
+        timer.mark('calculation')
+        self.assertEqual(set(registry.stages), {('/a', 'validation'), ('/a', 'calculation')})
+
+    def test_unknown_routes_grouped(self):
+        registry = MetricsRegistry(enabled=True, routes=['/a'])
+        registry.observe_request('/a', 'GET', 200, .001)
+        registry.observe_request('/random', 'GET', 404, .001)
+        text = registry.render()
+        self.assertIn('http_requests_total{route="/a",method="GET",status="200"} 1', text)
+        self.assertIn('http_requests_total{route="unmatched",method="GET",status="404"} 1', text)
+
+    def test_collectors(self):
+        registry = MetricsRegistry(enabled=True)
+        registry.add_collector(lambda: [('things_total', 'counter', 'Things.', 3)])
+        self.assertIn('things_total 3', registry.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
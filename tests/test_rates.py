@@ -0,0 +1,76 @@
+from app.rates import *
+from app.calculator import MortgageCalculator
+from multiprocessing import get_context
+import os
+import tempfile
+import unittest
+
+def write_rate(path, interest_rate):
+    store = FileRateStore(path, .025)
+    store.write(interest_rate)
+    store.close()
+
+
+class TestRateStore(unittest.TestCase):
+    def test_incomplete_store(self):
+        class ReadOnlyRateStore(RateStore):
+            def read(self):
+                return 1, .025
+
+        with self.assertRaises(TypeError):
+            ReadOnlyRateStore()
+
+
+class TestMemoryRateStore(unittest.TestCase):
+    def test_write_bumps_version(self):
+        store = MemoryRateStore(.025)
+        self.assertEqual(store.read(), (1, .025))
+        self.assertEqual(store.write(.03), 2)
+        self.assertEqual(store.read(), (2, .03))
+
+
+class TestFileRateStore(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, 'rate')
+
+    def test_initial_rate(self):
+        store = FileRateStore(self.path, .025)
+        self.assertEqual(store.read(), (1, .025))
+        # Opening an existing store does not reset the rate
+        store.write(.04)
+        other = FileRateStore(self.path, .025)
+        self.assertEqual(other.read(), (2, .04))
+
+    def test_write_visible_across_processes(self):
+        store = FileRateStore(self.path, .025)
+        process = get_context('spawn').Process(target=write_rate, args=(self.path, .05))
+        process.start()
+        process.join()
+        self.assertEqual(store.read(), (2, .05))
+
+    def test_writer_died_mid_write(self):
+        store = FileRateStore(self.path, .025)
+        store.write(.03)
+        # A writer that died after making the sequence odd
+        store.SEQUENCE.pack_into(store.map, 0, store.SEQUENCE.unpack_from(store.map, 0)[0] + 1)
+        self.assertEqual(store.read(), (2, .03))
+        self.assertEqual(store.write(.04), 3)
+        self.assertEqual(store.SEQUENCE.unpack_from(store.map, 0)[0] % 2, 0)
+        self.assertEqual(store.read(), (3, .04))
+
+
+class TestSharedRateCalculator(unittest.TestCase):
+    def test_calculators_share_rate(self):
+        store = MemoryRateStore(.025)
+        first = MortgageCalculator(rate_store=store, rate_sync_interval=0)
+        second = MortgageCalculator(rate_store=store, rate_sync_interval=0)
+        first.interest_rate = .05
+        self.assertEqual(second.interest_rate, .05)
+        self.assertEqual(second.rate_version, first.rate_version)
+        self.assertEqual(second.payment_per_period(500000., 100000., 'monthly', 25).payment_per_period,
+                         first.payment_per_period(500000., 100000., 'monthly', 25).payment_per_period)
+
+
+if __name__ == '__main__':
+    unittest.main()
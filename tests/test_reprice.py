@@ -0,0 +1,44 @@
+from app.reprice import *
+import csv
+import io
+import unittest
+
+class TestReprice(unittest.TestCase):
+    def run_reprice(self, text, **kwargs):
+        output = io.StringIO()
+        n_rows = reprice(io.StringIO(text), output, .025, workers=1, **kwargs)
+        output.seek(0)
+        return n_rows, list(csv.DictReader(output))
+
+    def test_reprice_keeps_order_and_columns(self):
+        text = ('id,asking_price,down_payment,payment_schedule,amortization_period\n'
+                '1,500000,50000,monthly,25\n'
+                '2,750000,40000,Monthly,25\n'
+                '3,abc,1,weekly,5\n'
+                '4,100000,5000,weekly,30\n')
+        n_rows, rows = self.run_reprice(text, chunk_size=2)
+        self.assertEqual(n_rows, 4)
+        self.assertEqual([row['id'] for row in rows], ['1', '2', '3', '4'])
+        expected = MortgageCalculator().payment_per_period(500000., 50000., 'monthly', 25).payment_per_period
+        self.assertEqual(float(rows[0]['payment_per_period']), expected)
+        self.assertEqual([row['mortgage_status'] for row in rows], ['approved', 'declined', 'error', 'error'])
+
+    def test_out_of_range_amounts_in_cents_mode(self):
+        text = ('asking_price,down_payment,payment_schedule,amortization_period\n'
+                'inf,1,monthly,25\n'
+                '1e300,1e299,monthly,25\n'
+                '0,0,monthly,25\n')
+        n_rows, rows = self.run_reprice(text, money_mode='cents')
+        self.assertEqual([row['mortgage_status'] for row in rows], ['error', 'error', 'error'])
+
+    def test_missing_columns(self):
+        self.assertRaises(ValueError, self.run_reprice, 'asking_price,down_payment\n1,1\n')
+
+    def test_invalid_interest_rate(self):
+        for rate in ('0', '-1', 'inf', 'nan', '500'):
+            with self.assertRaises(SystemExit):
+                main(['-', '-', '--interest-rate', rate, '--quiet'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+from app.sessions import *
+from unittest import mock
+import unittest
+
+INPUTS = [500000., 50000., 'monthly', 25, None]
+
+
+class TestSessionTokens(unittest.TestCase):
+    def setUp(self):
+        self.tokens = SessionTokens(b'secret', 1800)
+
+    def test_round_trip(self):
+        token = self.tokens.issue(INPUTS)
+        self.assertEqual(self.tokens.read(token), INPUTS)
+        # Any holder of the secret can read it
+        self.assertEqual(SessionTokens(b'secret', 1800).read(token), INPUTS)
+
+    def test_other_secret(self):
+        self.assertIsNone(SessionTokens(b'other', 1800).read(self.tokens.issue(INPUTS)))
+
+    def test_tampered(self):
+        payload, _, signature = self.tokens.issue(INPUTS).partition('.')
+        other_payload = self.tokens.issue([900000., *INPUTS[1:]]).partition('.')[0]
+        self.assertIsNone(self.tokens.read(f'{other_payload}.{signature}'))
+        for token in ('missing', f'{payload}.', f'{payload}.é', ''):
+            self.assertIsNone(self.tokens.read(token))
+
+    def test_expired(self):
+        token = self.tokens.issue(INPUTS)
+        with mock.patch('app.sessions.time.time', return_value=time.time() + 1801):
+            self.assertIsNone(self.tokens.read(token))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+
+# Seconds from starting to import the api to having answered its first request, measured in a fresh interpreter.
+# This is several times what it takes today so that slow machines pass, while still catching a heavy dependency or
+# eager work being added to the import path.
+STARTUP_BUDGET = .5
+
+# Modules that must not be loaded to serve a quote with the default configuration
+LAZY_MODULES = ('multiprocessing', 'concurrent.futures.process', 'fixed_point')
+
+STARTUP_SCRIPT = '''
+import asyncio, json, sys, time
+sys.path.insert(0, sys.argv[1])
+started = time.perf_counter()
+import api
+imported = time.perf_counter()
+configured_on_import = api.calc is not None
+app = api.create_app()
+messages = []
+
+async def receive():
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+async def send(message):
+    messages.append(message)
+
+scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+         'path': '/payment-amount', 'raw_path': b'/payment-amount', 'root_path': '', 'headers': [],
+         'query_string': b'asking_price=500000&down_payment=50000&payment_schedule=monthly&amortization_period=25',
+         'server': ('test', 80), 'client': ('test', 1)}
+asyncio.run(app(scope, receive, send))
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'first_request': served - started,
+                  'configured_on_import': configured_on_import, 'status': messages[0]['status'],
+                  'body': messages[1]['body'].decode(), 'modules': sorted(sys.modules)}))
+'''
+
+
+def measure_startup():
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('MONEY_MODE', 'EXECUTION_MODE', 'METRICS_ENABLED')}
+    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, APP_DIR], capture_output=True, text=True,
+                            env=env, check=True).stdout
+    return json.loads(output)
+
+
+class TestStartup(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The first run may compile the modules, which a deployed image would already have done
+        measure_startup()
+        cls.startup = measure_startup()
+
+    def test_first_request(self):
+        self.assertEqual(self.startup['status'], 200)
+        self.assertEqual(self.startup['body'], '{"payment_per_period":2072.61}')
+
+    def test_import_is_lazy(self):
+        self.assertFalse(self.startup['configured_on_import'])
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, self.startup['modules'])
+
+    def test_startup_budget(self):
+        self.assertLess(self.startup['first_request'], STARTUP_BUDGET,
+                        f'Serving the first request took {self.startup["first_request"]:.3f}s')
+
+
+if __name__ == '__main__':
+    unittest.main()
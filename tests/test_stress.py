@@ -0,0 +1,56 @@
+from app.stress import *
+import unittest
+
+MORTGAGES = [(500000., 50000., 'monthly', 25), (800000., 200000., 'biweekly', 20), (100000., 1000., 'monthly', 25)]
+
+
+class TestStress(unittest.TestCase):
+    def setUp(self):
+        self.calc = MortgageCalculator()
+        self.calc.interest_rate = .05
+
+    def test_constant_rate(self):
+        # Without any volatility every renewal is at the same rate, so the payment never changes
+        model = RateShockModel(.05, n_paths=10, volatility=0)
+        result = next(stress_test(self.calc, MORTGAGES[:1], model))
+        quote = self.calc.payment_per_period(*MORTGAGES[0]).payment_per_period
+        self.assertEqual(result['payment_per_period'], quote)
+        self.assertEqual([renewal['year'] for renewal in result['renewals']], [5, 10, 15, 20])
+        for renewal in result['renewals']:
+            for payment in renewal['payment_percentiles'].values():
+                self.assertAlmostEqual(payment, quote, delta=.01)
+        self.assertEqual(result['payment_shock_percentiles'], {'p5': 0, 'p50': 0, 'p95': 0, 'p99': 0})
+
+    def test_declined(self):
+        model = RateShockModel(.05, n_paths=10)
+        result = list(stress_test(self.calc, MORTGAGES, model))[2]
+        self.assertEqual(result['mortgage_status'], 'declined')
+
+    def test_percentiles_are_ordered(self):
+        model = RateShockModel(.05, n_paths=2000, volatility=.01)
+        for result in list(stress_test(self.calc, MORTGAGES[:2], model)):
+            for renewal in result['renewals']:
+                percentiles = list(renewal['payment_percentiles'].values())
+                self.assertEqual(percentiles, sorted(percentiles))
+            shocks = list(result['payment_shock_percentiles'].values())
+            self.assertEqual(shocks, sorted(shocks))
+            self.assertGreater(shocks[-1], 0)
+
+    def test_results_do_not_depend_on_workers_or_chunks(self):
+        model = RateShockModel(.05, n_paths=500, volatility=.01, seed=7)
+        expected = list(stress_test(self.calc, MORTGAGES, model))
+        self.assertEqual(list(stress_test(self.calc, MORTGAGES, model, chunk_size=1)), expected)
+        self.assertEqual(list(stress_test(self.calc, MORTGAGES, model, workers=2)), expected)
+
+    def test_model_at_another_rate(self):
+        with self.assertRaises(ValueError):
+            stress_test(self.calc, MORTGAGES, RateShockModel(.04, n_paths=10))
+
+    def test_invalid_interest_rate(self):
+        for rate in ('0', '-1', 'inf', 'nan', '150'):
+            with self.assertRaises(SystemExit):
+                main(['-', '-', '--interest-rate', rate])
+
+
+if __name__ == '__main__':
+    unittest.main()
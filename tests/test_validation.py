@@ -217,6 +217,12 @@ class TestValidateParams(unittest.TestCase):
         v.validators.add('param2', ValidationError, validate_float)
         self.assertRaises(TypeError, v.validators.validate_all, v.params, v.query_keys)
 
+    def test_fail_fast(self):
+        v = MockParams()
+        v.params = {'param1': 30, 'param2': 'text'}
+        self.assertEqual(len(v.validators.validate_all(v.params, v.query_keys)), 2)
+        self.assertEqual(v.validators.validate_all(v.params, v.query_keys, fail_fast=True), [ValidationError])
+
 
 class TestValidator(unittest.TestCase):
     def test_validation(self):
@@ -230,5 +236,100 @@ class TestValidator(unittest.TestCase):
         validator = Validator(validate_positive_integer_in_range, 'weekly')
         self.assertRaises(TypeError, validator.validate, value)
 
+class TestListConversions(unittest.TestCase):
+    def test_float_list(self):
+        self.assertEqual(float_list('5,10.5, 20'), [5., 10.5, 20.])
+        self.assertRaises(ValueError, float_list, '5,,10')
+
+    def test_integer_list(self):
+        self.assertEqual(integer_list('5,25'), [5, 25])
+        self.assertRaises(ValueError, integer_list, '5,2.5')
+
+    def test_validate_lists(self):
+        self.assertEqual(validate_positive_float_list([0., 100.], 100.), True)
+        self.assertEqual(validate_positive_float_list([5., 100.5], 100.), False)
+        self.assertEqual(validate_positive_integer_list_in_range([5, 25], 5, 26), True)
+        self.assertEqual(validate_positive_integer_list_in_range([5, 26], 5, 26), False)
+
+class TestValidatePercentage(unittest.TestCase):
+    def test_validate_percentage(self):
+        self.assertEqual(validate_percentage(0.), True)
+        self.assertEqual(validate_percentage(100.), True)
+        self.assertEqual(validate_percentage(100.5), False)
+        self.assertEqual(validate_percentage(-1.), False)
+
+class TestValidateInterestRate(unittest.TestCase):
+    def test_validate_interest_rate(self):
+        for value in [.01, 3.99, 100.]:
+            self.assertTrue(validate_interest_rate(value, 100.))
+        for value in [0., -1., 100.01, float('inf'), float('nan'), 5]:
+            self.assertFalse(validate_interest_rate(value, 100.))
+
+
+class TestCompiledValidator(unittest.TestCase):
+    def setUp(self):
+        self.validator = CompiledValidator([
+            Field('param1', int, ValidationError, validate_positive_integer_in_range, 5, 26),
+            Field('param2', float, ValidationError, validate_positive_float),
+            Field('param3', clean_string, ValidationError, validate_payment_schedule, {'weekly': 52}, required=False)
+        ])
+
+    def test_successful_validation(self):
+        values, errors = self.validator.validate({'param1': '25', 'param2': '1.5', 'param3': ' Weekly', 'extra': 'x'})
+        self.assertEqual(values, [25, 1.5, 'weekly'])
+        self.assertIsNone(errors)
+
+    def test_missing_optional_param(self):
+        values, errors = self.validator.validate({'param1': '5', 'param2': '0'})
+        self.assertEqual(values, [5, 0., None])
+        self.assertIsNone(errors)
+
+    def test_missing_required_param(self):
+        values, errors = self.validator.validate({'param2': '1.'})
+        self.assertEqual(len(errors), 1)
+        self.assertIn('"param1" is missing', errors[0].detail)
+
+    def test_malformed_param(self):
+        values, errors = self.validator.validate({'param1': '1.5', 'param2': '1.'})
+        self.assertEqual(len(errors), 1)
+        self.assertIn('param1 is malformed', errors[0].detail)
+
+    def test_collects_errors_in_order(self):
+        values, errors = self.validator.validate({'param1': '30', 'param2': '-1.', 'param3': 'daily'})
+        self.assertEqual(errors, [ValidationError, ValidationError, ValidationError])
+        self.assertEqual(values, [None, None, None])
+
+    def test_validate_present(self):
+        values, errors = self.validator.validate_present({'param2': '2.5'})
+        self.assertEqual(values, {'param2': 2.5})
+        self.assertIsNone(errors)
+        values, errors = self.validator.validate_present({'param1': '30', 'param3': 'Weekly'})
+        self.assertEqual(values, {'param3': 'weekly'})
+        self.assertEqual(errors, [ValidationError])
+
+    def test_fail_fast(self):
+        params = {'param1': '30', 'param2': 'x', 'param3': 'daily'}
+        values, errors = self.validator.validate(params, fail_fast=True)
+        self.assertEqual(errors, [ValidationError])
+        values, errors = self.validator.validate({'param1': '5', 'param2': 'x'}, fail_fast=True)
+        self.assertEqual(values, [5])
+        self.assertIn('param2 is malformed', errors[0].detail)
+        values, errors = self.validator.validate_present(params, fail_fast=True)
+        self.assertEqual(errors, [ValidationError])
+
+    def test_errors_are_built_once(self):
+        first = self.validator.validate({'param1': '1.5'})[1]
+        second = self.validator.validate({'param1': '1.5'})[1]
+        self.assertEqual([id(error) for error in first], [id(error) for error in second])
+
+    def test_report(self):
+        self.assertEqual(self.validator.report({'param1': '5', 'param2': '1.'}), [])
+        report = self.validator.report({'param1': '1.5', 'param3': 'daily'})
+        self.assertEqual([entry['param'] for entry in report], ['param1', 'param2', 'param3'])
+        self.assertIn('param1 is malformed', report[0]['detail'])
+        self.assertIn('"param2" is missing', report[1]['detail'])
+        self.assertEqual(report[2]['detail'], ValidationError().detail)
+
+
 if __name__ == '__main__':
     unittest.main()